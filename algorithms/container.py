@@ -0,0 +1,242 @@
+import lzma
+import struct
+import zlib
+from utils.memory import WORK_BYTES_PER_CARRIER_BYTE, chunk_size, chunk_spans, fits_in_memory
+from utils.progress import report_progress
+
+# Container header embedded ahead of every payload:
+# magic, version, algorithm id, flags, algorithm parameter, payload length (bytes), nonce, CRC32 of the preceding fields
+# The parameter byte was reserved (zero) before algorithms used it, so 0 means "the algorithm's default"
+MAGIC = b"\x89STG"
+VERSION = 1
+HEADER_BODY = struct.Struct('>4sBBBBI16s')
+HEADER_SIZE = HEADER_BODY.size + 4
+NONCE_SIZE = 16
+
+# Legacy algorithms/* files start with a bare 32-bit payload bit count instead
+LEGACY_LENGTH_SIZE = 4
+
+FLAG_ENCRYPTED = 0x01
+FLAG_ZLIB = 0x02
+FLAG_LZMA = 0x04
+FLAG_KDF = 0x08  # The payload starts with a utils.kdf KDF block; the message key is derived, not the raw key file
+COMPRESSION_FLAGS = FLAG_ZLIB | FLAG_LZMA
+
+# Raw streams (no zlib/xz container) keep the fixed overhead low enough to pay off on short messages
+LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 9 | lzma.PRESET_EXTREME}]
+MAX_INFLATED_SIZE = 64 * 1024 * 1024
+LZMA_MIN_DICT_SIZE = 4096
+
+ALGORITHM_IDS = {
+    "aes_lsb": 1,
+    "aes_lsb_advanced": 2,
+    "basic_lsb": 3,
+    "enhanced_lsb_no_flip": 4,
+    "enhanced_lsb_with_flip": 5,
+    "kbit_lsb": 6,
+    "spectral": 7,
+    "aes_spectral": 8,
+    "matrix_lsb": 9,
+    "multi_lsb": 10,
+}
+ALGORITHM_NAMES = {algorithm_id: name for name, algorithm_id in ALGORITHM_IDS.items()}
+
+
+def pack_header(algorithm_id, payload_length, flags=0, nonce=b'', param=0):
+    """
+    Builds a container header.
+
+    :param algorithm_id: Id from ALGORITHM_IDS of the algorithm writing the payload
+    :param payload_length: Payload size in bytes, excluding the header
+    :param flags: Bit flags (FLAG_*)
+    :param nonce: Up to 16 bytes of IV/nonce, zero padded
+    :param param: Algorithm parameter the payload was embedded with (0-255), 0 for the default
+    :return: HEADER_SIZE bytes
+    """
+    if len(nonce) > NONCE_SIZE:
+        raise ValueError("Nonce is longer than 16 bytes.")
+    body = HEADER_BODY.pack(MAGIC, VERSION, algorithm_id, flags, param, payload_length, nonce.ljust(NONCE_SIZE, b'\0'))
+    return body + struct.pack('>I', zlib.crc32(body))
+
+
+def has_magic(data):
+    """Returns True if data starts with the container magic."""
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def parse_header(data, expected_algorithm=None):
+    """
+    Validates and unpacks a container header in constant time.
+
+    :param data: At least HEADER_SIZE bytes extracted from the head of the carrier
+    :param expected_algorithm: Algorithm id the caller decodes with; any other id is rejected
+    :return: Dictionary with version, algorithm_id, algorithm, flags, param, payload_length and nonce
+    """
+    data = bytes(data[:HEADER_SIZE])
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Container header is truncated.")
+    if not has_magic(data):
+        raise ValueError("No container header found.")
+
+    body, (crc,) = data[:HEADER_BODY.size], struct.unpack('>I', data[HEADER_BODY.size:])
+    if zlib.crc32(body) != crc:
+        raise ValueError("Container header checksum mismatch.")
+
+    _, version, algorithm_id, flags, param, payload_length, nonce = HEADER_BODY.unpack(body)
+    if version > VERSION:
+        raise ValueError(f"Unsupported container version {version}.")
+    if expected_algorithm is not None and algorithm_id != expected_algorithm:
+        raise ValueError(f"Payload was written by {ALGORITHM_NAMES.get(algorithm_id, algorithm_id)}, "
+                         f"not {ALGORITHM_NAMES.get(expected_algorithm, expected_algorithm)}.")
+
+    return {
+        "version": version,
+        "algorithm_id": algorithm_id,
+        "algorithm": ALGORITHM_NAMES.get(algorithm_id),
+        "flags": flags,
+        "param": param,
+        "payload_length": payload_length,
+        "nonce": nonce,
+    }
+
+
+def payload_span(head_bytes, expected_algorithm=None):
+    """
+    Locates the payload from the bytes extracted at the head of the carrier.
+
+    Falls back to the legacy 32-bit bit-count framing when no container magic is present.
+
+    :param head_bytes: At least HEADER_SIZE extracted bytes
+    :param expected_algorithm: Algorithm id the caller decodes with
+    :return: Tuple (start, length, header) in payload bytes; header is None for legacy framing
+    """
+    if has_magic(head_bytes):
+        header = parse_header(head_bytes, expected_algorithm)
+        return HEADER_SIZE, header["payload_length"], header
+
+    message_bits = struct.unpack('>I', bytes(head_bytes[:LEGACY_LENGTH_SIZE]))[0]
+    return LEGACY_LENGTH_SIZE, message_bits // 8, None
+
+
+def read_carrier_bytes(audio, count):
+    """Reads the frames covering the first count data bytes of an open wave file (from frame 0)."""
+    frame_size = audio.getsampwidth() * audio.getnchannels()
+    audio.setpos(0)
+    return bytearray(audio.readframes(-(-count // frame_size)))
+
+
+def read_carrier_range(audio, begin, end):
+    """Reads data bytes [begin, end) of an open wave file, touching only the frames that cover them."""
+    frame_size = audio.getsampwidth() * audio.getnchannels()
+    first = begin // frame_size
+    audio.setpos(first)
+    data = audio.readframes(-(-end // frame_size) - first)
+    return bytearray(data[begin - first * frame_size:end - first * frame_size])
+
+
+def read_framed_payload(audio, extract_bytes, carrier_bytes_for, expected_algorithm=None, payload_align=1,
+                        extract_body=None):
+    """
+    Reads a framed payload touching only the frames it occupies.
+
+    The header frames are read and validated first, so a wrong algorithm or a clean file is rejected
+    before any payload frames are read. Payloads whose carrier region would exceed the memory budget
+    are extracted chunk by chunk: payload bytes [a, b) come from carrier bytes
+    [carrier_bytes_for(a), carrier_bytes_for(b)).
+
+    :param audio: Open wave reader
+    :param extract_bytes: Function mapping leading carrier bytes to the payload bytes they hold
+    :param carrier_bytes_for: Function giving the carrier bytes needed to hold n payload bytes
+    :param expected_algorithm: Algorithm id the caller decodes with
+    :param payload_align: Chunks start on multiples of this many payload bytes, so each begins on a carrier unit
+    :param extract_body: Extractor for carrier bytes past the header, for layouts that embed the header
+        differently; chunk starts are then counted from the payload start
+    :return: Tuple (payload bytes, header dict or None for legacy framing)
+    """
+    head = read_carrier_bytes(audio, carrier_bytes_for(HEADER_SIZE))
+    start, length, header = payload_span(extract_bytes(head)[:HEADER_SIZE], expected_algorithm)
+
+    needed = carrier_bytes_for(start + length)
+    if needed > audio.getnframes() * audio.getsampwidth() * audio.getnchannels():
+        raise ValueError("The extracted message length is larger than the available audio data.")
+
+    if fits_in_memory(needed * WORK_BYTES_PER_CARRIER_BYTE):
+        payload = extract_bytes(read_carrier_bytes(audio, needed))[start:start + length]
+        report_progress("extract", needed, needed, bits=length * 8)
+        return payload, header
+
+    origin = 0 if extract_body is None else start
+    extract_body = extract_body or extract_bytes
+    step = chunk_size(WORK_BYTES_PER_CARRIER_BYTE * needed / (start + length), payload_align)
+    first = origin + (start - origin) // step * step
+    pieces = []
+    for a, b in chunk_spans(start + length, step, first):
+        carrier = read_carrier_range(audio, carrier_bytes_for(a), carrier_bytes_for(b))
+        pieces.append(extract_body(carrier)[max(start - a, 0):b - a])
+        report_progress("extract", carrier_bytes_for(b), needed, bits=(b - start) * 8)
+    return b''.join(pieces), header
+
+
+def compress_payload(data, compress=True):
+    """
+    Compresses a payload with whichever codec makes it smallest, keeping it as is when none saves space.
+
+    :param data: Payload bytes, before any encryption
+    :param compress: False skips compression altogether
+    :return: Tuple (bytes to embed, compression flag to OR into the header flags)
+    """
+    data = bytes(data)
+    best, best_flag = data, 0
+    if not compress:
+        return best, best_flag
+
+    # The encoder reserves memory for its whole dictionary (about 670 MiB at preset 9), while one larger
+    # than the data cannot find longer matches. Decoders keep LZMA_FILTERS: a bigger dictionary reads any stream.
+    dict_size = min(max(1 << (len(data) - 1).bit_length(), LZMA_MIN_DICT_SIZE), MAX_INFLATED_SIZE)
+    filters = [dict(LZMA_FILTERS[0], dict_size=dict_size)]
+
+    deflater = zlib.compressobj(9, zlib.DEFLATED, -15)
+    candidates = {
+        FLAG_ZLIB: deflater.compress(data) + deflater.flush(),
+        FLAG_LZMA: lzma.compress(data, format=lzma.FORMAT_RAW, filters=filters),
+    }
+    for flag, compressed in candidates.items():
+        if len(compressed) < len(best):
+            best, best_flag = compressed, flag
+    return best, best_flag
+
+
+def decompress_payload(data, flags):
+    """
+    Inflates a payload according to the compression flag of its header.
+
+    :param data: Extracted (and decrypted) payload bytes
+    :param flags: Header flags
+    :return: Original payload bytes
+    """
+    data = bytes(data)
+    if flags & FLAG_ZLIB:
+        inflater = zlib.decompressobj(-15)
+        try:
+            inflated = inflater.decompress(data, MAX_INFLATED_SIZE)
+        except zlib.error as e:
+            raise ValueError(f"Compressed payload is corrupt: {e}")
+        if inflater.unconsumed_tail or not inflater.eof:
+            raise ValueError("Compressed payload is corrupt or inflates beyond the size limit.")
+        return inflated
+    if flags & FLAG_LZMA:
+        decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+        try:
+            inflated = decompressor.decompress(data, MAX_INFLATED_SIZE)
+        except lzma.LZMAError as e:
+            raise ValueError(f"Compressed payload is corrupt: {e}")
+        if not decompressor.eof:
+            raise ValueError("Compressed payload is truncated or inflates beyond the size limit.")
+        return inflated
+    return data
+
+
+def frame_payload(algorithm_id, payload, compress=True, param=0):
+    """Compresses a plaintext payload when that saves space and prefixes its container header."""
+    data, flags = compress_payload(payload, compress)
+    return pack_header(algorithm_id, len(data), flags, param=param) + data
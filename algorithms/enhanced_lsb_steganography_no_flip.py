@@ -1,12 +1,31 @@
-import wave
 from utils.logging_util import setup_logger
-import struct  # For packing and unpacking the message length
+from utils.memory import WORK_BYTES_PER_CARRIER_BYTE, chunk_size, chunk_spans, fits_in_memory
+from utils.progress import LOOP_REPORT_STEP, report_progress
+from utils.riff import open_wav, read_params, stream_like, write_like
+import numpy as np
+from algorithms.incremental_update import bits_from_string, message_to_bits, patch_payload_region
+from algorithms import parallel_engine
+from algorithms.parallel_engine import ENHANCED_LAYOUT
+from algorithms.container import ALGORITHM_IDS, decompress_payload, read_framed_payload
 
 logger = setup_logger(__name__)
 
+ALGORITHM_ID = ALGORITHM_IDS["enhanced_lsb_no_flip"]
+
+def extract_bytes(carrier):
+    """
+    Packs bits 3 and 2 (in that order) of every carrier byte back into payload bytes.
+
+    :param carrier: Leading carrier bytes
+    :return: Extracted bytes
+    """
+    carrier = np.frombuffer(carrier, dtype=np.uint8)
+    pairs = np.stack(((carrier >> 3) & 1, (carrier >> 2) & 1), axis=1)
+    return np.packbits(pairs.ravel()).tobytes()
+
 def encode(input_file_path, output_file_path, secret_message):
     """
-    Encodes a secret message into an audio file using enhanced LSB steganography (no flip) with message length.
+    Encodes a secret message into an audio file using enhanced LSB steganography (no flip).
 
     :param input_file_path: Path to the input audio file
     :param output_file_path: Path to the output encoded audio file
@@ -14,22 +33,16 @@ def encode(input_file_path, output_file_path, secret_message):
     """
     try:
         logger.info("Encoding starts...")
-        audio = wave.open(input_file_path, mode="rb")
+        if not fits_in_memory(read_params(input_file_path).data_size * WORK_BYTES_PER_CARRIER_BYTE):
+            encode_chunked(input_file_path, output_file_path, secret_message)
+            logger.info(f"Successfully encoded into {output_file_path}")
+            return
+
+        audio = open_wav(input_file_path)
         frame_bytes = bytearray(list(audio.readframes(audio.getnframes())))
 
         logger.info(f"Secret message: {secret_message}")
-        # Convert the secret message to bits
-        secret_message_bits = ''.join([bin(ord(i)).lstrip('0b').rjust(8, '0') for i in secret_message])
-        message_length = len(secret_message_bits)
-
-        # Pack the length of the message into 4 bytes (32 bits)
-        length_bytes = struct.pack('>I', message_length)  # '>I' is big-endian unsigned int
-
-        # Convert the length bytes to bits
-        length_bits = ''.join([bin(byte).lstrip('0b').rjust(8, '0') for byte in length_bytes])
-
-        # Combine length bits and message bits
-        full_bits = length_bits + secret_message_bits
+        full_bits = message_to_bits(secret_message, ALGORITHM_ID)
 
         # Ensure the message fits into the frame bytes
         if len(full_bits) > len(frame_bytes) * 4:  # Each frame can store 2 bits (4 frames needed per byte)
@@ -46,59 +59,97 @@ def encode(input_file_path, output_file_path, secret_message):
             elif full_bits[i] == '1' and full_bits[i + 1] == '1':
                 frame_bytes[j] = frame_bytes[j] + 12
             j += 1
+            if i % LOOP_REPORT_STEP == 0:
+                report_progress("embed", j, len(full_bits) // 2, bits=i)
+        report_progress("embed", j, len(full_bits) // 2, bits=len(full_bits))
 
         frame_modified = bytes(frame_bytes)
 
         # Write the modified bytes to the new audio file
-        with wave.open(output_file_path, 'wb') as new_audio:
-            new_audio.setparams(audio.getparams())
-            new_audio.writeframes(frame_modified)
+        write_like(input_file_path, output_file_path, frame_modified)
 
         audio.close()
         logger.info(f"Successfully encoded into {output_file_path}")
     except Exception as e:
         logger.error(f"Error during encoding: {e}")
 
+def encode_chunked(input_file_path, output_file_path, secret_message):
+    """
+    Produces the same file as encode while holding only one chunk of carrier bytes in memory.
+
+    encode switches to this when the carrier would exceed the memory budget; errors are raised, not logged.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output encoded audio file
+    :param secret_message: The message to be encoded
+    """
+    logger.info(f"Secret message: {secret_message}")
+    pairs = bits_from_string(message_to_bits(secret_message, ALGORITHM_ID)).reshape(-1, 2)
+    targets = (pairs[:, 0] << 3) | (pairs[:, 1] << 2)  # First bit in bit 3, second in bit 2
+    if len(targets) > read_params(input_file_path).data_size:
+        raise ValueError("The secret message is too large to fit in the audio file.")
+
+    def transform(chunk, start):
+        return (chunk & 243) | targets[start:start + len(chunk)]
+
+    stream_like(input_file_path, output_file_path, chunk_spans(len(targets), chunk_size()), transform,
+                bits_per_byte=2)
+
 def decode(input_file_path):
     """
-    Decodes a secret message from an audio file using enhanced LSB steganography (no flip) with message length.
+    Decodes a secret message from an audio file using enhanced LSB steganography (no flip).
 
     :param input_file_path: Path to the encoded audio file
     :return: The decoded secret message
     """
     try:
         logger.info("Decoding starts...")
-        audio = wave.open(input_file_path, mode='rb')
-        frame_bytes = bytearray(list(audio.readframes(audio.getnframes())))
-
-        # Extract the first 32 bits to determine the message length
-        length_bits = ''.join([str((frame_bytes[i] & 4) >> 2) + str((frame_bytes[i] & 8) >> 3) for i in range(16)])
-        message_length = struct.unpack('>I', int(length_bits, 2).to_bytes(4, byteorder='big'))[0]
-
-        logger.info(f"Extracted message length: {message_length} bits")
-
-        # Now extract the message bits using the extracted length
-        if message_length > len(frame_bytes) * 4:
-            raise ValueError("The extracted message length is larger than the available audio data.")
+        with open_wav(input_file_path) as audio:
+            # Reads and validates the header frames first, then only the frames holding the payload
+            message_bytes, header = read_framed_payload(audio, extract_bytes, lambda count: count * 4, ALGORITHM_ID)
 
-        extracted = []
-        for i in range(16, 16 + (message_length // 2)):
-            byte = frame_bytes[i] & 12
-            if byte == 0:
-                extracted.extend([0, 0])
-            elif byte == 4:
-                extracted.extend([0, 1])
-            elif byte == 8:
-                extracted.extend([1, 0])
-            elif byte == 12:
-                extracted.extend([1, 1])
+        logger.info(f"Extracted message length: {len(message_bytes) * 8} bits")
+        if header is not None:
+            message_bytes = decompress_payload(message_bytes, header["flags"])
 
-        # Convert bits back to characters
-        decoded_message = ''.join(chr(int(''.join(map(str, extracted[i:i + 8])), 2)) for i in range(0, len(extracted), 8))
+        # Convert bytes back to characters
+        decoded_message = ''.join(chr(byte) for byte in message_bytes)
 
         logger.info(f"Successfully decoded: {decoded_message}")
-        audio.close()
         return decoded_message
     except Exception as e:
         logger.error(f"Error during decoding: {e}")
         return None
+
+def update(file_path, secret_message):
+    """
+    Replaces the message in an already encoded audio file using enhanced LSB steganography (no flip),
+    rewriting only the carrier bytes that change.
+
+    :param file_path: Path to the encoded audio file, patched in place
+    :param secret_message: The new message to be encoded
+    :return: Number of carrier bytes rewritten, or None on failure
+    """
+    try:
+        logger.info("Incremental update starts...")
+        pairs = bits_from_string(message_to_bits(secret_message, ALGORITHM_ID)).reshape(-1, 2)
+        targets = (pairs[:, 0] << 3) | (pairs[:, 1] << 2)  # First bit in bit 3, second in bit 2
+
+        def transform(region):
+            return (region & 243) | targets
+
+        written = patch_payload_region(file_path, len(targets), transform)
+        logger.info(f"Successfully updated {file_path} ({written} bytes rewritten)")
+        return written
+    except Exception as e:
+        logger.error(f"Error during update: {e}")
+        return None
+
+def encode_parallel(input_file_path, output_file_path, secret_message, workers=None):
+    """Same output as encode, embedded by worker processes into a memory-mapped copy of the input."""
+    payload = np.packbits(bits_from_string(message_to_bits(secret_message, ALGORITHM_ID))).tobytes()
+    parallel_engine.encode_parallel(input_file_path, output_file_path, payload, ENHANCED_LAYOUT, workers)
+
+def decode_parallel(input_file_path, workers=None):
+    """Same result as decode, with the extraction split across worker processes."""
+    return parallel_engine.decode_parallel(input_file_path, ENHANCED_LAYOUT, ALGORITHM_ID, workers)
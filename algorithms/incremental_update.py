@@ -0,0 +1,143 @@
+import os
+import struct
+import zlib
+import numpy as np
+from utils.logging_util import setup_logger
+from utils.riff import parse_wav
+from algorithms.container import compress_payload, pack_header
+
+logger = setup_logger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_MAGIC = b"SJNL"
+JOURNAL_HEADER = struct.Struct('<4sQI')  # magic, data chunk offset, number of patched bytes
+MAX_PATCH_GAP = 64  # Unchanged bytes tolerated inside one write before splitting it
+
+
+def bits_from_string(bit_string):
+    """Converts a '0'/'1' string into a uint8 array of bit values."""
+    return np.frombuffer(bit_string.encode('ascii'), dtype=np.uint8) - ord('0')
+
+
+def message_to_bits(secret_message, algorithm_id):
+    """
+    Converts a message into the bit string that gets embedded: a container header followed by the
+    (possibly compressed) message bits.
+
+    :param secret_message: The message to be encoded
+    :param algorithm_id: Id from ALGORITHM_IDS recorded in the header
+    :return: String of '0'/'1' characters
+    """
+    # Convert the secret message to bits
+    secret_message_bits = ''.join([bin(ord(i)).lstrip('0b').rjust(8, '0') for i in secret_message])
+
+    # Compress the message bytes when that saves space; the header flags record the codec
+    payload, flags = compress_payload(np.packbits(bits_from_string(secret_message_bits)).tobytes())
+
+    # Prefix the container header, which records the algorithm and the payload length in bytes
+    header = pack_header(algorithm_id, len(payload), flags)
+
+    # Combine header bits and payload bits
+    return ''.join([bin(byte).lstrip('0b').rjust(8, '0') for byte in header + payload])
+
+
+def _journal_path(file_path):
+    return file_path + JOURNAL_SUFFIX
+
+
+def _write_journal(file_path, data_offset, positions, new_values):
+    """Durably records a pending patch so an interrupted write can be completed."""
+    body = (JOURNAL_HEADER.pack(JOURNAL_MAGIC, data_offset, len(positions))
+            + positions.astype('<u8').tobytes() + new_values.tobytes())
+    with open(_journal_path(file_path), 'wb') as journal:
+        journal.write(body + struct.pack('<I', zlib.crc32(body)))
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def _read_journal(file_path):
+    """Returns (data_offset, positions, new_values), or None for a missing or torn journal."""
+    try:
+        with open(_journal_path(file_path), 'rb') as journal:
+            raw = journal.read()
+    except FileNotFoundError:
+        return None
+
+    if len(raw) < JOURNAL_HEADER.size + 4 or zlib.crc32(raw[:-4]) != struct.unpack('<I', raw[-4:])[0]:
+        return None  # Torn journal: it was never completed, so the carrier was never touched
+    magic, data_offset, count = JOURNAL_HEADER.unpack_from(raw)
+    if magic != JOURNAL_MAGIC:
+        return None
+
+    start = JOURNAL_HEADER.size
+    positions = np.frombuffer(raw, dtype='<u8', count=count, offset=start).astype(np.int64)
+    new_values = np.frombuffer(raw, dtype=np.uint8, count=count, offset=start + 8 * count)
+    return data_offset, positions, new_values
+
+
+def _apply_patch(file, data_offset, positions, new_values):
+    """Writes new_values at the given data-chunk positions, coalescing nearby bytes into single writes."""
+    if not len(positions):
+        return
+    breaks = np.flatnonzero(np.diff(positions) > MAX_PATCH_GAP) + 1
+    for run in np.split(np.arange(len(positions)), breaks):
+        first, last = positions[run[0]], positions[run[-1]]
+        file.seek(data_offset + first)
+        current = bytearray(file.read(last - first + 1))
+        current_view = np.frombuffer(current, dtype=np.uint8)
+        current_view[positions[run] - first] = new_values[run]
+        file.seek(data_offset + first)
+        file.write(current)
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def recover(file_path):
+    """
+    Completes an update interrupted by a crash, if a valid journal is present.
+
+    :param file_path: Path to the carrier WAV file
+    :return: True if a pending patch was replayed
+    """
+    entry = _read_journal(file_path)
+    if entry is not None:
+        data_offset, positions, new_values = entry
+        with open(file_path, 'r+b') as file:
+            _apply_patch(file, data_offset, positions, new_values)
+        logger.info(f"Replayed {len(positions)} journaled bytes into {file_path}")
+
+    if os.path.exists(_journal_path(file_path)):
+        os.remove(_journal_path(file_path))
+    return entry is not None
+
+
+def patch_payload_region(file_path, region_length, transform):
+    """
+    Rewrites only the carrier bytes that change when a new payload is embedded.
+
+    :param file_path: Path to the already encoded WAV file, patched in place
+    :param region_length: Number of leading data bytes the new payload occupies
+    :param transform: Function mapping the current region (uint8 array) to its new contents
+    :return: Number of carrier bytes written
+    """
+    recover(file_path)
+
+    with open(file_path, 'r+b') as file:
+        params = parse_wav(file)
+        data_offset, data_size = params.data_offset, params.data_size
+        if region_length > data_size:
+            raise ValueError("The secret message is too large to fit in the audio file.")
+
+        file.seek(data_offset)
+        old_region = np.frombuffer(file.read(region_length), dtype=np.uint8)
+        new_region = transform(old_region.copy())
+
+        positions = np.flatnonzero(old_region != new_region)
+        if not len(positions):
+            return 0
+
+        _write_journal(file_path, data_offset, positions, new_region[positions])
+        _apply_patch(file, data_offset, positions, new_region[positions])
+
+    os.remove(_journal_path(file_path))
+    return len(positions)
@@ -0,0 +1,252 @@
+import math
+import numpy as np
+from utils.logging_util import setup_logger
+from utils.memory import WORK_BYTES_PER_CARRIER_BYTE, chunk_size, chunk_spans, fits_in_memory
+from utils.progress import report_progress
+from utils.riff import open_wav, read_params, stream_like, write_like
+from algorithms.container import ALGORITHM_IDS, HEADER_SIZE, decompress_payload, frame_payload, read_framed_payload
+
+logger = setup_logger(__name__)
+
+ALGORITHM_ID = ALGORITHM_IDS["kbit_lsb"]
+UNITS = ("byte", "sample")
+
+
+def unit_width(unit, sampwidth):
+    """
+    Returns the size in bytes of one carrier unit.
+
+    :param unit: "byte" to embed in every byte, "sample" to embed in every whole sample
+    :param sampwidth: Sample width of the audio file in bytes
+    """
+    if unit not in UNITS:
+        raise ValueError(f"Unknown carrier unit: {unit}")
+    return 1 if unit == "byte" else sampwidth
+
+
+def validate_depth(bits, shift, width):
+    """Checks that bits [shift, shift + bits) fit inside a carrier unit of the given width."""
+    if bits < 1 or shift < 0 or shift + bits > 8 * width:
+        raise ValueError(f"Cannot embed {bits} bits at position {shift} in a {width}-byte carrier unit.")
+
+
+def bits_to_symbols(bits, k):
+    """Groups a bit array (MSB first) into k-bit integers, zero padding the last group."""
+    padded = np.zeros(-(-len(bits) // k) * k, dtype=np.uint32)
+    padded[:len(bits)] = bits
+    weights = np.left_shift(np.uint32(1), np.arange(k - 1, -1, -1, dtype=np.uint32))
+    return (padded.reshape(-1, k) * weights).sum(axis=1, dtype=np.uint32)
+
+
+def symbols_to_bits(symbols, k):
+    """Expands k-bit integers back into a bit array (MSB first)."""
+    shifts = np.arange(k - 1, -1, -1, dtype=np.uint32)
+    return ((symbols[:, None] >> shifts) & 1).astype(np.uint8).ravel()
+
+
+def read_units(raw, count, width):
+    """Assembles the first count little-endian carrier units of a uint8 buffer into uint32 values."""
+    parts = raw[:count * width].reshape(-1, width).astype(np.uint32)
+    units = parts[:, 0].copy()
+    for j in range(1, width):
+        units |= parts[:, j] << np.uint32(8 * j)
+    return units
+
+
+def write_units(raw, units, width):
+    """Writes uint32 carrier units back over the start of a writable uint8 buffer."""
+    parts = raw[:len(units) * width].reshape(-1, width)
+    for j in range(width):
+        parts[:, j] = (units >> np.uint32(8 * j)) & 0xFF
+
+
+def embed_symbols(units, symbols, bits, shift):
+    """Replaces bits [shift, shift + bits) of the leading units with the given symbols."""
+    mask = np.uint32(((1 << bits) - 1) << shift)
+    embedded = units.copy()
+    embedded[:len(symbols)] = (units[:len(symbols)] & ~mask) | (symbols << np.uint32(shift))
+    return embedded
+
+
+def extract_symbols(units, bits, shift):
+    """Reads bits [shift, shift + bits) of every unit."""
+    return (units >> np.uint32(shift)) & np.uint32((1 << bits) - 1)
+
+
+def capacity_report(params, bits=2, shift=0, unit="sample"):
+    """
+    Reports capacity and expected distortion of a depth setting from the WAV header alone.
+
+    The distortion assumes uniformly random payload bits, so each embedded unit changes with
+    probability 1 - 2^-bits and the replaced field contributes (4^bits - 1) / 6 * 4^shift to the
+    mean squared error, scaled by the weight of the byte inside its sample for byte units.
+
+    :param params: wave params (nchannels, sampwidth, framerate, nframes, ...)
+    :param bits: Number of payload bits per carrier unit
+    :param shift: Position of the lowest payload bit inside the unit
+    :param unit: "byte" or "sample"
+    :return: Dictionary with capacity and distortion figures
+    """
+    sampwidth = params.sampwidth
+    width = unit_width(unit, sampwidth)
+    validate_depth(bits, shift, width)
+
+    total_units = params.nframes * params.nchannels * sampwidth // width
+    capacity_bits = max(total_units * bits - HEADER_SIZE * 8, 0)
+
+    field_mse = (4 ** bits - 1) / 6 * 4 ** shift
+    if unit == "byte":
+        # Byte j of a little-endian sample weighs 256^j; embedding hits every byte position equally
+        field_mse *= sum(65536 ** j for j in range(sampwidth)) / sampwidth
+    peak = 2 ** (8 * sampwidth - 1)
+
+    return {
+        "bits": bits,
+        "shift": shift,
+        "unit": unit,
+        "capacity_bits": capacity_bits,
+        "capacity_bytes": capacity_bits // 8,
+        "changed_fraction": 1 - 2 ** -bits,
+        "expected_mse": field_mse,
+        "expected_psnr_db": 10 * math.log10(peak ** 2 / field_mse),
+    }
+
+
+def file_capacity_report(input_file_path, bits=2, shift=0, unit="sample"):
+    """
+    Reports capacity and expected distortion for an audio file without reading its samples.
+
+    :param input_file_path: Path to the audio file
+    :return: Dictionary as returned by capacity_report
+    """
+    return capacity_report(read_params(input_file_path), bits, shift, unit)
+
+
+def encode(input_file_path, output_file_path, secret_message, bits=2, shift=0, unit="sample"):
+    """
+    Encodes a secret message into an audio file using configurable k-bit depth steganography.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output encoded audio file
+    :param secret_message: The message to be encoded
+    :param bits: Number of payload bits per carrier unit
+    :param shift: Position of the lowest payload bit inside the unit
+    :param unit: "byte" to use every byte, "sample" to use every whole sample
+    """
+    try:
+        logger.info("Encoding starts...")
+        params = read_params(input_file_path)
+        if not fits_in_memory(params.data_size * WORK_BYTES_PER_CARRIER_BYTE):
+            encode_chunked(input_file_path, output_file_path, secret_message, bits, shift, unit)
+            logger.info(f"Successfully encoded into {output_file_path}")
+            return
+
+        audio = open_wav(input_file_path)
+        frame_bytes = bytearray(audio.readframes(params.nframes))
+        audio.close()
+
+        width = unit_width(unit, params.sampwidth)
+        validate_depth(bits, shift, width)
+
+        logger.info(f"Secret message: {secret_message}")
+        payload = secret_message.encode() if isinstance(secret_message, str) else secret_message
+        full_bytes = frame_payload(ALGORITHM_ID, payload)
+        symbols = bits_to_symbols(np.unpackbits(np.frombuffer(full_bytes, dtype=np.uint8)), bits)
+
+        # Ensure the message fits into the carrier units
+        if len(symbols) > len(frame_bytes) // width:
+            raise ValueError("The secret message is too large to fit in the audio file.")
+
+        raw = np.frombuffer(frame_bytes, dtype=np.uint8)
+        units = read_units(raw, len(symbols), width)
+        write_units(raw, embed_symbols(units, symbols, bits, shift), width)
+        report_progress("embed", len(symbols) * width, len(symbols) * width, bits=len(full_bytes) * 8)
+
+        # Write the modified bytes to the new audio file
+        write_like(input_file_path, output_file_path, frame_bytes)
+
+        logger.info(f"Successfully encoded into {output_file_path}")
+    except Exception as e:
+        logger.error(f"Error during encoding: {e}")
+
+
+def encode_chunked(input_file_path, output_file_path, secret_message, bits=2, shift=0, unit="sample"):
+    """
+    Produces the same file as encode while holding only one chunk of carrier units in memory.
+
+    encode switches to this when the carrier would exceed the memory budget; errors are raised, not logged.
+    """
+    params = read_params(input_file_path)
+    width = unit_width(unit, params.sampwidth)
+    validate_depth(bits, shift, width)
+
+    logger.info(f"Secret message: {secret_message}")
+    payload = secret_message.encode() if isinstance(secret_message, str) else secret_message
+    symbols = bits_to_symbols(np.unpackbits(np.frombuffer(frame_payload(ALGORITHM_ID, payload), dtype=np.uint8)), bits)
+    if len(symbols) > params.data_size // width:
+        raise ValueError("The secret message is too large to fit in the audio file.")
+
+    def transform(chunk, start):
+        raw = chunk.copy()
+        units = read_units(raw, len(raw) // width, width)
+        write_units(raw, embed_symbols(units, symbols[start // width:start // width + len(units)], bits, shift), width)
+        return raw
+
+    stream_like(input_file_path, output_file_path,
+                chunk_spans(len(symbols) * width, chunk_size(align=width)), transform, bits_per_byte=bits / width)
+
+
+def decode(input_file_path, bits=2, shift=0, unit="sample"):
+    """
+    Decodes a secret message from an audio file using configurable k-bit depth steganography.
+
+    Only the frames covering the container header and the payload are read.
+
+    :param input_file_path: Path to the encoded audio file
+    :param bits: Number of payload bits per carrier unit used when encoding
+    :param shift: Position of the lowest payload bit used when encoding
+    :param unit: Carrier unit used when encoding
+    :return: The decoded secret message
+    """
+    try:
+        logger.info("Decoding starts...")
+        with open_wav(input_file_path) as audio:
+            params = audio.getparams()
+            width = unit_width(unit, params.sampwidth)
+            validate_depth(bits, shift, width)
+
+            def extract_bytes(carrier):
+                raw = np.frombuffer(carrier, dtype=np.uint8)
+                symbols = extract_symbols(read_units(raw, len(raw) // width, width), bits, shift)
+                return np.packbits(symbols_to_bits(symbols, bits)).tobytes()
+
+            # Reads and validates the header frames first, then only the frames holding the payload
+            payload, header = read_framed_payload(audio, extract_bytes, lambda count: -(-count * 8 // bits) * width,
+                                                  ALGORITHM_ID, payload_align=bits)
+            logger.info(f"Extracted message length: {len(payload) * 8} bits")
+
+        decoded_message = decompress_payload(payload, header["flags"]).decode('utf-8', errors='replace')
+        logger.info(f"Successfully decoded: {decoded_message}")
+        return decoded_message
+    except Exception as e:
+        logger.error(f"Error during decoding: {e}")
+        return None
+
+
+def encode_parallel(input_file_path, output_file_path, secret_message, bits=2, shift=0, unit="sample", workers=None):
+    """Encodes a secret message like encode, splitting the embedding across worker processes."""
+    # Imported here because the parallel engine is built on this module's primitives
+    from algorithms import parallel_engine
+
+    payload = secret_message.encode() if isinstance(secret_message, str) else secret_message
+    layout = {"unit": unit, "bits": bits, "shift": shift, "flip": 0}
+    parallel_engine.encode_parallel(input_file_path, output_file_path, frame_payload(ALGORITHM_ID, payload), layout,
+                                    workers)
+
+
+def decode_parallel(input_file_path, bits=2, shift=0, unit="sample", workers=None):
+    """Decodes a secret message like decode, splitting the extraction across worker processes."""
+    from algorithms import parallel_engine
+
+    layout = {"unit": unit, "bits": bits, "shift": shift, "flip": 0}
+    return parallel_engine.decode_parallel(input_file_path, layout, ALGORITHM_ID, workers, encoding='utf-8')
@@ -0,0 +1,220 @@
+import numpy as np
+from utils.logging_util import setup_logger
+from utils.memory import WORK_BYTES_PER_CARRIER_BYTE, chunk_size, chunk_spans, fits_in_memory
+from utils.progress import report_progress
+from utils.riff import open_wav, read_params, stream_like, write_like
+from algorithms.container import (ALGORITHM_IDS, HEADER_SIZE, decompress_payload, frame_payload, parse_header,
+                                  read_carrier_bytes, read_framed_payload)
+from algorithms.kbit_lsb_steganography import bits_to_symbols, symbols_to_bits
+
+logger = setup_logger(__name__)
+
+ALGORITHM_ID = ALGORITHM_IDS["matrix_lsb"]
+
+# Hamming (1, 2^p - 1, p) syndrome coding: every block of 2^p - 1 carrier LSBs carries p payload bits
+# and at most one LSB is flipped to make the block's syndrome equal them. The container header is
+# written with plain LSB in the first HEADER_SIZE * 8 carrier bytes so scanners can read it without p;
+# its parameter byte records p, so decoders learn p from the header before reading any payload block.
+DEFAULT_P = 3
+HEADER_CARRIER_BYTES = HEADER_SIZE * 8
+
+
+def block_length(p):
+    """Returns the number of carrier bytes per block for a code parameter p."""
+    if p < 1 or p > 16:
+        raise ValueError(f"Unsupported matrix embedding parameter p={p}.")
+    return (1 << p) - 1
+
+
+def syndromes(lsbs, p):
+    """
+    Computes the Hamming syndrome of every block of carrier LSBs at once.
+
+    Column j of the parity-check matrix is the binary form of j + 1, so a block's syndrome is the XOR
+    of the (1-based) positions of its set LSBs.
+
+    :param lsbs: uint8 array of LSBs shaped (blocks, 2^p - 1)
+    :param p: Code parameter
+    :return: uint32 array of p-bit syndromes, one per block
+    """
+    positions = np.arange(1, block_length(p) + 1, dtype=np.uint32)
+    return np.bitwise_xor.reduce(np.where(lsbs.astype(bool), positions, np.uint32(0)), axis=1)
+
+
+def capacity_bytes(carrier_bytes, p=DEFAULT_P):
+    """Returns the number of payload bytes (header excluded) that fit in carrier_bytes."""
+    return max((carrier_bytes - HEADER_CARRIER_BYTES) // block_length(p) * p // 8, 0)
+
+
+def carrier_bytes_for(byte_count, p):
+    """Returns the number of leading carrier bytes holding byte_count framed bytes, header included."""
+    if byte_count <= HEADER_SIZE:
+        return byte_count * 8
+    return HEADER_CARRIER_BYTES + -(-(byte_count - HEADER_SIZE) * 8 // p) * block_length(p)
+
+
+def embed_header(region, header_bits):
+    """Writes header bits into the LSBs of a writable carrier region in place; returns bytes changed."""
+    changed = int(np.count_nonzero((region & 1) != header_bits))
+    region[:] = (region & 254) | header_bits
+    return changed
+
+
+def embed_blocks(blocks, targets, p):
+    """
+    Flips at most one LSB per block, in place, so each block's syndrome equals its target.
+
+    :param blocks: Writable uint8 carrier array shaped (blocks, 2^p - 1)
+    :param targets: p-bit target syndromes, one per block
+    :return: Number of blocks changed
+    """
+    # The syndrome differs from the target by the position of the single LSB to flip, if any
+    flips = syndromes(blocks & 1, p) ^ targets
+    rows = np.nonzero(flips)[0]
+    blocks[rows, flips[rows].astype(np.intp) - 1] ^= 1
+    return len(rows)
+
+
+def embed(frame_bytes, framed, p=DEFAULT_P):
+    """
+    Embeds framed bytes into a writable frame buffer: the header with plain LSB, the payload by syndrome coding.
+
+    :param frame_bytes: Writable carrier buffer (bytearray)
+    :param framed: Container header followed by the payload
+    :param p: Code parameter
+    :return: Number of carrier bytes modified
+    """
+    n = block_length(p)
+    if carrier_bytes_for(len(framed), p) > len(frame_bytes):
+        raise ValueError("The secret message is too large to fit in the audio file.")
+
+    carrier = np.frombuffer(frame_bytes, dtype=np.uint8)
+    header_bits = np.unpackbits(np.frombuffer(framed[:HEADER_SIZE], dtype=np.uint8))
+    changed = embed_header(carrier[:len(header_bits)], header_bits)
+
+    targets = bits_to_symbols(np.unpackbits(np.frombuffer(framed[HEADER_SIZE:], dtype=np.uint8)), p)
+    blocks = carrier[HEADER_CARRIER_BYTES:HEADER_CARRIER_BYTES + len(targets) * n].reshape(-1, n)
+    return changed + embed_blocks(blocks, targets, p)
+
+
+def embed_file_chunked(input_file_path, output_file_path, framed, p=DEFAULT_P):
+    """
+    Produces the same file as embedding into the whole carrier, holding only one chunk of blocks in memory.
+
+    :return: Number of carrier bytes modified
+    """
+    n = block_length(p)
+    end = carrier_bytes_for(len(framed), p)
+    if end > read_params(input_file_path).data_size:
+        raise ValueError("The secret message is too large to fit in the audio file.")
+
+    header_bits = np.unpackbits(np.frombuffer(framed[:HEADER_SIZE], dtype=np.uint8))
+    targets = bits_to_symbols(np.unpackbits(np.frombuffer(framed[HEADER_SIZE:], dtype=np.uint8)), p)
+    changed = 0
+
+    def transform(chunk, start):
+        nonlocal changed
+        region = chunk.copy()
+        if start < HEADER_CARRIER_BYTES:
+            changed += embed_header(region, header_bits[start:start + len(region)])
+        else:
+            first = (start - HEADER_CARRIER_BYTES) // n
+            changed += embed_blocks(region.reshape(-1, n), targets[first:first + len(region) // n], p)
+        return region
+
+    # The header span is kept apart so every later span starts on a block boundary
+    header_end = min(end, HEADER_CARRIER_BYTES)
+    spans = chunk_spans(header_end, HEADER_CARRIER_BYTES) + chunk_spans(end, chunk_size(align=n), header_end)
+    stream_like(input_file_path, output_file_path, spans, transform, bits_per_byte=len(framed) * 8 / end)
+    return changed
+
+
+def extract_body(carrier, p=DEFAULT_P):
+    """Reads the payload bytes held by the whole blocks of carrier bytes that start on a block boundary."""
+    n = block_length(p)
+    carrier = np.frombuffer(carrier, dtype=np.uint8)
+    blocks = carrier[:len(carrier) // n * n].reshape(-1, n)
+    return np.packbits(symbols_to_bits(syndromes(blocks & 1, p), p)).tobytes()
+
+
+def extract_bytes(carrier, p=DEFAULT_P):
+    """
+    Reads the framed bytes held by leading carrier bytes: LSBs of the header region, then block syndromes.
+
+    :param carrier: Leading carrier bytes
+    :param p: Code parameter
+    :return: Extracted bytes
+    """
+    carrier = np.frombuffer(carrier, dtype=np.uint8)
+    header = np.packbits(carrier[:HEADER_CARRIER_BYTES] & 1).tobytes()
+    return header + extract_body(carrier[HEADER_CARRIER_BYTES:], p)
+
+
+def encode(input_file_path, output_file_path, secret_message, p=DEFAULT_P):
+    """
+    Encodes a secret message into an audio file using Hamming matrix embedding.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output encoded audio file
+    :param secret_message: The message to be encoded
+    :param p: Code parameter; p bits go into every 2^p - 1 carrier bytes with at most one change
+    """
+    try:
+        logger.info("Encoding starts...")
+        logger.info(f"Secret message: {secret_message}")
+        payload = secret_message.encode() if isinstance(secret_message, str) else secret_message
+        framed = frame_payload(ALGORITHM_ID, payload, param=p)
+
+        if fits_in_memory(read_params(input_file_path).data_size * WORK_BYTES_PER_CARRIER_BYTE):
+            with open_wav(input_file_path) as audio:
+                frame_bytes = bytearray(audio.readframes(audio.getnframes()))
+            changed = embed(frame_bytes, framed, p)
+            end = carrier_bytes_for(len(framed), p)
+            report_progress("embed", end, end, bits=len(framed) * 8)
+
+            # Write the modified bytes to the new audio file
+            write_like(input_file_path, output_file_path, frame_bytes)
+        else:
+            # Carriers over the memory budget are streamed through a block-aligned chunk at a time
+            changed = embed_file_chunked(input_file_path, output_file_path, framed, p)
+        logger.info(f"Modified {changed} carrier bytes")
+
+        logger.info(f"Successfully encoded into {output_file_path}")
+    except Exception as e:
+        logger.error(f"Error during encoding: {e}")
+
+
+def header_p(audio, default=DEFAULT_P):
+    """Returns the code parameter recorded in the container header of an open wave file, or default if none is."""
+    head = np.frombuffer(read_carrier_bytes(audio, HEADER_CARRIER_BYTES), dtype=np.uint8)[:HEADER_CARRIER_BYTES]
+    return parse_header(np.packbits(head & 1), ALGORITHM_ID)["param"] or default
+
+
+def decode(input_file_path, p=None):
+    """
+    Decodes a secret message from an audio file using Hamming matrix embedding.
+
+    Only the frames covering the container header and the payload blocks are read.
+
+    :param input_file_path: Path to the encoded audio file
+    :param p: Code parameter for files whose header does not record it; None uses DEFAULT_P
+    :return: The decoded secret message
+    """
+    try:
+        logger.info("Decoding starts...")
+        with open_wav(input_file_path) as audio:
+            p = header_p(audio, p or DEFAULT_P)
+            payload, header = read_framed_payload(audio, lambda carrier: extract_bytes(carrier, p),
+                                                  lambda count: carrier_bytes_for(count, p), ALGORITHM_ID,
+                                                  payload_align=p,
+                                                  extract_body=lambda carrier: extract_body(carrier, p))
+        if header is None:
+            raise ValueError("No container header found.")
+        logger.info(f"Extracted message length: {len(payload) * 8} bits")
+
+        decoded_message = decompress_payload(payload, header["flags"]).decode('utf-8', errors='replace')
+        logger.info(f"Successfully decoded: {decoded_message}")
+        return decoded_message
+    except Exception as e:
+        logger.error(f"Error during decoding: {e}")
+        return None
@@ -0,0 +1,276 @@
+import os
+import struct
+import zlib
+import numpy as np
+from utils.logging_util import setup_logger
+from utils.riff import open_wav, parse_wav, read_params, stream_like
+from algorithms.incremental_update import patch_payload_region, recover
+from algorithms.container import (ALGORITHM_IDS, HEADER_SIZE, compress_payload, decompress_payload, pack_header,
+                                  read_carrier_range, read_framed_payload)
+
+logger = setup_logger(__name__)
+
+ALGORITHM_ID = ALGORITHM_IDS["multi_lsb"]
+
+# Several independently addressable records in the LSBs of one carrier (one bit per carrier byte).
+# The head holds a container header whose payload is a fixed-size table of contents; each record
+# sits at its own offset after it. Offsets and lengths count embedded bytes, so record byte i lives
+# in carrier bytes [8 * (offset + i), 8 * (offset + i + 1)) of the data chunk.
+DEFAULT_SLOTS = 16
+TOC_HEADER = struct.Struct('>HH')  # slot count, records in use
+TOC_ENTRY = struct.Struct('>IQIB3xI')  # record id, offset, length, compression flags, CRC32 of the stored bytes
+
+
+def toc_size(slots):
+    """Returns the size in bytes of a table of contents with the given number of slots, CRC included."""
+    return TOC_HEADER.size + slots * TOC_ENTRY.size + 4
+
+
+def carrier_bytes_for(byte_count):
+    """Returns the number of carrier bytes holding byte_count embedded bytes."""
+    return byte_count * 8
+
+
+def capacity_bytes(carrier_bytes, slots=DEFAULT_SLOTS):
+    """Returns the record bytes (all records together) a carrier of carrier_bytes can hold."""
+    return max(carrier_bytes // 8 - HEADER_SIZE - toc_size(slots), 0)
+
+
+def extract_bytes(carrier):
+    """Packs the LSB of every carrier byte back into embedded bytes."""
+    return np.packbits(np.frombuffer(carrier, dtype=np.uint8) & 1).tobytes()
+
+
+def embed_bytes(carrier, data):
+    """Returns carrier bytes (uint8 array) with the bits of data written into their LSBs."""
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    return (carrier[:len(bits)] & 254) | bits
+
+# ========================== TABLE OF CONTENTS ============================
+def pack_toc(entries, slots):
+    """
+    Serializes a table of contents.
+
+    :param entries: List of entry dicts (id, offset, length, flags, crc)
+    :param slots: Number of slots; unused ones are zero filled so the table never changes size
+    :return: toc_size(slots) bytes
+    """
+    if len(entries) > slots:
+        raise ValueError(f"The table of contents is full ({slots} records).")
+    body = TOC_HEADER.pack(slots, len(entries)) + b''.join(
+        TOC_ENTRY.pack(entry["id"], entry["offset"], entry["length"], entry["flags"], entry["crc"])
+        for entry in entries)
+    body = body.ljust(toc_size(slots) - 4, b'\0')
+    return body + struct.pack('>I', zlib.crc32(body))
+
+
+def parse_toc(data):
+    """
+    Validates and unpacks a table of contents.
+
+    :param data: Bytes extracted after the container header
+    :return: Tuple (slots, list of entry dicts)
+    """
+    if len(data) < TOC_HEADER.size + 4:
+        raise ValueError("Table of contents is truncated.")
+    body, (crc,) = data[:-4], struct.unpack('>I', data[-4:])
+    if zlib.crc32(body) != crc:
+        raise ValueError("Table of contents checksum mismatch.")
+
+    slots, count = TOC_HEADER.unpack_from(body)
+    if len(data) != toc_size(slots) or count > slots:
+        raise ValueError("Table of contents is malformed.")
+    entries = []
+    for index in range(count):
+        fields = TOC_ENTRY.unpack_from(body, TOC_HEADER.size + index * TOC_ENTRY.size)
+        entries.append(dict(zip(("id", "offset", "length", "flags", "crc"), fields)))
+    return slots, entries
+
+
+def read_toc(audio):
+    """Reads the table of contents from an open wave reader, touching only the frames it occupies."""
+    toc, _ = read_framed_payload(audio, extract_bytes, carrier_bytes_for, ALGORITHM_ID)
+    return parse_toc(toc)
+
+
+def head_bytes(entries, slots):
+    """Returns the container header followed by the table of contents."""
+    return pack_header(ALGORITHM_ID, toc_size(slots)) + pack_toc(entries, slots)
+
+
+def find_entry(entries, record_id=None):
+    """Returns the entry of a record id, or of the most recently added record when record_id is None."""
+    if not entries:
+        raise ValueError("The carrier holds no records.")
+    if record_id is None:
+        return entries[-1]
+    for entry in entries:
+        if entry["id"] == record_id:
+            return entry
+    raise ValueError(f"No record with id {record_id}.")
+
+# ========================== REGION WRITES ============================
+def _write_region(file_path, offset, data):
+    """Embeds data at an embedded-byte offset in place, reading and writing only the carrier bytes it covers."""
+    start, stop = carrier_bytes_for(offset), carrier_bytes_for(offset + len(data))
+    with open(file_path, 'r+b') as file:
+        params = parse_wav(file)
+        if stop > params.data_size:
+            raise ValueError("The record is too large to fit in the audio file.")
+        file.seek(params.data_offset + start)
+        carrier = np.frombuffer(file.read(stop - start), dtype=np.uint8)
+        file.seek(params.data_offset + start)
+        file.write(embed_bytes(carrier, data).tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _write_toc(file_path, entries, slots):
+    """
+    Replaces the table of contents through the update journal, so a torn write is either replayed in full
+    by recover() or, if the journal itself was torn, never touched the carrier.
+    """
+    start, stop = carrier_bytes_for(HEADER_SIZE), carrier_bytes_for(HEADER_SIZE + toc_size(slots))
+    toc = pack_toc(entries, slots)
+
+    def transform(region):
+        region[start:stop] = embed_bytes(region[start:stop], toc)
+        return region
+
+    patch_payload_region(file_path, stop, transform)
+
+
+def create(input_file_path, output_file_path, slots=DEFAULT_SLOTS):
+    """
+    Writes a copy of an audio file with an empty table of contents at its head.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output carrier; may be the input itself
+    :param slots: Maximum number of records the carrier will hold
+    """
+    head = head_bytes([], slots)
+    if carrier_bytes_for(len(head)) > read_params(input_file_path).data_size:
+        raise ValueError("The audio file is too small for a table of contents.")
+    stream_like(input_file_path, output_file_path, [(0, carrier_bytes_for(len(head)))],
+                lambda chunk, start: embed_bytes(chunk, head), bits_per_byte=1)
+
+
+def add_record(file_path, message, record_id=None):
+    """
+    Appends a record to a carrier made by create, in place.
+
+    Only the carrier bytes of the new record and of the table of contents are written. The record goes
+    into free space first; the table is then replaced through the update journal. An append interrupted
+    before the journal is complete leaves the previous table, and every earlier record, intact; one
+    interrupted after it is completed by recover() on the next access.
+
+    :param file_path: Path to the carrier
+    :param message: Text or bytes to store
+    :param record_id: Id to store the record under; defaults to one more than the largest id in use
+    :return: The record id
+    """
+    recover(file_path)
+    with open_wav(file_path) as audio:
+        slots, entries = read_toc(audio)
+
+    if record_id is None:
+        record_id = max((entry["id"] for entry in entries), default=0) + 1
+    elif any(entry["id"] == record_id for entry in entries):
+        raise ValueError(f"A record with id {record_id} already exists.")
+    if len(entries) >= slots:
+        raise ValueError(f"The table of contents is full ({slots} records).")
+
+    data = message.encode() if isinstance(message, str) else message
+    stored, flags = compress_payload(data)
+    offset = max((entry["offset"] + entry["length"] for entry in entries), default=HEADER_SIZE + toc_size(slots))
+
+    _write_region(file_path, offset, stored)
+    entries.append({"id": record_id, "offset": offset, "length": len(stored), "flags": flags,
+                    "crc": zlib.crc32(stored)})
+    _write_toc(file_path, entries, slots)
+    return record_id
+
+
+def list_records(file_path):
+    """Returns the table of contents entries of a carrier, in the order the records were added."""
+    recover(file_path)
+    with open_wav(file_path) as audio:
+        return read_toc(audio)[1]
+
+
+def read_record(file_path, record_id=None):
+    """
+    Extracts one record, reading only the frames of the table of contents and of that record.
+
+    :param file_path: Path to the carrier
+    :param record_id: Id of the record; None reads the most recently added one
+    :return: The record bytes
+    """
+    recover(file_path)
+    with open_wav(file_path) as audio:
+        _, entries = read_toc(audio)
+        entry = find_entry(entries, record_id)
+        start, stop = carrier_bytes_for(entry["offset"]), carrier_bytes_for(entry["offset"] + entry["length"])
+        if stop > audio.getnframes() * audio.getsampwidth() * audio.getnchannels():
+            raise ValueError("The record extends beyond the available audio data.")
+        stored = extract_bytes(read_carrier_range(audio, start, stop))
+
+    if zlib.crc32(stored) != entry["crc"]:
+        raise ValueError(f"Record {entry['id']} checksum mismatch.")
+    return decompress_payload(stored, entry["flags"])
+
+# ========================== ENCODE & DECODE ============================
+def encode(input_file_path, output_file_path, secret_message, slots=DEFAULT_SLOTS):
+    """
+    Encodes a secret message as the first record of a new multi-payload carrier.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output encoded audio file
+    :param secret_message: The message to be encoded
+    :param slots: Maximum number of records the carrier will hold
+    """
+    try:
+        logger.info("Encoding starts...")
+        logger.info(f"Secret message: {secret_message}")
+        create(input_file_path, output_file_path, slots)
+        record_id = add_record(output_file_path, secret_message)
+        logger.info(f"Successfully encoded record {record_id} into {output_file_path}")
+    except Exception as e:
+        logger.error(f"Error during encoding: {e}")
+
+
+def append(file_path, secret_message, record_id=None):
+    """
+    Adds a secret message as a new record of an existing multi-payload carrier.
+
+    :param file_path: Path to the carrier, updated in place
+    :param secret_message: The message to be encoded
+    :param record_id: Id to store the record under (defaults to the next free id)
+    :return: The record id, or None on failure
+    """
+    try:
+        logger.info("Appending record...")
+        record_id = add_record(file_path, secret_message, record_id)
+        logger.info(f"Successfully appended record {record_id} to {file_path}")
+        return record_id
+    except Exception as e:
+        logger.error(f"Error during append: {e}")
+        return None
+
+
+def decode(input_file_path, record_id=None):
+    """
+    Decodes one record of a multi-payload carrier.
+
+    :param input_file_path: Path to the encoded audio file
+    :param record_id: Id of the record; None decodes the most recently added one
+    :return: The decoded secret message
+    """
+    try:
+        logger.info("Decoding starts...")
+        decoded_message = read_record(input_file_path, record_id).decode('utf-8', errors='replace')
+        logger.info(f"Successfully decoded: {decoded_message}")
+        return decoded_message
+    except Exception as e:
+        logger.error(f"Error during decoding: {e}")
+        return None
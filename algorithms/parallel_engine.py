@@ -0,0 +1,192 @@
+import os
+import mmap
+import shutil
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from utils.logging_util import setup_logger
+from utils.riff import read_params
+from algorithms.container import HEADER_SIZE, decompress_payload, payload_span
+from algorithms.kbit_lsb_steganography import (bits_to_symbols, symbols_to_bits, read_units, write_units,
+                                               embed_symbols, extract_symbols, unit_width, validate_depth)
+
+logger = setup_logger(__name__)
+
+# Bit layouts of the existing algorithms, expressed as k-bit depth settings.
+# "flip" is XORed into units whose payload field must change (enhanced_lsb_steganography_with_flip).
+LSB_LAYOUT = {"unit": "byte", "bits": 1, "shift": 0, "flip": 0}
+ENHANCED_LAYOUT = {"unit": "byte", "bits": 2, "shift": 2, "flip": 0}
+ENHANCED_FLIP_LAYOUT = {"unit": "byte", "bits": 2, "shift": 2, "flip": 3}
+
+MIN_SLICE_UNITS = 1 << 16  # Below this, process startup costs more than the slice
+
+
+def _map_slice(file, access, byte_start, byte_stop):
+    """Memory-maps [byte_start, byte_stop) of a file, returning (mmap, uint8 view of the range)."""
+    aligned = byte_start - byte_start % mmap.ALLOCATIONGRANULARITY
+    mapped = mmap.mmap(file.fileno(), byte_stop - aligned, access=access, offset=aligned)
+    view = np.frombuffer(mapped, dtype=np.uint8, count=byte_stop - byte_start, offset=byte_start - aligned)
+    return mapped, view
+
+
+def _embed_slice(path, data_offset, width, layout, start_unit, payload_slice):
+    """Worker: embeds a byte-aligned payload slice into its units of the memory-mapped file in place."""
+    bits, shift = layout["bits"], layout["shift"]
+    symbols = bits_to_symbols(np.unpackbits(np.frombuffer(payload_slice, dtype=np.uint8)), bits)
+    byte_start = data_offset + start_unit * width
+
+    with open(path, 'r+b') as file:
+        mapped, raw = _map_slice(file, mmap.ACCESS_WRITE, byte_start, byte_start + len(symbols) * width)
+        units = read_units(raw, len(symbols), width)
+        if layout["flip"]:
+            field = np.uint32(((1 << bits) - 1) << shift)
+            units = np.where((units & field) != (symbols << np.uint32(shift)), units ^ np.uint32(layout["flip"]), units)
+        write_units(raw, embed_symbols(units, symbols, bits, shift), width)
+        del raw
+        mapped.flush()
+        mapped.close()
+    return len(symbols)
+
+
+def _extract_slice(path, data_offset, width, layout, start_unit, stop_unit):
+    """Worker: extracts the packed payload bytes held by units [start_unit, stop_unit)."""
+    bits, shift = layout["bits"], layout["shift"]
+    byte_start = data_offset + start_unit * width
+
+    with open(path, 'rb') as file:
+        mapped, raw = _map_slice(file, mmap.ACCESS_READ, byte_start, byte_start + (stop_unit - start_unit) * width)
+        symbols = extract_symbols(read_units(raw, stop_unit - start_unit, width), bits, shift)
+        del raw
+        mapped.close()
+    return np.packbits(symbols_to_bits(symbols, bits)).tobytes()
+
+
+def _plan_slices(total_units, bits, workers):
+    """Splits [0, total_units) into per-worker ranges whose bit offsets are byte aligned."""
+    alignment = 8 // np.gcd(8, bits)  # Units per whole number of payload bytes
+    per_worker = max(-(-total_units // workers), MIN_SLICE_UNITS)
+    per_worker = -(-per_worker // alignment) * alignment
+    return [(start, min(start + per_worker, total_units)) for start in range(0, total_units, per_worker)]
+
+
+def _run_tasks(worker, tasks):
+    """Runs worker(*task) for every task, in a process pool only when there is more than one slice."""
+    if len(tasks) <= 1:
+        return [worker(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = [pool.submit(worker, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def _open_layout(path, layout):
+    """Returns (data_offset, data_size, unit width) for a file and validates the layout against it."""
+    params = read_params(path)
+    width = unit_width(layout["unit"], params.sampwidth)
+    validate_depth(layout["bits"], layout["shift"], width)
+    return params.data_offset, params.data_size, width
+
+
+def parallel_embed(input_file_path, output_file_path, payload, layout, workers=None):
+    """
+    Embeds payload bytes from the start of the carrier using one process per slice.
+
+    The input is copied to the output file, which every worker memory-maps and edits in place,
+    so frame data is never pickled between processes. An output that is the input itself is
+    edited in place without the copy, as the serial encoders do.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output encoded audio file
+    :param payload: Bytes to embed, including any framing
+    :param layout: Bit layout dict (unit, bits, shift, flip)
+    :param workers: Number of worker processes (defaults to the CPU count)
+    """
+    data_offset, data_size, width = _open_layout(input_file_path, layout)
+    bits = layout["bits"]
+    total_units = -(-len(payload) * 8 // bits)
+    if total_units > data_size // width:
+        raise ValueError("The secret message is too large to fit in the audio file.")
+
+    if not (os.path.exists(output_file_path) and os.path.samefile(input_file_path, output_file_path)):
+        shutil.copyfile(input_file_path, output_file_path)
+
+    slices = _plan_slices(total_units, bits, workers or os.cpu_count())
+    tasks = [(output_file_path, data_offset, width, layout, start, payload[start * bits // 8:-(-stop * bits // 8)])
+             for start, stop in slices]
+    _run_tasks(_embed_slice, tasks)
+
+    logger.info(f"Embedded {len(payload)} bytes into {output_file_path} using {len(slices)} workers")
+
+
+def parallel_extract(input_file_path, layout, byte_count=None, byte_start=0, workers=None):
+    """
+    Extracts payload bytes from the carrier using one process per slice.
+
+    :param input_file_path: Path to the encoded audio file
+    :param layout: Bit layout dict (unit, bits, shift, flip)
+    :param byte_count: Number of payload bytes to extract (None extracts the full capacity)
+    :param byte_start: Payload byte offset to start from; must fall on a unit boundary
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :return: Extracted bytes
+    """
+    data_offset, data_size, width = _open_layout(input_file_path, layout)
+    bits = layout["bits"]
+    if byte_start * 8 % bits:
+        raise ValueError("byte_start does not fall on a carrier unit boundary.")
+
+    first_unit = byte_start * 8 // bits
+    available_units = data_size // width - first_unit
+    if byte_count is None:
+        byte_count = available_units * bits // 8
+    total_units = -(-byte_count * 8 // bits)
+    if total_units > available_units:
+        raise ValueError("The extracted message length is larger than the available audio data.")
+
+    slices = _plan_slices(total_units, bits, workers or os.cpu_count())
+    tasks = [(input_file_path, data_offset, width, layout, first_unit + start, first_unit + stop)
+             for start, stop in slices]
+    return b''.join(_run_tasks(_extract_slice, tasks))[:byte_count]
+
+
+def encode_parallel(input_file_path, output_file_path, payload, layout, workers=None):
+    """
+    Encodes framed payload bytes with parallel_embed, logging instead of raising like the algorithms' encode.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output encoded audio file
+    :param payload: Bytes to embed, including the container header
+    :param layout: Bit layout dict (unit, bits, shift, flip)
+    :param workers: Number of worker processes (defaults to the CPU count)
+    """
+    try:
+        logger.info("Parallel encoding starts...")
+        parallel_embed(input_file_path, output_file_path, payload, layout, workers)
+        logger.info(f"Successfully encoded into {output_file_path}")
+    except Exception as e:
+        logger.error(f"Error during encoding: {e}")
+
+
+def decode_parallel(input_file_path, layout, algorithm_id, workers=None, encoding='latin-1'):
+    """
+    Decodes a framed (or legacy length-prefixed) message with parallel_extract, reading the header first.
+
+    :param input_file_path: Path to the encoded audio file
+    :param layout: Bit layout dict (unit, bits, shift, flip)
+    :param algorithm_id: Algorithm id the payload must carry
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :param encoding: Text encoding of the message; latin-1 maps every byte to one character
+    :return: The decoded secret message, or None on failure
+    """
+    try:
+        logger.info("Parallel decoding starts...")
+        start, length, header = payload_span(parallel_extract(input_file_path, layout, HEADER_SIZE), algorithm_id)
+        logger.info(f"Extracted message length: {length * 8} bits")
+
+        message_bytes = parallel_extract(input_file_path, layout, start + length, workers=workers)[start:]
+        if header is not None:
+            message_bytes = decompress_payload(message_bytes, header["flags"])
+        decoded_message = message_bytes.decode(encoding, errors='replace')
+
+        logger.info(f"Successfully decoded: {decoded_message}")
+        return decoded_message
+    except Exception as e:
+        logger.error(f"Error during decoding: {e}")
+        return None
@@ -0,0 +1,226 @@
+import math
+import numpy as np
+from utils.logging_util import setup_logger
+from utils.memory import WORK_BYTES_PER_CARRIER_BYTE, chunk_size, chunk_spans, fits_in_memory
+from utils.progress import report_progress
+from utils.riff import open_wav, read_params, stream_like, write_like, frames_to_float, float_to_frames
+from algorithms.container import (ALGORITHM_IDS, HEADER_SIZE, decompress_payload, frame_payload, parse_header,
+                                  read_carrier_bytes, read_framed_payload)
+
+logger = setup_logger(__name__)
+
+ALGORITHM_ID = ALGORITHM_IDS["spectral"]
+
+# Every block of BLOCK_SIZE frames carries BITS_PER_BLOCK payload bits. Each bit is voted by
+# PAIRS_PER_BIT pairs of adjacent sub-bands of SUBBAND_WIDTH FFT bins in the mid band, starting at
+# BAND_START of Nyquist: a 1 makes the lower sub-band of every pair at least MARGIN times louder than
+# the upper one, a 0 the reverse. Mid-band magnitudes are what a perceptual codec spends its bits on,
+# so the relation survives round-trips that wipe LSBs; wider sub-bands trade capacity for robustness.
+BLOCK_SIZE = 1024
+BITS_PER_BLOCK = 8
+PAIRS_PER_BIT = 8
+SUBBAND_WIDTH = 1
+BAND_START = 0.05
+MARGIN = 1.5
+
+
+def band_bins(block_size=BLOCK_SIZE, bits_per_block=BITS_PER_BLOCK, pairs_per_bit=PAIRS_PER_BIT,
+              subband_width=SUBBAND_WIDTH):
+    """
+    Returns the rfft bin indices used by a block, shaped (pairs_per_bit, bits_per_block, 2, subband_width).
+
+    Pairs of one bit are interleaved across the band so a narrow-band loss only costs each bit a few votes.
+    """
+    first = max(1, int(BAND_START * block_size / 2))
+    count = 2 * bits_per_block * pairs_per_bit * subband_width
+    if first + count > block_size // 2:
+        raise ValueError("The spectral band does not fit in the block.")
+    return first + np.arange(count).reshape(pairs_per_bit, bits_per_block, 2, subband_width)
+
+
+def capacity_bits(nframes):
+    """Returns the number of payload bits, header included, a carrier of nframes can hold."""
+    return nframes // BLOCK_SIZE * BITS_PER_BLOCK
+
+
+def carrier_frames_for(byte_count):
+    """Returns the number of leading frames holding byte_count payload bytes."""
+    return -(-byte_count * 8 // BITS_PER_BLOCK) * BLOCK_SIZE
+
+
+def embed_bits(samples, bits):
+    """
+    Embeds a bit array into the mid-band spectrum of consecutive blocks, in place.
+
+    The spectrum is taken of the channel mix and the same correction is added to every channel,
+    so joint-stereo coding keeps the embedded relation intact.
+
+    :param samples: Float samples shaped (frames, channels), covering at least the blocks needed
+    :param bits: uint8 array of payload bits
+    """
+    block_count = -(-len(bits) // BITS_PER_BLOCK)
+    padded = np.zeros(block_count * BITS_PER_BLOCK, dtype=np.uint8)
+    padded[:len(bits)] = bits
+    targets = padded.reshape(block_count, 1, BITS_PER_BLOCK).astype(bool)
+
+    # Non-overlapping blocks as a (blocks, BLOCK_SIZE) view, transformed all at once
+    region = samples[:block_count * BLOCK_SIZE]
+    spectrum = np.fft.rfft(region.mean(axis=1).reshape(block_count, BLOCK_SIZE), axis=1)
+
+    bins = band_bins()
+    magnitudes = np.abs(spectrum[:, bins]).sum(axis=-1)  # (blocks, pairs, bits, 2) sub-band magnitudes
+    lower, upper = magnitudes[..., 0], magnitudes[..., 1]
+
+    # Pairs already ordered with enough margin are left alone; the others are rebalanced
+    # to exactly MARGIN, keeping the pair's total magnitude and every bin's phase
+    total = lower + upper
+    strong = total * MARGIN / (1 + MARGIN)
+    weak = total / (1 + MARGIN)
+    satisfied = np.where(targets, lower >= MARGIN * upper, upper >= MARGIN * lower)
+    new_lower = np.where(satisfied, lower, np.where(targets, strong, weak))
+    new_upper = np.where(satisfied, upper, np.where(targets, weak, strong))
+
+    gains = np.stack((new_lower, new_upper), axis=-1) / np.where(magnitudes > 0, magnitudes, 1)
+    modified = spectrum.copy()
+    modified[:, bins] *= gains[..., None]
+
+    correction = np.fft.irfft(modified - spectrum, n=BLOCK_SIZE, axis=1).reshape(-1, 1)
+    region += correction
+
+
+def extract_bits(samples, block_count):
+    """
+    Reads the bits carried by the first block_count blocks.
+
+    Each bit is the sign of the summed normalized magnitude differences of its pairs.
+
+    :param samples: Float samples shaped (frames, channels)
+    :return: uint8 array of block_count * BITS_PER_BLOCK bits
+    """
+    mix = samples[:block_count * BLOCK_SIZE].mean(axis=1).reshape(block_count, BLOCK_SIZE)
+    spectrum = np.abs(np.fft.rfft(mix, axis=1))
+
+    magnitudes = spectrum[:, band_bins()].sum(axis=-1)
+    lower, upper = magnitudes[..., 0], magnitudes[..., 1]
+    votes = ((lower - upper) / np.maximum(lower + upper, np.finfo(np.float64).tiny)).sum(axis=1)
+    return (votes > 0).astype(np.uint8).ravel()
+
+
+def embed_payload(input_file_path, output_file_path, payload):
+    """
+    Writes framed payload bytes into the spectrum of an audio file.
+
+    Only the leading blocks the payload needs are read and transformed; the rest of the frames are
+    copied unchanged. When those blocks would exceed the memory budget they are streamed through in
+    chunks of whole blocks, with the same result.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output encoded audio file
+    :param payload: Bytes to embed, including the container header
+    """
+    params = read_params(input_file_path)
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    if len(bits) > capacity_bits(params.nframes):
+        raise ValueError("The secret message is too large to fit in the audio file.")
+
+    block_bytes = BLOCK_SIZE * params.sampwidth * params.nchannels
+    split = carrier_frames_for(len(payload)) * params.sampwidth * params.nchannels
+
+    if fits_in_memory(split * WORK_BYTES_PER_CARRIER_BYTE):
+        with open_wav(input_file_path) as audio:
+            samples = frames_to_float(read_carrier_bytes(audio, split), params)
+        embed_bits(samples, bits)
+        report_progress("embed", split, split, bits=len(bits))
+        write_like(input_file_path, output_file_path, float_to_frames(samples, params))
+        return
+
+    def transform(chunk, start):
+        samples = frames_to_float(chunk, params)
+        first = start // block_bytes * BITS_PER_BLOCK
+        embed_bits(samples, bits[first:first + len(samples) // BLOCK_SIZE * BITS_PER_BLOCK])
+        return np.frombuffer(float_to_frames(samples, params), dtype=np.uint8)
+
+    stream_like(input_file_path, output_file_path, chunk_spans(split, chunk_size(align=block_bytes)), transform,
+                bits_per_byte=BITS_PER_BLOCK / block_bytes)
+
+
+def extract_bytes(carrier, params):
+    """Returns the payload bytes carried by the whole blocks of a leading carrier byte range."""
+    samples = frames_to_float(carrier, params)
+    return np.packbits(extract_bits(samples, len(samples) // BLOCK_SIZE)).tobytes()
+
+
+def read_header(input_file_path):
+    """
+    Reads and validates the container header from the first blocks of an audio file.
+
+    Spectral payloads cannot be seen in the raw head bytes the scanner reads, so this is the
+    cheapest way to tell whether a file carries one.
+
+    :return: Header dictionary as returned by parse_header
+    """
+    with open_wav(input_file_path) as audio:
+        params = audio.getparams()
+        head = read_carrier_bytes(audio, carrier_frames_for(HEADER_SIZE) * params.sampwidth * params.nchannels)
+    return parse_header(extract_bytes(head, params))
+
+
+def extract_payload(input_file_path, expected_algorithm=ALGORITHM_ID):
+    """
+    Reads a framed payload from the spectrum of an audio file, touching only the blocks it occupies.
+
+    :param input_file_path: Path to the encoded audio file
+    :param expected_algorithm: Algorithm id the caller decodes with
+    :return: Tuple (payload bytes, header dict)
+    """
+    with open_wav(input_file_path) as audio:
+        params = audio.getparams()
+        frame_size = params.sampwidth * params.nchannels
+        payload, header = read_framed_payload(audio, lambda carrier: extract_bytes(carrier, params),
+                                              lambda count: carrier_frames_for(count) * frame_size, expected_algorithm,
+                                              payload_align=BITS_PER_BLOCK // math.gcd(8, BITS_PER_BLOCK))
+
+    if header is None:
+        raise ValueError("No container header found.")
+    return payload, header
+
+
+def encode(input_file_path, output_file_path, secret_message):
+    """
+    Encodes a secret message into the mid-band spectrum of an audio file.
+
+    :param input_file_path: Path to the input audio file
+    :param output_file_path: Path to the output encoded audio file
+    :param secret_message: The message to be encoded
+    """
+    try:
+        logger.info("Encoding starts...")
+        logger.info(f"Secret message: {secret_message}")
+        payload = secret_message.encode() if isinstance(secret_message, str) else secret_message
+        embed_payload(input_file_path, output_file_path, frame_payload(ALGORITHM_ID, payload))
+        logger.info(f"Successfully encoded into {output_file_path}")
+    except Exception as e:
+        logger.error(f"Error during encoding: {e}")
+
+
+def decode(input_file_path):
+    """
+    Decodes a secret message from the mid-band spectrum of an audio file.
+
+    The file may have been through a lossy round-trip, as long as it was decoded back to WAV
+    with the encoder delay removed.
+
+    :param input_file_path: Path to the encoded audio file
+    :return: The decoded secret message
+    """
+    try:
+        logger.info("Decoding starts...")
+        payload, header = extract_payload(input_file_path)
+        logger.info(f"Extracted message length: {len(payload) * 8} bits")
+
+        decoded_message = decompress_payload(payload, header["flags"]).decode('utf-8', errors='replace')
+        logger.info(f"Successfully decoded: {decoded_message}")
+        return decoded_message
+    except Exception as e:
+        logger.error(f"Error during decoding: {e}")
+        return None
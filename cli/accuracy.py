@@ -1,11 +1,17 @@
 import numpy as np
 import os
-import wave
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
 from pydub import AudioSegment
 from Levenshtein import distance as levenshtein_distance
 from utils.logging_util import setup_logger
+from utils.memory import WORK_BYTES_PER_CARRIER_BYTE, chunk_size, fits_in_memory
+from utils.progress import progress_callback, report_progress
+from utils.riff import open_wav, read_params, write_like, frames_to_float
 import soundfile as sf
-from aes import lsb_encode, lsb_decode, encrypt_message, decrypt_message, AES_KEY
+from aes import lsb_encode, lsb_decode, encrypt_message, decrypt_message, AES_KEY, lsb_bytes
+from algorithms.container import HEADER_SIZE, parse_header, read_carrier_bytes
 
 # Initialize logger
 logger = setup_logger(__name__)
@@ -19,7 +25,7 @@ def lsb_basic_encode(input_audio, output_audio, message):
     message += '###'  # Delimiter to signal end
     message_bits = ''.join(format(ord(char), '08b') for char in message)
     
-    with wave.open(input_audio, 'rb') as audio:
+    with open_wav(input_audio) as audio:
         frame_bytes = bytearray(audio.readframes(audio.getnframes()))
 
     if len(message_bits) > len(frame_bytes):
@@ -28,16 +34,14 @@ def lsb_basic_encode(input_audio, output_audio, message):
     for i in range(len(message_bits)):
         frame_bytes[i] = (frame_bytes[i] & 254) | int(message_bits[i])
 
-    with wave.open(output_audio, 'wb') as new_audio:
-        new_audio.setparams(audio.getparams())
-        new_audio.writeframes(bytes(frame_bytes))
+    write_like(input_audio, output_audio, frame_bytes)
     
     logger.info("Basic LSB encoding complete!")
 
 
 def lsb_basic_decode(input_audio):
     """Decodes a message from an LSB-encoded audio file."""
-    with wave.open(input_audio, 'rb') as audio:
+    with open_wav(input_audio) as audio:
         frame_bytes = bytearray(audio.readframes(audio.getnframes()))
 
     message_bits = ''.join(str(byte & 1) for byte in frame_bytes)
@@ -95,10 +99,7 @@ def calculate_accuracy(original_message, algorithm, input_file_path, output_file
 
         # Calculate Levenshtein Distance for accuracy
         max_length = max(len(original_message), len(decoded_message))
-        padded_original = original_message.ljust(max_length)
-        padded_decoded = decoded_message.ljust(max_length)
-        distance = levenshtein_distance(padded_original, padded_decoded)
-        accuracy = ((max_length - distance) / max_length) * 100
+        distance, accuracy = levenshtein_accuracy(original_message, decoded_message)
 
         psnr = calculate_psnr(input_file_path, output_file_path)
         ber = calculate_ber(original_message, decoded_message)
@@ -120,9 +121,191 @@ def calculate_accuracy(original_message, algorithm, input_file_path, output_file
 
 
 
+def levenshtein_accuracy(original_message, decoded_message):
+    """Returns (distance, accuracy %) between two messages padded to the same length."""
+    max_length = max(len(original_message), len(decoded_message))
+    if max_length == 0:
+        return 0, 100.0
+    padded_original = original_message.ljust(max_length)
+    padded_decoded = decoded_message.ljust(max_length)
+    distance = levenshtein_distance(padded_original, padded_decoded)
+    return distance, ((max_length - distance) / max_length) * 100
+
+
+# ========================== IN-MEMORY ACCURACY PIPELINE ============================
+def signal_metrics(original, modified):
+    """
+    Computes PSNR and SNR in dB from two (frames, channels) sample arrays at full scale 1.0.
+
+    PSNR is mono_psnr, the definition calculate_psnr uses; SNR compares every sample of every channel.
+    """
+    psnr = mono_psnr(original, modified)
+    original, modified = np.ravel(original), np.ravel(modified)
+    length = min(len(original), len(modified))
+    original, modified = original[:length], modified[:length]
+
+    noise = (modified - original).astype(np.float64)
+    noise_energy = np.dot(noise, noise)
+    if noise_energy == 0:
+        return psnr, float('inf')
+
+    signal = original.astype(np.float64)
+    snr = 10 * np.log10(np.dot(signal, signal) / noise_energy) if signal.any() else float('-inf')
+    return psnr, float(snr)
+
+
+def snr_streamed(original_audio_path, modified_audio_path, block_frames=None):
+    """Same SNR as signal_metrics over two WAV files, summing the energies block by block."""
+    with open_wav(original_audio_path) as original, open_wav(modified_audio_path) as modified:
+        original_params, modified_params = original.getparams(), modified.getparams()
+        if block_frames is None:
+            channels = max(original_params.nchannels, modified_params.nchannels)
+            block_frames = chunk_size(2 * PSNR_BYTES_PER_SAMPLE * channels)
+
+        noise_energy = signal_energy = 0.0
+        while True:
+            original_block = frames_to_float(original.readframes(block_frames), original_params).ravel()
+            modified_block = frames_to_float(modified.readframes(block_frames), modified_params).ravel()
+            count = min(len(original_block), len(modified_block))
+            if count == 0:
+                break
+            noise = modified_block[:count] - original_block[:count]
+            noise_energy += float(np.dot(noise, noise))
+            signal_energy += float(np.dot(original_block[:count], original_block[:count]))
+            report_progress("snr", original.tell() * original_params.sampwidth * original_params.nchannels,
+                            original_params.data_size)
+
+    if noise_energy == 0:
+        return float('inf')
+    return float(10 * np.log10(signal_energy / noise_energy)) if signal_energy > 0 else float('-inf')
+
+
+def lsb_capacity_utilization(stego_audio_path):
+    """
+    Share of the carrier bytes used by a payload embedded with the one-bit-per-byte "embed" hooks,
+    from its container header alone: (header + payload length) * 8 carrier bytes.
+    """
+    with open_wav(stego_audio_path) as audio:
+        header = parse_header(lsb_bytes(read_carrier_bytes(audio, HEADER_SIZE * 8)))
+        data_size = audio.getnframes() * audio.getsampwidth() * audio.getnchannels()
+    return (HEADER_SIZE + header["payload_length"]) * 8 / data_size if data_size else 0.0
+
+
+def calculate_accuracy_in_memory(original_message, algorithm, input_file_path, output_file_path=None):
+    """
+    Calculates accuracy, PSNR, SNR, BER and capacity utilization with one read of the carrier.
+
+    Requires the algorithm's in-memory "embed"/"extract" hooks; the stego file is written only
+    when output_file_path is given.
+    """
+    failed = {"accuracy": 0.0, "psnr": 0.0, "snr": 0.0, "ber": 1.0, "capacity_utilization": 0.0}
+    try:
+        if isinstance(original_message, bytes):
+            original_message = original_message.decode(errors='ignore')  # Ensure it's a string
+
+        if not fits_in_memory(read_params(input_file_path).data_size * WORK_BYTES_PER_CARRIER_BYTE):
+            return calculate_accuracy_through_files(original_message, algorithm, input_file_path, output_file_path)
+
+        with open_wav(input_file_path) as audio:
+            params = audio.getparams()
+            original_bytes = audio.readframes(params.nframes)
+
+        stego_bytes = bytearray(original_bytes)
+        used_bytes = algorithm['embed'](stego_bytes, original_message)
+        decoded_message = algorithm['extract'](stego_bytes)
+
+        if output_file_path:
+            write_like(input_file_path, output_file_path, stego_bytes)
+
+        if decoded_message is None or decoded_message == "[DECODING ERROR]":
+            logger.error("Decoding failed. Accuracy is 0%.")
+            return failed
+
+        if isinstance(decoded_message, bytes):
+            decoded_message = decoded_message.decode(errors='ignore')  # Ensure it's a string
+
+        _, accuracy = levenshtein_accuracy(original_message, decoded_message)
+        psnr, snr = signal_metrics(frames_to_float(original_bytes, params), frames_to_float(stego_bytes, params))
+        ber = calculate_ber(original_message, decoded_message)
+        capacity_utilization = used_bytes / len(original_bytes) if original_bytes else 0.0
+
+        logger.info(f"{algorithm['name']} -> Accuracy: {accuracy:.2f}%, PSNR: {psnr:.2f} dB, SNR: {snr:.2f} dB, "
+                    f"BER: {ber:.6f}, Capacity used: {capacity_utilization:.4%}")
+
+        return {"accuracy": accuracy, "psnr": psnr, "snr": snr, "ber": ber,
+                "capacity_utilization": capacity_utilization}
+
+    except Exception as e:
+        logger.error(f"Error in accuracy calculation for {algorithm['name']}: {e}")
+        return failed
+
+
+def calculate_accuracy_through_files(original_message, algorithm, input_file_path, output_file_path=None):
+    """
+    Bounded-memory fallback of calculate_accuracy_in_memory for carriers over the memory budget.
+
+    The algorithm's file encoder and decoder stream the carrier; calculate_accuracy measures PSNR with the
+    in-memory path's definition, SNR is summed block by block and capacity utilization comes from the stego header.
+    """
+    logger.info("Carrier exceeds the memory budget; measuring accuracy through files.")
+    temporary = None
+    if not output_file_path:
+        handle, temporary = tempfile.mkstemp(suffix=".wav")
+        os.close(handle)
+    stego_path = output_file_path or temporary
+    try:
+        result = calculate_accuracy(original_message, algorithm, input_file_path, stego_path)
+        if result["accuracy"] == 0.0 and result["ber"] == 1.0:
+            return {"snr": 0.0, "capacity_utilization": 0.0, **result}
+
+        snr = snr_streamed(input_file_path, stego_path)
+        capacity_utilization = lsb_capacity_utilization(stego_path)
+    except Exception as e:
+        logger.error(f"Error in accuracy calculation for {algorithm['name']}: {e}")
+        return {"accuracy": 0.0, "psnr": 0.0, "snr": 0.0, "ber": 1.0, "capacity_utilization": 0.0}
+    finally:
+        if temporary:
+            os.remove(temporary)
+
+    logger.info(f"{algorithm['name']} -> SNR: {snr:.2f} dB, Capacity used: {capacity_utilization:.4%}")
+    return {**result, "snr": snr, "capacity_utilization": capacity_utilization}
+
+
+PSNR_BYTES_PER_SAMPLE = 24  # float64 samples plus the mono, normalized and difference copies
+
+
+def mono_psnr(original, modified):
+    """
+    PSNR in dB of two sample arrays at full scale 1.0, as calculate_psnr defines it: each signal is mixed
+    to mono and normalized by its peak (when above 1), and the error is taken over the common length.
+    """
+    # Convert stereo to mono if needed
+    if original.ndim > 1:
+        original = np.mean(original, axis=1)
+    if modified.ndim > 1:
+        modified = np.mean(modified, axis=1)
+
+    # Normalize data
+    original = original / np.max(np.abs(original), initial=1)
+    modified = modified / np.max(np.abs(modified), initial=1)
+
+    # Ensure both arrays have the same length
+    min_length = min(len(original), len(modified))
+    original, modified = original[:min_length], modified[:min_length]
+
+    mse = np.mean((original - modified) ** 2)
+    if mse == 0:
+        return float('inf')
+    return float(10 * np.log10(1 / mse))
+
+
 def calculate_psnr(original_audio_path, modified_audio_path):
     """Calculates the PSNR between the original and modified audio files."""
     try:
+        samples = sum(info.frames * info.channels for info in map(sf.info, (original_audio_path, modified_audio_path)))
+        if not fits_in_memory(samples * PSNR_BYTES_PER_SAMPLE):
+            return calculate_psnr_streamed(original_audio_path, modified_audio_path)
+
         orig_data, orig_sr = sf.read(original_audio_path)
         mod_data, mod_sr = sf.read(modified_audio_path)
 
@@ -130,21 +313,49 @@ def calculate_psnr(original_audio_path, modified_audio_path):
             logger.error("Sampling rates do not match.")
             return 0.0
 
-        # Convert stereo to mono if needed
-        if orig_data.ndim > 1:
-            orig_data = np.mean(orig_data, axis=1)
-        if mod_data.ndim > 1:
-            mod_data = np.mean(mod_data, axis=1)
+        psnr = mono_psnr(orig_data, mod_data)
+        logger.info(f"PSNR Calculation: {psnr:.2f} dB")
+        return psnr
 
-        # Normalize data
-        orig_data = orig_data / np.max(np.abs(orig_data), initial=1)
-        mod_data = mod_data / np.max(np.abs(mod_data), initial=1)
+    except Exception as e:
+        logger.error(f"Error calculating PSNR: {e}")
+        return 0.0
 
-        # Ensure both arrays have the same length
-        min_length = min(len(orig_data), len(mod_data))
-        orig_data, mod_data = orig_data[:min_length], mod_data[:min_length]
 
-        mse = np.mean((orig_data - mod_data) ** 2)
+def calculate_psnr_streamed(original_audio_path, modified_audio_path, block_frames=None):
+    """
+    Same result as calculate_psnr for WAV files, reading them block by block in two passes:
+    the peaks used for normalization first, then the squared error.
+    """
+    try:
+        if block_frames is None:
+            channels = max(read_params(path).nchannels for path in (original_audio_path, modified_audio_path))
+            block_frames = chunk_size(2 * PSNR_BYTES_PER_SAMPLE * channels)
+
+        peaks = []
+        for path in (original_audio_path, modified_audio_path):
+            blocks = read_mono_blocks(path, block_frames, "psnr peak")
+            peaks.append((next(blocks), max((np.max(np.abs(block)) for block in blocks), default=0.0)))
+        (orig_sr, orig_peak), (mod_sr, mod_peak) = peaks
+
+        if orig_sr != mod_sr:
+            logger.error("Sampling rates do not match.")
+            return 0.0
+
+        # Same normalization as the in-memory path, which divides by max(peak, 1)
+        orig_scale, mod_scale = max(orig_peak, 1.0), max(mod_peak, 1.0)
+        original_blocks = read_mono_blocks(original_audio_path, block_frames, "psnr")
+        modified_blocks = read_mono_blocks(modified_audio_path, block_frames)
+        next(original_blocks), next(modified_blocks)
+
+        squared_error, count = 0.0, 0
+        for original_block, modified_block in zip(original_blocks, modified_blocks):
+            length = min(len(original_block), len(modified_block))
+            difference = original_block[:length] / orig_scale - modified_block[:length] / mod_scale
+            squared_error += float(np.dot(difference, difference))
+            count += length
+
+        mse = squared_error / max(count, 1)
         if mse == 0:
             return float('inf')
 
@@ -186,6 +397,120 @@ def calculate_ber(original_message, decoded_message):
         return 1.0
 
 
+# ========================== PERCEPTUAL QUALITY METRICS ============================
+PERCEPTUAL_FRAME = 1024         # Samples per analysis frame
+PERCEPTUAL_HOP = 512            # Samples between frame starts
+PERCEPTUAL_BLOCK_FRAMES = 65536  # Audio frames read per block, bounds memory on long files
+SEGSNR_RANGE = (-10.0, 35.0)    # Conventional clamp for per-frame SNR
+SPECTRAL_EPS = 1e-12
+
+
+def read_mono_blocks(audio_path, block_frames=PERCEPTUAL_BLOCK_FRAMES, stage=None):
+    """Yields the sample rate, then successive mono blocks scaled to [-1, 1); reports progress under stage if given."""
+    with open_wav(audio_path) as audio:
+        params = audio.getparams()
+        yield params.framerate
+        while True:
+            data = audio.readframes(block_frames)
+            if not data:
+                return
+            if stage:
+                report_progress(stage, audio.tell() * params.sampwidth * params.nchannels, params.data_size)
+            yield frames_to_float(data, params).mean(axis=1)
+
+
+def frame_metrics(carrier_frames, stego_frames, window):
+    """Per-frame segmental SNR, log-spectral distance and spectral flatness for stacked frames."""
+    noise = stego_frames - carrier_frames
+    signal_energy = np.einsum('ij,ij->i', carrier_frames, carrier_frames)
+    noise_energy = np.einsum('ij,ij->i', noise, noise)
+    segsnr = np.clip(10 * np.log10((signal_energy + SPECTRAL_EPS) / (noise_energy + SPECTRAL_EPS)), *SEGSNR_RANGE)
+
+    carrier_power = np.abs(np.fft.rfft(carrier_frames * window, axis=1)) ** 2 + SPECTRAL_EPS
+    stego_power = np.abs(np.fft.rfft(stego_frames * window, axis=1)) ** 2 + SPECTRAL_EPS
+    carrier_log, stego_log = np.log(carrier_power), np.log(stego_power)
+
+    lsd = np.sqrt(np.mean((10 / np.log(10) * (carrier_log - stego_log)) ** 2, axis=1))
+    carrier_flatness = np.exp(carrier_log.mean(axis=1)) / carrier_power.mean(axis=1)
+    stego_flatness = np.exp(stego_log.mean(axis=1)) / stego_power.mean(axis=1)
+    return segsnr, lsd, carrier_flatness, stego_flatness
+
+
+def calculate_perceptual_metrics(original_audio_path, modified_audio_path,
+                                 frame_length=PERCEPTUAL_FRAME, hop=PERCEPTUAL_HOP,
+                                 block_frames=PERCEPTUAL_BLOCK_FRAMES):
+    """
+    Computes segmental SNR, log-spectral distance and spectral-flatness change between two files.
+
+    Both files are streamed block by block and framed with strided views, so memory stays bounded
+    by block_frames regardless of file length.
+    """
+    try:
+        original_blocks = read_mono_blocks(original_audio_path, block_frames, "perceptual")
+        modified_blocks = read_mono_blocks(modified_audio_path, block_frames)
+        if next(original_blocks) != next(modified_blocks):
+            logger.error("Sampling rates do not match.")
+            return None
+
+        window = np.hanning(frame_length)
+        totals = np.zeros(4)
+        frames = 0
+        original_carry = modified_carry = np.zeros(0)
+
+        for original_block, modified_block in zip(original_blocks, modified_blocks):
+            original_signal = np.concatenate((original_carry, original_block))
+            modified_signal = np.concatenate((modified_carry, modified_block))
+            length = min(len(original_signal), len(modified_signal))
+            if length < frame_length:
+                original_carry, modified_carry = original_signal, modified_signal
+                continue
+
+            count = (length - frame_length) // hop + 1
+            original_frames = sliding_window_view(original_signal[:length], frame_length)[::hop][:count]
+            modified_frames = sliding_window_view(modified_signal[:length], frame_length)[::hop][:count]
+            totals += [metric.sum() for metric in frame_metrics(original_frames, modified_frames, window)]
+            frames += count
+
+            # Keep the unframed tail so frames straddling block boundaries are not lost
+            original_carry = original_signal[count * hop:]
+            modified_carry = modified_signal[count * hop:]
+
+        if frames == 0:
+            logger.error("Audio is shorter than one analysis frame.")
+            return None
+
+        segsnr, lsd, carrier_flatness, stego_flatness = totals / frames
+        metrics = {
+            "segmental_snr": float(segsnr),
+            "log_spectral_distance": float(lsd),
+            "spectral_flatness_change": float(stego_flatness - carrier_flatness),
+            "frames": frames,
+        }
+        logger.info(f"Perceptual metrics: SegSNR {segsnr:.2f} dB, LSD {lsd:.4f} dB, "
+                    f"Flatness change {metrics['spectral_flatness_change']:+.6f}")
+        return metrics
+
+    except Exception as e:
+        logger.error(f"Error calculating perceptual metrics: {e}")
+        return None
+
+
+def calculate_perceptual_metrics_batch(pairs, max_workers=4, aggregator=None, **kwargs):
+    """
+    Computes perceptual metrics for many (carrier, stego) path pairs; NumPy FFTs release the GIL.
+
+    Pass a ProgressAggregator to follow the combined progress of the pairs from another thread.
+    """
+    def job(pair):
+        if aggregator is None:
+            return calculate_perceptual_metrics(*pair, **kwargs)
+        with progress_callback(aggregator.callback_for(pair)):
+            return calculate_perceptual_metrics(*pair, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(job, pairs))
+
+
 def compress_audio(input_path, output_path, bitrate):
     """Compresses an audio file to a specified bitrate."""
     try:
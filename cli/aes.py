@@ -1,13 +1,26 @@
 import os
-import wave
 import base64
 import secrets
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import soundfile as sf
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import padding
 from utils.logging_util import setup_logger
+from utils.memory import WORK_BYTES_PER_CARRIER_BYTE, chunk_size, chunk_spans, fits_in_memory
+from utils.kdf import (KDF_BLOCK, current_key_source, master_key, message_key, pack_kdf_block,
+                       parse_kdf_block)
+from utils.progress import report_progress
+from utils.riff import open_wav, read_params, stream_like, write_like
+from algorithms.incremental_update import patch_payload_region
+from algorithms.parallel_engine import parallel_embed, parallel_extract, LSB_LAYOUT
+from algorithms.spectral_steganography import embed_payload, extract_payload
+from algorithms.container import (ALGORITHM_IDS, FLAG_ENCRYPTED, FLAG_KDF, HEADER_SIZE, compress_payload,
+                                  decompress_payload, has_magic, pack_header, parse_header, read_carrier_bytes,
+                                  read_framed_payload)
 
 # Initialize logger
 logger = setup_logger(__name__)
@@ -18,7 +31,11 @@ def get_aes_key():
     key_file = "aes_key.bin"
     if os.path.exists(key_file):
         with open(key_file, "rb") as f:
-            return f.read()
+            key = f.read()
+        if len(key) != 32:
+            logger.warning(f"{key_file} holds a {len(key) * 8}-bit key, not AES-256; "
+                           f"consider a passphrase or key id (utils.kdf)")
+        return key
     else:
         key = secrets.token_bytes(32)
         with open(key_file, "wb") as f:
@@ -30,9 +47,9 @@ def get_aes_key():
 AES_KEY = get_aes_key()
 
 
-def encrypt_message(message, key):
-    """Encrypts a message using AES-256 in CBC mode."""
-    iv = secrets.token_bytes(16)
+def encrypt_message(message, key, iv=None):
+    """Encrypts a message using AES-256 in CBC mode, under a fresh random IV unless one is given."""
+    iv = iv or secrets.token_bytes(16)
     cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).encryptor()
     
     if isinstance(message, str):
@@ -44,54 +61,173 @@ def encrypt_message(message, key):
     return iv + ciphertext
 
 
+def decrypt_bytes(encrypted_message, key):
+    """Decrypts an AES-256 encrypted message to raw bytes, raising on failure."""
+    if len(encrypted_message) < 16:
+        raise ValueError("Decryption error: Message too short.")
+
+    iv, ciphertext = encrypted_message[:16], encrypted_message[16:]
+    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).decryptor()
+    decrypted_padded = cipher.update(ciphertext) + cipher.finalize()
+
+    unpadder = padding.PKCS7(128).unpadder()
+    return unpadder.update(decrypted_padded) + unpadder.finalize()
+
+
 def decrypt_message(encrypted_message, key):
     """Decrypts an AES-256 encrypted message."""
     try:
-        if len(encrypted_message) < 16:
-            raise ValueError("Decryption error: Message too short.")
-        
-        iv, ciphertext = encrypted_message[:16], encrypted_message[16:]
-        cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).decryptor()
-        decrypted_padded = cipher.update(ciphertext) + cipher.finalize()
-        
-        unpadder = padding.PKCS7(128).unpadder()
-        decrypted = unpadder.update(decrypted_padded) + unpadder.finalize()
-        return decrypted.decode('utf-8', errors='ignore')
+        return decrypt_bytes(encrypted_message, key).decode('utf-8', errors='ignore')
     except Exception:
         return "[DECRYPTION ERROR]"
 
 
-# ========================== LSB Encoding & Decoding ============================
-def lsb_encode(input_audio, output_audio, message):
-    encrypted_message = encrypt_message(message, AES_KEY)  # Now returns bytes
-    encrypted_message += b'###'  # Append delimiter in bytes
-
-    with wave.open(input_audio, 'rb') as audio:
-        frame_bytes = bytearray(audio.readframes(audio.getnframes()))
+# ========================== BATCH AES-256-GCM ============================
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+
+# encrypt_into/decrypt_into only exist in newer cryptography releases
+_HAS_AEAD_INTO = hasattr(AESGCM, "encrypt_into")
+
+
+def _run_in_slices(work, count, max_workers):
+    """Runs work(start, stop) over [0, count), split across a thread pool when max_workers > 1."""
+    if not max_workers or max_workers <= 1 or count < 2:
+        work(0, count)
+        return
+
+    step = -(-count // max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(work, start, min(start + step, count)) for start in range(0, count, step)]
+        for future in futures:
+            future.result()
+
+
+def encrypt_batch(messages, key, max_workers=None):
+    """
+    Encrypts a sequence of messages with AES-GCM into one preallocated buffer.
+
+    Item i occupies buffer[offsets[i]:offsets[i + 1]] as nonce + ciphertext + tag.
+
+    :param messages: Sequence of str or bytes payloads
+    :param key: AES key (16, 24 or 32 bytes)
+    :param max_workers: Number of threads to spread the batch over (None runs inline)
+    :return: Tuple (buffer, offsets) with len(offsets) == len(messages) + 1
+    """
+    payloads = [message.encode() if isinstance(message, str) else message for message in messages]
+
+    offsets = [0] * (len(payloads) + 1)
+    for i, payload in enumerate(payloads):
+        offsets[i + 1] = offsets[i] + GCM_NONCE_SIZE + len(payload) + GCM_TAG_SIZE
+
+    buffer = bytearray(offsets[-1])
+    view = memoryview(buffer)
+    aesgcm = AESGCM(key)  # Stateless, safe to share between threads
+
+    def work(start, stop):
+        for i in range(start, stop):
+            offset = offsets[i]
+            nonce = secrets.token_bytes(GCM_NONCE_SIZE)
+            view[offset:offset + GCM_NONCE_SIZE] = nonce
+            sealed = view[offset + GCM_NONCE_SIZE:offsets[i + 1]]
+            if _HAS_AEAD_INTO:
+                aesgcm.encrypt_into(nonce, payloads[i], None, sealed)
+            else:
+                sealed[:] = aesgcm.encrypt(nonce, payloads[i], None)
+
+    _run_in_slices(work, len(payloads), max_workers)
+    return buffer, offsets
+
+
+def decrypt_batch(buffer, offsets, key, max_workers=None):
+    """
+    Decrypts a buffer produced by encrypt_batch, reporting failures per item.
+
+    :param buffer: Buffer holding nonce + ciphertext + tag records back to back
+    :param offsets: Record boundaries as returned by encrypt_batch
+    :param key: AES key used for encryption
+    :param max_workers: Number of threads to spread the batch over (None runs inline)
+    :return: List of {"message": bytes or None, "error": str or None}, one per item
+    """
+    view = memoryview(buffer)
+    aesgcm = AESGCM(key)
+    results = [None] * (len(offsets) - 1)
+
+    def work(start, stop):
+        for i in range(start, stop):
+            record = view[offsets[i]:offsets[i + 1]]
+            if len(record) < GCM_NONCE_SIZE + GCM_TAG_SIZE:
+                results[i] = {"message": None, "error": "Record too short."}
+                continue
+            nonce, sealed = record[:GCM_NONCE_SIZE], record[GCM_NONCE_SIZE:]
+            try:
+                if _HAS_AEAD_INTO:
+                    plaintext = bytearray(len(sealed) - GCM_TAG_SIZE)
+                    aesgcm.decrypt_into(bytes(nonce), sealed, None, plaintext)
+                    plaintext = bytes(plaintext)
+                else:
+                    plaintext = aesgcm.decrypt(bytes(nonce), bytes(sealed), None)
+                results[i] = {"message": plaintext, "error": None}
+            except InvalidTag:
+                results[i] = {"message": None, "error": "Authentication failed (wrong key or tampered data)."}
+
+    _run_in_slices(work, len(results), max_workers)
+    return results
+
+
+# ========================== Payload Framing ============================
+AES_LSB_ID = ALGORITHM_IDS["aes_lsb"]
+AES_LSB_ADVANCED_ID = ALGORITHM_IDS["aes_lsb_advanced"]
+AES_SPECTRAL_ID = ALGORITHM_IDS["aes_spectral"]
+
+
+def frame_encrypted(message, algorithm_id, compress=True):
+    """
+    Compresses a message when that saves space, encrypts it and prefixes a container header carrying
+    the algorithm, flags, length and IV.
+
+    Under a passphrase or key id (utils.kdf), the message key is derived from the job master key and
+    the IV, and the KDF block recording how to rebuild it goes ahead of the ciphertext.
+    """
+    if isinstance(message, str):
+        message = message.encode()
+    data, compression_flag = compress_payload(message, compress)
 
-    # Convert encrypted message bytes to bits
-    message_bits = ''.join(format(byte, '08b') for byte in encrypted_message)
+    source = current_key_source()
+    if source is None:
+        encrypted_message = encrypt_message(data, AES_KEY)
+        iv, ciphertext = encrypted_message[:16], encrypted_message[16:]
+        return pack_header(algorithm_id, len(ciphertext), FLAG_ENCRYPTED | compression_flag, iv) + ciphertext
 
-    if len(message_bits) > len(frame_bytes):
-        raise ValueError("Message is too long to encode!")
+    iv = secrets.token_bytes(16)
+    key = message_key(master_key(source.secret, source.params), iv)
+    payload = pack_kdf_block(source.params) + encrypt_message(data, key, iv)[16:]
+    return pack_header(algorithm_id, len(payload), FLAG_ENCRYPTED | FLAG_KDF | compression_flag, iv) + payload
 
-    for i in range(len(message_bits)):
-        frame_bytes[i] = (frame_bytes[i] & 254) | int(message_bits[i])
 
-    with wave.open(output_audio, 'wb') as new_audio:
-        new_audio.setparams(audio.getparams())
-        new_audio.writeframes(bytes(frame_bytes))
+def decrypt_framed(ciphertext, header):
+    """Decrypts a framed payload, inflating it when its header flags a compression codec."""
+    try:
+        key = AES_KEY
+        if header["flags"] & FLAG_KDF:
+            source = current_key_source()
+            params = parse_kdf_block(ciphertext)
+            key = message_key(master_key(source.secret if source else None, params), header["nonce"])
+            ciphertext = ciphertext[KDF_BLOCK.size:]
+        data = decrypt_bytes(header["nonce"] + ciphertext, key)
+        return decompress_payload(data, header["flags"]).decode('utf-8', errors='ignore')
+    except Exception as e:
+        logger.error(f"Decryption error: {e}")
+        return "[DECRYPTION ERROR]"
 
-    logger.info("Encoding Complete!")
 
+def lsb_bytes(carrier):
+    """Packs the LSB of every carrier byte into bytes."""
+    return np.packbits(np.frombuffer(carrier, dtype=np.uint8) & 1).tobytes()
 
-def lsb_decode(input_audio):
-    with wave.open(input_audio, 'rb') as audio:
-        frame_bytes = bytearray(audio.readframes(audio.getnframes()))
-
-    message_bits = ''.join(str(byte & 1) for byte in frame_bytes)
-    extracted_bytes = bytes(int(message_bits[i:i+8], 2) for i in range(0, len(message_bits), 8))
 
+def split_and_decrypt(extracted_bytes):
+    """Cuts a legacy LSB stream at the ### delimiter and decrypts what precedes it."""
     # Ensure extracted bytes contain the delimiter
     if b'###' in extracted_bytes:
         encrypted_message = extracted_bytes.split(b'###')[0]  # Extract encrypted bytes
@@ -99,14 +235,98 @@ def lsb_decode(input_audio):
         logger.error("Decoding error: Delimiter not found.")
         return "[DECODING ERROR]"
 
-    decrypted_message = decrypt_message(encrypted_message, AES_KEY)  # Ensure correct decryption
+    return decrypt_message(encrypted_message, AES_KEY)
+
+
+# ========================== LSB Encoding & Decoding ============================
+def lsb_embed(frame_bytes, message, algorithm_id=AES_LSB_ID):
+    """Embeds the framed, encrypted message into the LSBs of a writable frame buffer; returns carrier bytes used."""
+    message_bits = np.unpackbits(np.frombuffer(frame_encrypted(message, algorithm_id), dtype=np.uint8))
+
+    if len(message_bits) > len(frame_bytes):
+        raise ValueError("Message is too long to encode!")
+
+    carrier = np.frombuffer(frame_bytes, dtype=np.uint8)
+    carrier[:len(message_bits)] = (carrier[:len(message_bits)] & 254) | message_bits
+    return len(message_bits)
+
+
+def lsb_extract(frame_bytes, algorithm_id=AES_LSB_ID):
+    """Extracts and decrypts the framed message from the LSBs of a frame buffer."""
+    header_bytes = lsb_bytes(frame_bytes[:HEADER_SIZE * 8])
+    if not has_magic(header_bytes):
+        return split_and_decrypt(lsb_bytes(frame_bytes))  # Legacy ###-delimited payload
+
+    try:
+        header = parse_header(header_bytes, algorithm_id)
+    except ValueError as e:
+        logger.error(f"Decoding error: {e}")
+        return "[DECODING ERROR]"
+
+    end = (HEADER_SIZE + header["payload_length"]) * 8
+    if end > len(frame_bytes):
+        logger.error("Decoding error: Payload length exceeds the audio data.")
+        return "[DECODING ERROR]"
+
+    return decrypt_framed(lsb_bytes(frame_bytes[HEADER_SIZE * 8:end]), header)
+
+
+def _lsb_encode_file(input_audio, output_audio, message, algorithm_id):
+    params = read_params(input_audio)
+    if not fits_in_memory(params.data_size * WORK_BYTES_PER_CARRIER_BYTE):
+        _lsb_encode_chunked(input_audio, output_audio, message, algorithm_id, params)
+        return
+
+    with open_wav(input_audio) as audio:
+        frame_bytes = bytearray(audio.readframes(audio.getnframes()))
+
+    used = lsb_embed(frame_bytes, message, algorithm_id)
+    report_progress("embed", used, used, bits=used)
+
+    write_like(input_audio, output_audio, frame_bytes)
+
+
+def _lsb_encode_chunked(input_audio, output_audio, message, algorithm_id, params):
+    """Same output as lsb_embed over the whole carrier, streaming one chunk of carrier bytes at a time."""
+    message_bits = np.unpackbits(np.frombuffer(frame_encrypted(message, algorithm_id), dtype=np.uint8))
+
+    if len(message_bits) > params.data_size:
+        raise ValueError("Message is too long to encode!")
+
+    stream_like(input_audio, output_audio, chunk_spans(len(message_bits), chunk_size()),
+                lambda chunk, start: (chunk & 254) | message_bits[start:start + len(chunk)], bits_per_byte=1)
+
+
+def _lsb_decode_file(input_audio, algorithm_id):
+    with open_wav(input_audio) as audio:
+        head = read_carrier_bytes(audio, HEADER_SIZE * 8)
+        if not has_magic(lsb_bytes(head[:HEADER_SIZE * 8])):
+            # Legacy files end with a ### delimiter, so the whole carrier has to be read
+            audio.setpos(0)
+            return split_and_decrypt(lsb_bytes(audio.readframes(audio.getnframes())))
+
+        # The header is validated before any payload frames are read
+        try:
+            ciphertext, header = read_framed_payload(audio, lsb_bytes, lambda count: count * 8, algorithm_id)
+        except ValueError as e:
+            logger.error(f"Decoding error: {e}")
+            return "[DECODING ERROR]"
+
+    return decrypt_framed(ciphertext, header)
+
+
+def lsb_encode(input_audio, output_audio, message):
+    _lsb_encode_file(input_audio, output_audio, message, AES_LSB_ID)
+    logger.info("Encoding Complete!")
+
+
+def lsb_decode(input_audio):
+    return _lsb_decode_file(input_audio, AES_LSB_ID)
+
 
-    #print(f"\n🔹 Decoded Message: {decrypted_message}")  # Print decoded message
-    return decrypted_message
-    
 def fix_lsb_decoding(input_audio):
     """Improves LSB decoding for more accurate message retrieval."""
-    with wave.open(input_audio, 'rb') as audio:
+    with open_wav(input_audio) as audio:
         frame_bytes = bytearray(audio.readframes(audio.getnframes()))
     
     message_bits = ''.join(str(byte & 1) for byte in frame_bytes)
@@ -118,50 +338,71 @@ def fix_lsb_decoding(input_audio):
     else:
         return "[DECODING ERROR]"    
 
-# ========================== Advanced LSB Encoding & Decoding ============================
-def lsb_advanced_encode(input_audio, output_audio, message):
-    encrypted_message = encrypt_message(message, AES_KEY)  # Returns bytes
-    encrypted_message += b'###'  # Convert delimiter to bytes
+def lsb_encode_parallel(input_audio, output_audio, message, workers=None, algorithm_id=AES_LSB_ID):
+    """Same output as lsb_encode, embedded by worker processes into a memory-mapped copy of the input."""
+    parallel_embed(input_audio, output_audio, frame_encrypted(message, algorithm_id), LSB_LAYOUT, workers)
+    logger.info("Parallel Encoding Complete!")
 
-    with wave.open(input_audio, 'rb') as audio:
-        frame_bytes = bytearray(audio.readframes(audio.getnframes()))
 
-    # Convert encrypted bytes to bits
-    message_bits = ''.join(format(byte, '08b') for byte in encrypted_message)
+def lsb_decode_parallel(input_audio, workers=None, algorithm_id=AES_LSB_ID):
+    """Same result as lsb_decode, with the LSB extraction split across worker processes."""
+    header_bytes = parallel_extract(input_audio, LSB_LAYOUT, HEADER_SIZE)
+    if not has_magic(header_bytes):
+        return split_and_decrypt(parallel_extract(input_audio, LSB_LAYOUT, workers=workers))
 
-    if len(message_bits) > len(frame_bytes):
-        raise ValueError("Message is too long to encode!")
+    try:
+        header = parse_header(header_bytes, algorithm_id)
+        extracted = parallel_extract(input_audio, LSB_LAYOUT, HEADER_SIZE + header["payload_length"], workers=workers)
+    except ValueError as e:
+        logger.error(f"Decoding error: {e}")
+        return "[DECODING ERROR]"
+
+    return decrypt_framed(extracted[HEADER_SIZE:], header)
 
-    for i in range(0, len(message_bits), 2):  # Encode in pairs for better robustness
-        frame_bytes[i] = (frame_bytes[i] & 254) | int(message_bits[i])
-        if i + 1 < len(message_bits):
-            frame_bytes[i + 1] = (frame_bytes[i + 1] & 254) | int(message_bits[i + 1])
+# ========================== Advanced LSB Encoding & Decoding ============================
+# Advanced LSB writes the same bit layout as basic LSB; the container header records which one was used.
+def lsb_advanced_embed(frame_bytes, message):
+    return lsb_embed(frame_bytes, message, AES_LSB_ADVANCED_ID)
 
-    with wave.open(output_audio, 'wb') as new_audio:
-        new_audio.setparams(audio.getparams())
-        new_audio.writeframes(bytes(frame_bytes))
 
+def lsb_advanced_extract(frame_bytes):
+    return lsb_extract(frame_bytes, AES_LSB_ADVANCED_ID)
+
+
+def lsb_advanced_encode(input_audio, output_audio, message):
+    _lsb_encode_file(input_audio, output_audio, message, AES_LSB_ADVANCED_ID)
     logger.info("Advanced Encoding Complete!")
 
 
 def lsb_advanced_decode(input_audio):
-    with wave.open(input_audio, 'rb') as audio:
-        frame_bytes = bytearray(audio.readframes(audio.getnframes()))
+    return _lsb_decode_file(input_audio, AES_LSB_ADVANCED_ID)
 
-    message_bits = ''.join(str(byte & 1) for byte in frame_bytes)
-    extracted_bytes = bytes(int(message_bits[i:i+8], 2) for i in range(0, len(message_bits), 8))
 
-    # Ensure extracted bytes contain the delimiter
-    if b'###' in extracted_bytes:
-        encrypted_message = extracted_bytes.split(b'###')[0]  # Extract encrypted bytes
-    else:
-        logger.error("Decoding error: Delimiter not found.")
+# ========================== Spectral Encoding & Decoding ============================
+# Embeds in mid-band FFT magnitudes instead of LSBs, so the payload survives MP3 round-trips.
+def spectral_encode(input_audio, output_audio, message):
+    embed_payload(input_audio, output_audio, frame_encrypted(message, AES_SPECTRAL_ID))
+    logger.info("Spectral Encoding Complete!")
+
+
+def spectral_decode(input_audio):
+    try:
+        ciphertext, header = extract_payload(input_audio, AES_SPECTRAL_ID)
+    except ValueError as e:
+        logger.error(f"Decoding error: {e}")
         return "[DECODING ERROR]"
 
-    decrypted_message = decrypt_message(encrypted_message, AES_KEY)  # Ensure correct decryption
+    return decrypt_framed(ciphertext, header)
+
+
+# ========================== Incremental Re-embed ============================
+def lsb_update(audio_path, message, algorithm_id=AES_LSB_ID):
+    """Re-encrypts a new message into an encoded file in place, rewriting only the changed carrier bytes."""
+    message_bits = np.unpackbits(np.frombuffer(frame_encrypted(message, algorithm_id), dtype=np.uint8))
 
-    #print(f"\n🔹 Decoded Message: {decrypted_message}")  # Print decoded message
-    return decrypted_message
+    written = patch_payload_region(audio_path, len(message_bits), lambda region: (region & 254) | message_bits)
+    logger.info(f"Update Complete! {written} carrier bytes rewritten.")
+    return written
 
 
 # ========================== ALGORITHM REGISTRY ============================
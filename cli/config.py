@@ -2,22 +2,37 @@
 STANDARD_INPUT_FILE_PATH = "input/original_sample.wav"
 OUTPUT_BASIC_LSB = "output/basic_lsb_encoded.wav"
 OUTPUT_ENHANCED_LSB = "output/enhanced_lsb_encoded.wav"
+OUTPUT_SPECTRAL = "output/spectral_encoded.wav"
 
 # Import algorithm modules
-from aes import lsb_encode, lsb_decode, lsb_advanced_encode, lsb_advanced_decode
+from aes import (lsb_encode, lsb_decode, lsb_advanced_encode, lsb_advanced_decode, lsb_embed, lsb_extract,
+                 lsb_advanced_embed, lsb_advanced_extract, spectral_encode, spectral_decode)
 
 # Dictionary to store algorithms
 ALGORITHMS = {
     1: {
         "name": "Basic LSB Steganography with AES",
+        "algorithm_key": "aes_lsb",
         "encode": lsb_encode,
         "decode": lsb_decode,
+        "embed": lsb_embed,
+        "extract": lsb_extract,
         "output_file": OUTPUT_BASIC_LSB
     },
     2: {
         "name": "Advanced LSB Steganography with AES",
+        "algorithm_key": "aes_lsb_advanced",
         "encode": lsb_advanced_encode,
         "decode": lsb_advanced_decode,
+        "embed": lsb_advanced_embed,
+        "extract": lsb_advanced_extract,
         "output_file": OUTPUT_ENHANCED_LSB
+    },
+    3: {
+        "name": "Spectral Steganography with AES (MP3 robust)",
+        "algorithm_key": "aes_spectral",
+        "encode": spectral_encode,
+        "decode": spectral_decode,
+        "output_file": OUTPUT_SPECTRAL
     }
 }
\ No newline at end of file
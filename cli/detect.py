@@ -0,0 +1,69 @@
+from utils.logging_util import setup_logger
+from cli.config import ALGORITHMS
+from cli.scanner import scan_file
+from algorithms import (basic_lsb_steganography, enhanced_lsb_steganography_no_flip,
+                        enhanced_lsb_steganography_with_flip, kbit_lsb_steganography, matrix_lsb_steganography,
+                        multi_payload_steganography, spectral_steganography)
+
+# Initialize logger
+logger = setup_logger(__name__)
+
+# algorithms/* decoders keyed by the name the scanner reports
+MODULE_DECODERS = {
+    "basic_lsb": basic_lsb_steganography.decode,
+    "enhanced_lsb_no_flip": enhanced_lsb_steganography_no_flip.decode,
+    "enhanced_lsb_with_flip": enhanced_lsb_steganography_with_flip.decode,
+    # Legacy enhanced files cannot tell flip from no flip, and both decode the same bits
+    "enhanced_lsb": enhanced_lsb_steganography_no_flip.decode,
+    "kbit_lsb": kbit_lsb_steganography.decode,
+    "spectral": spectral_steganography.decode,
+    "matrix_lsb": matrix_lsb_steganography.decode,  # p from the header
+    "multi_lsb": multi_payload_steganography.decode,  # Most recently added record
+}
+
+
+def find_decoder(algorithm_key):
+    """Returns (display name, decode function) for a detected algorithm, preferring the CLI registry."""
+    for algorithm in ALGORITHMS.values():
+        if algorithm.get("algorithm_key") == algorithm_key:
+            return algorithm["name"], algorithm["decode"]
+    if algorithm_key in MODULE_DECODERS:
+        return algorithm_key, MODULE_DECODERS[algorithm_key]
+    return None, None
+
+
+def detect_spectral(input_file_path):
+    """Returns the algorithm named by a spectral container header, or None; the head scan cannot see these."""
+    try:
+        return spectral_steganography.read_header(input_file_path)["algorithm"]
+    except (ValueError, EOFError, OSError):
+        return None
+
+
+def auto_decode(input_file_path):
+    """
+    Detects which algorithm wrote a file from its leading frames, then decodes with that algorithm only.
+
+    :return: Tuple (algorithm name, decoded message), or (None, None) when nothing is detected
+    """
+    result = scan_file(input_file_path)
+    if not result["error"] and not result["algorithm"]:
+        result["algorithm"] = detect_spectral(input_file_path)
+    if result["error"] or not result["algorithm"]:
+        logger.warning(f"No payload detected in {input_file_path}: {result['error'] or 'no plausible header'}")
+        return None, None
+
+    name, decode = find_decoder(result["algorithm"])
+    if decode is None:
+        logger.warning(f"Detected {result['algorithm']} but no decoder is registered for it.")
+        return None, None
+
+    # k-bit files are decoded with the depth their header was found under
+    layout = result["candidates"].get("container", {}).get("layout")
+    if result["algorithm"] == "kbit_lsb" and layout:
+        decoded_message = decode(input_file_path, bits=layout["bits"], shift=layout["shift"], unit=layout["unit"])
+    else:
+        decoded_message = decode(input_file_path)
+
+    logger.info(f"Auto-detected {name} in {input_file_path}")
+    return name, decoded_message
@@ -1,5 +1,8 @@
 import os
+from contextlib import contextmanager
+from tqdm import tqdm
 from utils.logging_util import setup_logger
+from utils.progress import progress_callback
 from cli.config import ALGORITHMS, STANDARD_INPUT_FILE_PATH
 
 # Initialize logger
@@ -19,6 +22,22 @@ def display_algorithm_menu():
     options = [algo["name"] for algo in ALGORITHMS.values()]
     display_menu(options, "Select an algorithm")
 
+@contextmanager
+def progress_bar(description):
+    """Shows the progress the enclosed job reports as a bar with throughput and ETA, restarted per stage."""
+    stage = None
+    with tqdm(desc=description, unit="B", unit_scale=True, unit_divisor=1024) as bar:
+        def show(event):
+            nonlocal stage
+            if event.stage != stage:
+                stage = event.stage
+                bar.reset(total=event.total or None)
+            bar.update(event.done - bar.n)
+            bar.set_postfix(stage=event.stage, bits=event.bits)
+
+        with progress_callback(show):
+            yield
+
 # ========================== USER INPUT HANDLING ============================
 
 def get_user_choice(num_options):
@@ -38,9 +57,12 @@ def get_user_choice(num_options):
 def get_file_path(algo_choice, is_input=True):
     """Gets the file path from the user or uses the standard path, limiting attempts to 3."""
     prompt = "input audio file: " if is_input else "output audio file: "
-    standard_path = STANDARD_INPUT_FILE_PATH if is_input else ALGORITHMS[algo_choice]["output_file"]
+    # Without an algorithm choice (auto-detect) there is no standard output path to offer
+    standard_path = STANDARD_INPUT_FILE_PATH if is_input else ALGORITHMS.get(algo_choice, {}).get("output_file")
 
-    use_standard = input(f"\nUse standard file path ({standard_path}) for the {prompt} file? (y/n): ")
+    use_standard = "n"
+    if standard_path:
+        use_standard = input(f"\nUse standard file path ({standard_path}) for the {prompt} file? (y/n): ")
     if use_standard.lower() == "y":
         if os.path.exists(standard_path):
             logger.info(f"Using standard file path: {standard_path}")
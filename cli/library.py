@@ -0,0 +1,174 @@
+import os
+import sqlite3
+from utils.kdf import KDF_BLOCK
+from utils.logging_util import setup_logger
+from utils.riff import read_params
+from algorithms.container import HEADER_SIZE
+from algorithms.kbit_lsb_steganography import capacity_report
+from algorithms.spectral_steganography import capacity_bits as spectral_capacity_bits
+from algorithms.matrix_lsb_steganography import capacity_bytes as matrix_capacity_bytes
+from algorithms.multi_payload_steganography import capacity_bytes as multi_capacity_bytes
+
+# Initialize logger
+logger = setup_logger(__name__)
+
+LIBRARY_DB_PATH = "carrier_library.sqlite"
+AES_BLOCK_SIZE = 16
+
+
+# ========================== CAPACITY FROM HEADER ============================
+def _aes_capacity(payload):
+    """
+    Largest plaintext that fits in payload bytes once encrypted: CBC always adds 1-16 bytes of padding.
+
+    The KDF block of passphrase and key-id jobs (utils.kdf) is always reserved, so one index serves
+    carriers encoded with the raw key file and with derived keys alike.
+    """
+    ciphertext = payload - KDF_BLOCK.size
+    return max(ciphertext // AES_BLOCK_SIZE * AES_BLOCK_SIZE - 1, 0)
+
+
+def _aes_lsb_capacity(params):
+    return _aes_capacity(params.nframes * params.nchannels * params.sampwidth // 8 - HEADER_SIZE)
+
+
+def _spectral_capacity(params):
+    """Capacity of the spectral layout, which carries a fixed number of bits per block of frames."""
+    return max(spectral_capacity_bits(params.nframes) // 8 - HEADER_SIZE, 0)
+
+
+def _bytes_per_payload_byte(carrier_bytes):
+    """Capacity of layouts that spend a fixed number of carrier bytes per payload byte."""
+    return lambda params: max(params.nframes * params.nchannels * params.sampwidth // carrier_bytes - HEADER_SIZE, 0)
+
+
+# Message bytes each algorithm can carry, computed from wave params alone
+CAPACITY_FUNCTIONS = {
+    "aes_lsb": _aes_lsb_capacity,
+    "aes_lsb_advanced": _aes_lsb_capacity,
+    "basic_lsb": _bytes_per_payload_byte(8),
+    "enhanced_lsb_no_flip": _bytes_per_payload_byte(4),
+    "enhanced_lsb_with_flip": _bytes_per_payload_byte(4),
+    "kbit_lsb": lambda params: capacity_report(params)["capacity_bytes"],  # Default depth
+    "spectral": _spectral_capacity,
+    "aes_spectral": lambda params: _aes_capacity(_spectral_capacity(params)),
+    "matrix_lsb": lambda params: matrix_capacity_bytes(params.nframes * params.nchannels * params.sampwidth),  # Default p
+    "multi_lsb": lambda params: multi_capacity_bytes(params.nframes * params.nchannels * params.sampwidth),  # All records
+}
+
+
+# ========================== INDEX STORAGE ============================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS carriers (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    channels INTEGER NOT NULL,
+    sampwidth INTEGER NOT NULL,
+    framerate INTEGER NOT NULL,
+    nframes INTEGER NOT NULL,
+    used INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS capacities (
+    path TEXT NOT NULL REFERENCES carriers(path) ON DELETE CASCADE,
+    algorithm TEXT NOT NULL,
+    capacity_bytes INTEGER NOT NULL,
+    PRIMARY KEY (path, algorithm)
+);
+CREATE INDEX IF NOT EXISTS capacities_by_size ON capacities (algorithm, capacity_bytes);
+"""
+
+
+def connect(db_path=LIBRARY_DB_PATH):
+    """Opens (creating if needed) the carrier library database."""
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _index_file(connection, path, stat):
+    """Reads one WAV header and upserts its metadata and capacities, keeping the used flag."""
+    params = read_params(path)
+
+    connection.execute(
+        """INSERT INTO carriers (path, mtime, size, channels, sampwidth, framerate, nframes)
+           VALUES (?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime, size = excluded.size,
+               channels = excluded.channels, sampwidth = excluded.sampwidth,
+               framerate = excluded.framerate, nframes = excluded.nframes""",
+        (path, stat.st_mtime, stat.st_size, params.nchannels, params.sampwidth, params.framerate, params.nframes))
+    connection.executemany(
+        "INSERT OR REPLACE INTO capacities (path, algorithm, capacity_bytes) VALUES (?, ?, ?)",
+        [(path, algorithm, capacity(params)) for algorithm, capacity in CAPACITY_FUNCTIONS.items()])
+
+
+def update_index(directory, db_path=LIBRARY_DB_PATH):
+    """
+    Brings the index up to date with a directory tree.
+
+    Only files that are new or whose mtime/size changed have their header read; entries for files
+    that disappeared from the directory are removed.
+
+    :return: Dictionary with counts of indexed, unchanged and removed files
+    """
+    counts = {"indexed": 0, "unchanged": 0, "removed": 0}
+    root = os.path.abspath(directory)
+    prefix = os.path.join(root, '')
+
+    with connect(db_path) as connection:
+        known = {path: (mtime, size) for path, mtime, size in connection.execute(
+            "SELECT path, mtime, size FROM carriers WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+
+        seen = set()
+        for folder, _, files in os.walk(root):
+            for name in files:
+                if not name.lower().endswith('.wav'):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    # Broken links, permission errors and files deleted mid-walk skip the file, not the walk;
+                    # they are left out of seen, so a stale entry for them is removed below
+                    stat = os.stat(path)
+                    seen.add(path)
+                    if known.get(path) == (stat.st_mtime, stat.st_size):
+                        counts["unchanged"] += 1
+                        continue
+                    _index_file(connection, path, stat)
+                    counts["indexed"] += 1
+                except (ValueError, EOFError, OSError) as e:
+                    logger.warning(f"Skipping unreadable carrier {path}: {e}")
+
+        removed = [(path,) for path in known if path not in seen]
+        connection.executemany("DELETE FROM carriers WHERE path = ?", removed)
+        counts["removed"] = len(removed)
+
+    connection.close()
+    logger.info(f"Carrier library updated: {counts}")
+    return counts
+
+
+def select_carrier(payload_size, algorithm, db_path=LIBRARY_DB_PATH):
+    """
+    Returns the path of the smallest unused carrier that can hold payload_size message bytes, or None.
+
+    Answered from the index alone; no audio file is opened.
+    """
+    if algorithm not in CAPACITY_FUNCTIONS:
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+
+    with connect(db_path) as connection:
+        row = connection.execute(
+            """SELECT carriers.path FROM capacities JOIN carriers ON carriers.path = capacities.path
+               WHERE capacities.algorithm = ? AND capacities.capacity_bytes >= ? AND carriers.used = 0
+               ORDER BY capacities.capacity_bytes LIMIT 1""",
+            (algorithm, payload_size)).fetchone()
+    connection.close()
+    return row[0] if row else None
+
+
+def mark_used(path, used=True, db_path=LIBRARY_DB_PATH):
+    """Flags a carrier as used (or available again) so selection skips it."""
+    with connect(db_path) as connection:
+        connection.execute("UPDATE carriers SET used = ? WHERE path = ?", (int(used), os.path.abspath(path)))
+    connection.close()
@@ -1,6 +1,5 @@
 import os
 import sys
-from tqdm import tqdm
 
 # Ensure the project root is in the system path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -8,10 +7,12 @@ sys.path.append(project_root)
 
 # Import necessary modules
 from utils.logging_util import setup_logger
-from cli.helpers import display_menu, get_user_choice, get_file_path, display_algorithm_menu
+from utils.memory import memory_report
+from cli.helpers import display_menu, get_user_choice, get_file_path, display_algorithm_menu, progress_bar
 from cli.config import ALGORITHMS
-from cli.accuracy import calculate_accuracy
-from cli.aes import encrypt_message, decrypt_message, get_aes_key
+from cli.accuracy import calculate_accuracy, calculate_accuracy_in_memory
+from cli.aes import encrypt_message, get_aes_key
+from cli.detect import auto_decode
 
 # Initialize logger
 logger = setup_logger(__name__)
@@ -50,25 +51,46 @@ def handle_encode(algo_choice, input_file, output_file, secret_message):
     algorithm = ALGORITHMS[algo_choice]
     logger.info(f"Encoding using {algorithm['name']} -> Output file: {output_file}")
     
-    for _ in tqdm(range(1), desc="Encoding Progress"):
-        algorithm['encode'](input_file, output_file, secret_message)
+    with memory_report(f"Encoding with {algorithm['name']}"):
+        with progress_bar("Encoding Progress"):
+            algorithm['encode'](input_file, output_file, secret_message)
 
 def handle_decode(algo_choice, output_file):
     """Decodes a message using the selected algorithm and decrypts it."""
     algorithm = ALGORITHMS[algo_choice]
     logger.info(f"Decoding using {algorithm['name']} -> Output file: {output_file}")
     
-    for _ in tqdm(range(1), desc="Decoding Progress"):
-        encrypted_message = algorithm['decode'](output_file)
+    with memory_report(f"Decoding with {algorithm['name']}"):
+        with progress_bar("Decoding Progress"):
+            decrypted_message = algorithm['decode'](output_file)  # Decoders decrypt the payload themselves
     
-    if encrypted_message:
-        decrypted_message = decrypt_message(encrypted_message, AES_KEY)
+    if decrypted_message:
         print(f"\n🔹 Decoded Message ({algorithm['name']}): {decrypted_message}")
         logger.info(f"Decoded Message: {decrypted_message}")
     else:
         print("\n❌ Decoding failed. No message extracted.")
         logger.error("Decoding failed. No message extracted.")
 
+def handle_auto_decode():
+    """Detects the algorithm from the file header and decodes with it."""
+    file_path = get_file_path(None, is_input=False)
+    if file_path is None:
+        logger.warning("File selection failed. Returning to main menu.")
+        return
+
+    with memory_report("Auto decoding"):
+        with progress_bar("Decoding Progress"):
+            algorithm_name, decoded_message = auto_decode(file_path)
+
+    if algorithm_name is None:
+        print("\n❌ No supported payload detected.")
+    elif decoded_message:
+        print(f"\n🔹 Decoded Message ({algorithm_name}): {decoded_message}")
+        logger.info(f"Decoded Message: {decoded_message}")
+    else:
+        print(f"\n❌ Detected {algorithm_name} but decoding failed.")
+        logger.error("Decoding failed. No message extracted.")
+
 def handle_accuracy_check():
     """Calculates and displays the accuracy of the decoded message."""
     original_message = input("Enter the original secret message for accuracy calculation: ")
@@ -84,8 +106,11 @@ def handle_accuracy_check():
     output_file = get_file_path(algo_choice, is_input=False)
     algorithm = ALGORITHMS[algo_choice]
     
-    for _ in tqdm(range(1), desc="Accuracy Calculation Progress"):
-        calculate_accuracy(original_message, algorithm, input_file_path=input_file, output_file_path=output_file)
+    # Algorithms with in-memory hooks are evaluated from a single read of the carrier
+    accuracy_check = calculate_accuracy_in_memory if "embed" in algorithm else calculate_accuracy
+    with memory_report(f"Accuracy check of {algorithm['name']}"):
+        with progress_bar("Accuracy Calculation Progress"):
+            accuracy_check(original_message, algorithm, input_file_path=input_file, output_file_path=output_file)
 
 def handle_main_choice(choice):
     """Processes the user's main menu selection."""
@@ -96,8 +121,10 @@ def handle_main_choice(choice):
     elif choice == 2:
         handle_algorithm_choice(encode=False)
     elif choice == 3:
-        handle_accuracy_check()
+        handle_auto_decode()
     elif choice == 4:
+        handle_accuracy_check()
+    elif choice == 5:
         logger.info("Exiting the program.")
         sys.exit(0)
     else:
@@ -107,8 +134,9 @@ def handle_main_choice(choice):
 def main():
     """Main function to run the CLI program."""
     while True:
-        display_menu(["Encode a message", "Decode a message", "Calculate accuracy", "Exit"], "Select an option")
-        choice = get_user_choice(4)
+        display_menu(["Encode a message", "Decode a message", "Decode a message (auto-detect algorithm)",
+                      "Calculate accuracy", "Exit"], "Select an option")
+        choice = get_user_choice(5)
         if choice is not None:
             handle_main_choice(choice)
 
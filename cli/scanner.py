@@ -0,0 +1,173 @@
+import os
+import sys
+import struct
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from utils.logging_util import setup_logger
+from utils.riff import open_wav
+from algorithms.container import HEADER_SIZE, has_magic, parse_header
+from algorithms.kbit_lsb_steganography import read_units, extract_symbols, symbols_to_bits, unit_width
+from algorithms.parallel_engine import LSB_LAYOUT, ENHANCED_LAYOUT
+
+# Initialize logger
+logger = setup_logger(__name__)
+
+# Number of leading frames read from each file; enough for every framing below
+HEAD_FRAMES = 512
+AES_DELIMITER = b'###'
+PRINTABLE_THRESHOLD = 0.9
+
+# Bit layouts a container header is looked for under, most common first.
+# The sample layouts cover kbit_lsb_steganography at its usual depths.
+CONTAINER_LAYOUTS = [LSB_LAYOUT, ENHANCED_LAYOUT] + [
+    {"unit": "sample", "bits": bits, "shift": 0, "flip": 0} for bits in (1, 2, 3, 4)
+]
+
+# ========================== HEAD BIT EXTRACTION ============================
+def lsb_bytes(head):
+    """Packs bit 0 of every carrier byte (MSB first) into bytes, as cli/aes and basic LSB write them."""
+    return np.packbits(head & 1).tobytes()
+
+
+def enhanced_bytes(head):
+    """Packs bits 3 and 2 of every carrier byte (in that order) into bytes, as the enhanced_* modules write them."""
+    pairs = np.stack(((head >> 3) & 1, (head >> 2) & 1), axis=1)
+    return np.packbits(pairs.ravel()).tobytes()
+
+
+def layout_bytes(head, layout, sampwidth):
+    """Packs the payload bits a k-bit layout stores in the head (MSB first) into bytes."""
+    width = unit_width(layout["unit"], sampwidth)
+    symbols = extract_symbols(read_units(head, len(head) // width, width), layout["bits"], layout["shift"])
+    return np.packbits(symbols_to_bits(symbols, layout["bits"])).tobytes()
+
+
+def data_bytes(params):
+    """Returns the size of the sample data described by wave params."""
+    return params.nframes * params.sampwidth * params.nchannels
+
+
+def printable_ratio(data):
+    """Returns the fraction of bytes that are printable ASCII or common whitespace."""
+    if not data:
+        return 0.0
+    values = np.frombuffer(data, dtype=np.uint8)
+    printable = ((values >= 32) & (values < 127)) | (values == 9) | (values == 10) | (values == 13)
+    return float(np.count_nonzero(printable)) / len(values)
+
+# ========================== FRAMING PROBES ============================
+def _probe_length_header(payload, header_carrier_bytes, bits_per_byte, total_bytes):
+    """Checks a legacy 32-bit bit-count header followed by text, as algorithms/* wrote before container headers."""
+    if len(payload) < 4:
+        return None
+
+    message_bits = struct.unpack('>I', payload[:4])[0]
+    if message_bits == 0 or message_bits % 8:
+        return None
+    if header_carrier_bytes + message_bits // bits_per_byte > total_bytes:
+        return None
+
+    visible = payload[4:4 + message_bits // 8]
+    ratio = printable_ratio(visible)
+    if ratio < PRINTABLE_THRESHOLD:
+        return None
+
+    return {"payload_bits": message_bits, "score": ratio, "complete": len(visible) * 8 == message_bits}
+
+
+def probe_basic_lsb(head, params):
+    """Plausibility check for legacy algorithms/basic_lsb_steganography files."""
+    return _probe_length_header(lsb_bytes(head), 32, 1, data_bytes(params))
+
+
+def probe_enhanced_lsb(head, params):
+    """Plausibility check for legacy algorithms/enhanced_lsb_steganography_* files (flip and no flip share framing)."""
+    return _probe_length_header(enhanced_bytes(head), 16, 2, data_bytes(params))
+
+
+def probe_aes_lsb(head, params):
+    """Plausibility check for legacy cli/aes files: IV + CBC ciphertext terminated by the ### delimiter."""
+    payload = lsb_bytes(head)
+    # The delimiter can only follow a 16-byte IV plus a whole number of 16-byte blocks
+    for position in range(32, len(payload) - len(AES_DELIMITER) + 1, 16):
+        if payload[position:position + len(AES_DELIMITER)] == AES_DELIMITER:
+            return {"payload_bits": position * 8, "score": 1.0, "complete": True}
+    return None
+
+
+def probe_container(head, params):
+    """Validates a container header under each known bit layout; the header names the algorithm."""
+    for layout in CONTAINER_LAYOUTS:
+        header_bytes = layout_bytes(head, layout, params.sampwidth)
+        if not has_magic(header_bytes):
+            continue
+        try:
+            header = parse_header(header_bytes)
+        except ValueError:
+            continue
+
+        width = unit_width(layout["unit"], params.sampwidth)
+        if -(-(HEADER_SIZE + header["payload_length"]) * 8 // layout["bits"]) * width > data_bytes(params):
+            continue
+        return {"algorithm": header["algorithm"], "layout": layout, "payload_bits": header["payload_length"] * 8,
+                "score": 2.0, "complete": True}
+    return None
+
+
+# Probe registry: name -> function(head, wave params) returning a candidate dict or None.
+# A candidate may name the exact algorithm under "algorithm"; otherwise the probe name is reported.
+PROBES = {
+    "container": probe_container,
+    "aes_lsb": probe_aes_lsb,
+    "basic_lsb": probe_basic_lsb,
+    "enhanced_lsb": probe_enhanced_lsb,
+}
+
+# ========================== FILE & CORPUS SCANNING ============================
+def scan_file(path, head_frames=HEAD_FRAMES):
+    """Reads only the head of a WAV file and reports which framings look plausible."""
+    result = {"path": path, "algorithm": None, "candidates": {}, "error": None}
+    try:
+        with open_wav(path) as audio:
+            params = audio.getparams()
+            head = np.frombuffer(audio.readframes(min(head_frames, params.nframes)), dtype=np.uint8)
+    except (ValueError, EOFError, OSError) as e:
+        result["error"] = str(e)
+        return result
+
+    for name, probe in PROBES.items():
+        candidate = probe(head, params)
+        if candidate is not None:
+            result["candidates"][name] = candidate
+
+    if result["candidates"]:
+        best = max(result["candidates"], key=lambda name: result["candidates"][name]["score"])
+        result["algorithm"] = result["candidates"][best].get("algorithm", best)
+    return result
+
+
+def find_wav_files(directory):
+    """Recursively lists .wav files under a directory."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith('.wav'))
+    return sorted(paths)
+
+
+def scan_directory(directory, max_workers=8, head_frames=HEAD_FRAMES):
+    """Triages every WAV under a directory, overlapping file I/O with a thread pool."""
+    paths = find_wav_files(directory)
+    logger.info(f"Scanning {len(paths)} files in {directory}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda path: scan_file(path, head_frames), paths))
+
+    flagged = sum(1 for result in results if result["algorithm"])
+    logger.info(f"Scan complete: {flagged}/{len(results)} files carry a plausible payload")
+    return results
+
+
+if __name__ == "__main__":
+    for result in scan_directory(sys.argv[1] if len(sys.argv) > 1 else "output"):
+        status = result["error"] or result["algorithm"] or "clean"
+        print(f"{result['path']}: {status}")
@@ -0,0 +1,318 @@
+import math
+import sys
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from utils.logging_util import setup_logger
+from utils.progress import progress_callback, report_progress
+from utils.riff import open_wav
+from algorithms.kbit_lsb_steganography import read_units
+from cli.scanner import find_wav_files
+
+# Initialize logger
+logger = setup_logger(__name__)
+
+# Frames analysed per block; the chi-square profile has one point per block
+ANALYSIS_BLOCK_FRAMES = 16384
+RS_GROUP = 4                    # Units per RS group; Fridrich's mask [0, 1, 1, 0] flips the middle two
+CHI_SQUARE_BITS = 16            # Histograms fold wider samples to their low bits; LSB pairs are kept
+CHI_SQUARE_MIN_EXPECTED = 5     # Value pairs expected fewer times than this are left out of the statistic
+CHI_SQUARE_THRESHOLD = 0.95     # Prefix p-values above this read as an equalized (embedded) histogram
+RATE_THRESHOLD = 0.05           # Estimated embedding rates above this flag a file as suspicious
+# All three detectors assume neighbouring units often differ only in their LSB. Lanes where fewer adjacent
+# pairs than this share an LSB pair class (low bytes, most 16-bit samples) look like noise and are
+# reported but left out of the verdict, since the estimators return arbitrary values there.
+MIN_PAIR_SHARE = 0.05
+
+# Each lane is one sequence of consecutive carrier units: a channel for "sample",
+# one byte position of one channel for "byte" (the unit every algorithm here embeds in)
+UNITS = ("sample", "byte")
+
+# ========================== CARRIER LANES ============================
+def lane_count(params, unit):
+    """Returns the number of lanes a file is split into for the given unit."""
+    if unit not in UNITS:
+        raise ValueError(f"Unknown analysis unit: {unit}")
+    return params.nchannels * (params.sampwidth if unit == "byte" else 1)
+
+
+def read_lanes(frame_bytes, params, unit):
+    """
+    Converts frame bytes to integer unit values shaped (lanes, frames), each lane contiguous.
+
+    Sample units are signed PCM values (8-bit files stay unsigned, as stored). Byte units are raw bytes,
+    except that the top byte of signed PCM is read as signed so quiet passages do not jump 0 <-> 255.
+    """
+    raw = np.frombuffer(frame_bytes, dtype=np.uint8)
+    lanes = lane_count(params, unit)
+    if unit == "byte":
+        values = raw.reshape(-1, lanes).astype(np.int32)
+        if params.sample_format == "pcm" and params.sampwidth > 1:
+            top = values[:, params.sampwidth - 1::params.sampwidth]
+            values[:, params.sampwidth - 1::params.sampwidth] = (top ^ 0x80) - 0x80
+        return np.ascontiguousarray(values.T)
+
+    if params.sample_format != "pcm":
+        raise ValueError("Sample-unit analysis needs integer PCM; use the byte unit for float files.")
+    width = params.sampwidth
+    values = read_units(raw, len(raw) // width, width).astype(np.int64)
+    if width > 1:
+        sign = np.int64(1) << (8 * width - 1)
+        values = (values ^ sign) - sign
+    return np.ascontiguousarray(values.reshape(-1, lanes).T)
+
+
+def histogram_bins(params, unit):
+    """Returns the histogram size used by the chi-square attack."""
+    bits = 8 if unit == "byte" else min(8 * params.sampwidth, CHI_SQUARE_BITS)
+    return 1 << bits
+
+# ========================== CHI-SQUARE ATTACK ============================
+def chi_square_p_values(histograms):
+    """
+    Westfeld-Pfitzmann chi-square attack on the LSB value pairs (2k, 2k + 1) of each histogram row.
+
+    Embedding equalizes the two counts of every pair, so a p-value near 1 means the histogram looks
+    embedded. The chi-square tail uses the Wilson-Hilferty approximation, accurate for the hundreds of
+    degrees of freedom audio histograms have.
+
+    :param histograms: Count arrays shaped (lanes, bins)
+    :return: Array of p-values, one per lane (0 where too few pairs are populated)
+    """
+    pairs = histograms.reshape(len(histograms), -1, 2).astype(np.float64)
+    expected = pairs.sum(axis=2) / 2
+    valid = expected >= CHI_SQUARE_MIN_EXPECTED
+    terms = (pairs[..., 0] - expected) ** 2 / np.where(valid, expected, 1)
+    statistic = np.where(valid, terms, 0).sum(axis=1)
+    dof = valid.sum(axis=1) - 1
+
+    p_values = np.zeros(len(histograms))
+    for lane in np.flatnonzero(dof > 0):
+        k = dof[lane]
+        z = ((statistic[lane] / k) ** (1 / 3) - (1 - 2 / (9 * k))) / math.sqrt(2 / (9 * k))
+        p_values[lane] = 0.5 * math.erfc(z / math.sqrt(2))
+    return p_values
+
+
+def accumulate_histograms(histograms, values, bins):
+    """Adds the folded values of every lane to the (lanes, bins) histogram counts in place."""
+    lanes = len(values)
+    folded = (values & (bins - 1)).astype(np.intp) + np.arange(lanes, dtype=np.intp)[:, None] * bins
+    histograms += np.bincount(folded.ravel(), minlength=lanes * bins).reshape(lanes, bins)
+
+# ========================== RS ANALYSIS ============================
+def flip_positive(values):
+    """F1: swaps 2k and 2k + 1."""
+    return values ^ 1
+
+
+def flip_negative(values):
+    """F-1: swaps 2k - 1 and 2k."""
+    return ((values + 1) ^ 1) - 1
+
+
+def _smoothness(a, b, c, d):
+    """Discrimination function of groups (a, b, c, d): their summed absolute neighbour differences."""
+    return np.abs(b - a) + np.abs(c - b) + np.abs(d - c)
+
+
+def rs_counts(values):
+    """
+    Counts regular and singular groups of four consecutive units in every lane.
+
+    :param values: Unit values shaped (lanes, frames); a partial trailing group is ignored
+    :return: Counts shaped (8, lanes): R_M, S_M, R_-M, S_-M, then the same for the LSB-flipped signal
+    """
+    end = values.shape[1] // RS_GROUP * RS_GROUP
+    groups = [values[:, i:end:RS_GROUP] for i in range(RS_GROUP)]
+    counts = []
+    for a, b, c, d in (groups, [group ^ 1 for group in groups]):
+        base = _smoothness(a, b, c, d)
+        for flip in (flip_positive, flip_negative):
+            changed = _smoothness(a, flip(b), flip(c), d)
+            counts += [np.count_nonzero(changed > base, axis=1), np.count_nonzero(changed < base, axis=1)]
+    return np.array(counts)
+
+
+def rs_rates(counts):
+    """
+    Solves Fridrich's RS quadratic for the embedding rate of every lane.
+
+    :param counts: Totals from rs_counts, shaped (8, lanes)
+    :return: Estimated fraction of units carrying message bits, one per lane (NaN when undefined)
+    """
+    r_m, s_m, r_neg, s_neg, r_m1, s_m1, r_neg1, s_neg1 = counts.astype(np.float64)
+    d0, d1 = r_m - s_m, r_m1 - s_m1
+    d_neg0, d_neg1 = r_neg - s_neg, r_neg1 - s_neg1
+
+    a = 2 * (d1 + d0)
+    b = d_neg0 - d_neg1 - d1 - 3 * d0
+    c = d0 - d_neg0
+    return _smaller_root_rates(a, b, c, lambda z: z / (z - 0.5))
+
+# ========================== SAMPLE PAIR ANALYSIS ============================
+def spa_counts(values):
+    """
+    Counts the trace sets of Dumitrescu-Wu-Wang sample pair analysis over adjacent units of every lane.
+
+    :param values: Unit values shaped (lanes, frames)
+    :return: Counts shaped (4, lanes): |X|, |Y|, |W| + |Z| and the number of pairs |P|
+    """
+    u, v = values[:, :-1], values[:, 1:]
+    v_even = (v & 1) == 0
+    below, above = u < v, u > v
+    x = np.count_nonzero(np.where(v_even, below, above), axis=1)
+    y = np.count_nonzero(np.where(v_even, above, below), axis=1)
+    same_pair = np.count_nonzero((u >> 1) == (v >> 1), axis=1)
+    return np.array([x, y, same_pair, np.full(len(values), u.shape[1])])
+
+
+def spa_rates(counts):
+    """
+    Solves the sample pair analysis quadratic (|W| + |Z|) / 2 p^2 + (2|X| - |P|) p + |Y| - |X| = 0.
+
+    :param counts: Totals from spa_counts, shaped (4, lanes)
+    :return: Estimated fraction of units carrying message bits, one per lane (NaN when undefined)
+    """
+    x, y, gamma, pairs = counts.astype(np.float64)
+    return _smaller_root_rates(gamma / 2, 2 * x - pairs, y - x, lambda p: p)
+
+
+def _smaller_root_rates(a, b, c, to_rate):
+    """Returns to_rate of the root of a z^2 + b z + c = 0 with the smaller magnitude, per lane."""
+    rates = np.full(len(a), np.nan)
+    for lane in range(len(a)):
+        if a[lane] == 0:
+            roots = [-c[lane] / b[lane]] if b[lane] != 0 else []
+        else:
+            discriminant = b[lane] ** 2 - 4 * a[lane] * c[lane]
+            if discriminant < 0:
+                continue
+            root = math.sqrt(discriminant)
+            roots = [(-b[lane] + root) / (2 * a[lane]), (-b[lane] - root) / (2 * a[lane])]
+        if roots:
+            z = min(roots, key=abs)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rates[lane] = to_rate(z)
+    return rates
+
+# ========================== FILE & DIRECTORY ANALYSIS ============================
+def analyze_file(path, unit="byte", block_frames=ANALYSIS_BLOCK_FRAMES):
+    """
+    Runs the chi-square attack, RS analysis and sample pair analysis over a WAV file, block by block.
+
+    Only one block of frames is held in memory; histograms and group/pair counts are additive, so the
+    estimates cover the whole file. The chi-square profile holds the p-value of every growing prefix,
+    which stays near 1 across a payload written from the start of the carrier and falls after it.
+
+    :param path: Path to the WAV file
+    :param unit: "byte" (lanes per byte position) or "sample" (lanes per channel, integer PCM only)
+    :param block_frames: Frames per block, rounded down to whole RS groups
+    :return: Dictionary with per-lane estimates, the overall rate and a suspicious flag
+    """
+    result = {"path": path, "unit": unit, "error": None, "suspicious": False}
+    block_frames = max(block_frames // RS_GROUP, 1) * RS_GROUP
+    try:
+        with open_wav(path) as audio:
+            params = audio.getparams()
+            lanes = lane_count(params, unit)
+            bins = histogram_bins(params, unit)
+            histograms = np.zeros((lanes, bins), dtype=np.int64)
+            rs_total = np.zeros((8, lanes), dtype=np.int64)
+            spa_total = np.zeros((4, lanes), dtype=np.int64)
+            profile = []
+            previous = None
+
+            while True:
+                data = audio.readframes(block_frames)
+                if not data:
+                    break
+                values = read_lanes(data, params, unit)
+                accumulate_histograms(histograms, values, bins)
+                rs_total += rs_counts(values)
+                # The last frame of the previous block pairs with the first of this one
+                spa_total += spa_counts(values if previous is None else np.concatenate((previous, values), axis=1))
+                previous = values[:, -1:]
+                profile.append(chi_square_p_values(histograms))
+                report_progress("analyse", audio.tell() * params.sampwidth * params.nchannels, params.data_size)
+    except (ValueError, EOFError, OSError) as e:
+        result["error"] = str(e)
+        return result
+
+    if not profile:
+        # A carrier without frames holds no samples to test, and so nothing embedded either
+        result.update({
+            "frames": 0,
+            "lanes": lanes,
+            "reliable": [False] * lanes,
+            "chi_square": {"p_values": [], "embedded_fraction": [0.0] * lanes, "profile": []},
+            "rs": [math.nan] * lanes,
+            "spa": [math.nan] * lanes,
+            "rate": None,
+        })
+        return result
+
+    profile = np.array(profile).reshape(-1, lanes)
+    rs = np.clip(rs_rates(rs_total), 0, 1)
+    spa = np.clip(spa_rates(spa_total), 0, 1)
+    reliable = spa_total[2] >= MIN_PAIR_SHARE * np.maximum(spa_total[3], 1)
+
+    # Embedded prefix: the blocks before the cumulative p-value first drops below the threshold
+    below = profile < CHI_SQUARE_THRESHOLD
+    embedded_blocks = np.where(below.any(axis=0), below.argmax(axis=0), len(profile))
+    embedded_fraction = np.minimum(embedded_blocks * block_frames, params.nframes) / max(params.nframes, 1)
+
+    # Mean of the RS and SPA estimates, or whichever one is defined
+    estimates = np.where(np.isnan(rs), spa, np.where(np.isnan(spa), rs, (rs + spa) / 2))
+    estimates = np.where(reliable, estimates, np.nan)
+    rate = float(np.nanmax(estimates)) if np.any(~np.isnan(estimates)) else None
+
+    result.update({
+        "frames": params.nframes,
+        "lanes": lanes,
+        "reliable": reliable.tolist(),
+        "chi_square": {
+            "p_values": profile[-1].tolist() if len(profile) else [],
+            "embedded_fraction": embedded_fraction.tolist(),
+            "profile": profile.tolist(),
+        },
+        "rs": rs.tolist(),
+        "spa": spa.tolist(),
+        "rate": rate,
+        "suspicious": bool((rate is not None and rate > RATE_THRESHOLD) or np.any(reliable & (embedded_fraction > 0))),
+    })
+    return result
+
+
+def analyze_directory(directory, max_workers=8, unit="byte", block_frames=ANALYSIS_BLOCK_FRAMES, aggregator=None):
+    """
+    Audits every WAV under a directory; NumPy releases the GIL, so threads overlap I/O and analysis.
+
+    Pass a ProgressAggregator to follow the combined progress of the files from another thread.
+    """
+    paths = find_wav_files(directory)
+    logger.info(f"Analysing {len(paths)} files in {directory}")
+
+    def job(path):
+        if aggregator is None:
+            return analyze_file(path, unit, block_frames)
+        with progress_callback(aggregator.callback_for(path)):
+            return analyze_file(path, unit, block_frames)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(job, paths))
+
+    flagged = sum(1 for result in results if result["suspicious"])
+    logger.info(f"Analysis complete: {flagged}/{len(results)} files look embedded")
+    return results
+
+
+if __name__ == "__main__":
+    for result in analyze_directory(sys.argv[1] if len(sys.argv) > 1 else "output"):
+        if result["error"]:
+            print(f"{result['path']}: {result['error']}")
+            continue
+        status = "suspicious" if result["suspicious"] else "clean"
+        rate = "n/a (no smooth lane)" if result["rate"] is None else f"{result['rate']:.3f}"
+        prefix = max((fraction for fraction, reliable in zip(result["chi_square"]["embedded_fraction"],
+                                                             result["reliable"]) if reliable), default=0.0)
+        print(f"{result['path']}: {status} (estimated rate {rate}, chi-square embedded prefix {prefix:.1%})")
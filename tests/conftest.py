@@ -0,0 +1,26 @@
+import os
+import sys
+import wave
+import numpy as np
+import pytest
+
+# Modules import each other as utils.*, algorithms.* and cli.*; cli/config and cli/accuracy use bare imports
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for path in (ROOT, os.path.join(ROOT, 'cli')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def make_wav(tmp_path):
+    """Returns a function writing a 16-bit PCM WAV of random samples and returning its path."""
+    def make(name="carrier.wav", frames=20000, channels=2, seed=0):
+        path = str(tmp_path / name)
+        samples = np.random.default_rng(seed).integers(-20000, 20000, size=frames * channels, dtype=np.int16)
+        with wave.open(path, 'wb') as audio:
+            audio.setnchannels(channels)
+            audio.setsampwidth(2)
+            audio.setframerate(44100)
+            audio.writeframes(samples.astype('<i2').tobytes())
+        return path
+    return make
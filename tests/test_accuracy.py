@@ -0,0 +1,36 @@
+import math
+import pytest
+from cli.accuracy import (calculate_accuracy_in_memory, calculate_psnr, calculate_psnr_streamed, signal_metrics,
+                          snr_streamed)
+from cli.config import ALGORITHMS
+from utils.memory import set_memory_budget
+from utils.riff import frames_to_float, open_wav
+
+
+def read_samples(path):
+    with open_wav(path) as audio:
+        return frames_to_float(audio.readframes(audio.getnframes()), audio.getparams())
+
+
+@pytest.mark.parametrize("number", [1, 2])
+def test_in_memory_psnr_matches_calculate_psnr(make_wav, tmp_path, number):
+    carrier, stego = make_wav(), str(tmp_path / "stego.wav")
+    result = calculate_accuracy_in_memory("accuracy check message", ALGORITHMS[number], carrier, stego)
+    assert result["accuracy"] == 100.0
+    assert math.isfinite(result["psnr"])
+    assert result["psnr"] == pytest.approx(calculate_psnr(carrier, stego), abs=1e-9)
+    assert result["psnr"] == pytest.approx(calculate_psnr_streamed(carrier, stego, block_frames=777), abs=1e-9)
+
+
+def test_through_files_matches_in_memory(make_wav, tmp_path):
+    carrier, stego = make_wav(), str(tmp_path / "stego.wav")
+    set_memory_budget(1024)
+    try:
+        result = calculate_accuracy_in_memory("accuracy check message", ALGORITHMS[1], carrier, stego)
+    finally:
+        set_memory_budget(None)
+    psnr, snr = signal_metrics(read_samples(carrier), read_samples(stego))
+    assert result["accuracy"] == 100.0 and result["capacity_utilization"] > 0
+    assert result["psnr"] == pytest.approx(psnr, abs=1e-9)
+    assert result["snr"] == pytest.approx(snr, abs=1e-9)
+    assert snr_streamed(carrier, stego, block_frames=333) == pytest.approx(snr, abs=1e-9)
@@ -0,0 +1,41 @@
+import secrets
+import pytest
+from cli.aes import GCM_NONCE_SIZE, GCM_TAG_SIZE, decrypt_batch, encrypt_batch
+
+KEY = bytes(range(32))
+MESSAGES = ["first", b"second \x00 bytes", "", "x" * 5000] + [f"message {i}" for i in range(50)]
+
+
+@pytest.mark.parametrize("max_workers", [None, 1, 4])
+def test_round_trip(max_workers):
+    buffer, offsets = encrypt_batch(MESSAGES, KEY, max_workers=max_workers)
+    assert len(offsets) == len(MESSAGES) + 1 and offsets[-1] == len(buffer)
+    for i, message in enumerate(MESSAGES):
+        payload = message.encode() if isinstance(message, str) else message
+        assert offsets[i + 1] - offsets[i] == GCM_NONCE_SIZE + len(payload) + GCM_TAG_SIZE
+
+    results = decrypt_batch(buffer, offsets, KEY, max_workers=max_workers)
+    assert [result["error"] for result in results] == [None] * len(MESSAGES)
+    assert [result["message"] for result in results] == [m.encode() if isinstance(m, str) else m for m in MESSAGES]
+
+
+def test_nonces_are_unique():
+    buffer, offsets = encrypt_batch(["same"] * 100, KEY, max_workers=4)
+    nonces = {bytes(buffer[offset:offset + GCM_NONCE_SIZE]) for offset in offsets[:-1]}
+    assert len(nonces) == 100
+
+
+def test_tampered_record_fails_alone():
+    buffer, offsets = encrypt_batch(MESSAGES, KEY)
+    buffer[offsets[2] + GCM_NONCE_SIZE] ^= 1  # Tag of item 2, an empty message
+    buffer[offsets[1] + 3] ^= 0x80  # Nonce of item 1
+    results = decrypt_batch(buffer, offsets, KEY, max_workers=3)
+    assert [i for i, result in enumerate(results) if result["error"]] == [1, 2]
+    assert results[0]["message"] == b"first" and results[2]["message"] is None
+
+
+def test_wrong_key_and_short_records():
+    buffer, offsets = encrypt_batch(MESSAGES[:3], KEY)
+    assert all(result["error"] for result in decrypt_batch(buffer, offsets, secrets.token_bytes(32)))
+    short = decrypt_batch(buffer[:10], [0, 10], KEY)
+    assert short == [{"message": None, "error": "Record too short."}]
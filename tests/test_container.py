@@ -0,0 +1,151 @@
+import struct
+import numpy as np
+import pytest
+from algorithms import container
+from algorithms.container import (ALGORITHM_IDS, FLAG_ENCRYPTED, FLAG_LZMA, FLAG_ZLIB, HEADER_SIZE, compress_payload,
+                                  decompress_payload, frame_payload, pack_header, parse_header, payload_span,
+                                  read_framed_payload)
+from utils.memory import set_memory_budget
+from utils.riff import open_wav, read_params, write_like
+
+BASIC = ALGORITHM_IDS["basic_lsb"]
+
+
+def lsb_bytes(carrier):
+    return np.packbits(np.frombuffer(carrier, dtype=np.uint8) & 1).tobytes()
+
+
+def compressed(data, flag):
+    """Compresses data with the codec of one header flag, the way compress_payload does."""
+    if flag == FLAG_ZLIB:
+        deflater = container.zlib.compressobj(9, container.zlib.DEFLATED, -15)
+        return deflater.compress(data) + deflater.flush()
+    return container.lzma.compress(data, format=container.lzma.FORMAT_RAW, filters=container.LZMA_FILTERS)
+
+
+def embed_lsb(path, output, payload):
+    """Writes payload into the LSB of every carrier byte, as basic LSB does."""
+    with open_wav(path) as audio:
+        frames = bytearray(audio.readframes(audio.getnframes()))
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    carrier = np.frombuffer(frames, dtype=np.uint8)
+    carrier[:len(bits)] = (carrier[:len(bits)] & 254) | bits
+    write_like(path, output, frames)
+
+
+# ========================== HEADER ============================
+def test_header_round_trip():
+    nonce = bytes(range(16))
+    header = parse_header(pack_header(BASIC, 1234, FLAG_ENCRYPTED | FLAG_ZLIB, nonce), BASIC)
+    assert len(pack_header(BASIC, 0)) == HEADER_SIZE
+    assert header["algorithm"] == "basic_lsb"
+    assert header["payload_length"] == 1234
+    assert header["flags"] == FLAG_ENCRYPTED | FLAG_ZLIB
+    assert header["nonce"] == nonce
+    assert header["param"] == 0
+    assert parse_header(pack_header(BASIC, 1, param=5))["param"] == 5
+
+
+def test_header_nonce_is_zero_padded_and_bounded():
+    assert parse_header(pack_header(BASIC, 1, nonce=b'ab'))["nonce"] == b'ab'.ljust(16, b'\0')
+    with pytest.raises(ValueError):
+        pack_header(BASIC, 1, nonce=bytes(17))
+
+
+@pytest.mark.parametrize("position", [4, 6, 8, HEADER_SIZE - 1])
+def test_header_rejects_corruption(position):
+    header = bytearray(pack_header(BASIC, 99))
+    header[position] ^= 0x01
+    with pytest.raises(ValueError):
+        parse_header(header)
+
+
+def test_header_rejects_truncation_missing_magic_and_wrong_algorithm():
+    header = pack_header(BASIC, 99)
+    with pytest.raises(ValueError, match="truncated"):
+        parse_header(header[:-1])
+    with pytest.raises(ValueError, match="No container header"):
+        parse_header(b'\0' * HEADER_SIZE)
+    with pytest.raises(ValueError, match="not"):
+        parse_header(header, ALGORITHM_IDS["kbit_lsb"])
+
+
+def test_header_rejects_newer_version():
+    body = container.HEADER_BODY.pack(container.MAGIC, container.VERSION + 1, BASIC, 0, 0, 5, bytes(16))
+    with pytest.raises(ValueError, match="version"):
+        parse_header(body + struct.pack('>I', container.zlib.crc32(body)))
+
+
+def test_payload_span_framed_and_legacy():
+    start, length, header = payload_span(pack_header(BASIC, 42), BASIC)
+    assert (start, length, header["payload_length"]) == (HEADER_SIZE, 42, 42)
+
+    # Legacy files start with a bare 32-bit bit count
+    legacy = struct.pack('>I', 80).ljust(HEADER_SIZE, b'\0')
+    assert payload_span(legacy, BASIC) == (container.LEGACY_LENGTH_SIZE, 10, None)
+
+
+# ========================== FRAMED READS ============================
+@pytest.mark.parametrize("budget", [None, 1 << 16])
+def test_read_framed_payload_round_trip(make_wav, tmp_path, budget):
+    carrier = make_wav()
+    output = str(tmp_path / "framed.wav")
+    message = bytes(np.random.default_rng(1).integers(0, 256, 3000, dtype=np.uint8))
+    embed_lsb(carrier, output, frame_payload(BASIC, message, compress=False))
+
+    set_memory_budget(budget)  # A small budget takes the chunked path
+    try:
+        with open_wav(output) as audio:
+            payload, header = read_framed_payload(audio, lsb_bytes, lambda count: count * 8, BASIC)
+    finally:
+        set_memory_budget(None)
+    assert payload == message
+    assert header["payload_length"] == len(message)
+
+
+def test_read_framed_payload_legacy(make_wav, tmp_path):
+    output = str(tmp_path / "legacy.wav")
+    embed_lsb(make_wav(), output, struct.pack('>I', 5 * 8) + b'hello')
+    with open_wav(output) as audio:
+        assert read_framed_payload(audio, lsb_bytes, lambda count: count * 8) == (b'hello', None)
+
+
+def test_read_framed_payload_rejects_lengths_beyond_the_carrier(make_wav, tmp_path):
+    carrier = make_wav(frames=1000)
+    output = str(tmp_path / "oversized.wav")
+    embed_lsb(carrier, output, pack_header(BASIC, read_params(carrier).data_size))
+    with open_wav(output) as audio, pytest.raises(ValueError, match="larger than the available"):
+        read_framed_payload(audio, lsb_bytes, lambda count: count * 8, BASIC)
+
+
+# ========================== COMPRESSION ============================
+@pytest.mark.parametrize("data", [b'', b'x', b'abc' * 1000, bytes(range(256)) * 8])
+def test_compress_round_trip(data):
+    stored, flags = compress_payload(data)
+    assert len(stored) <= len(data)
+    assert decompress_payload(stored, flags) == data
+
+
+def test_compress_keeps_incompressible_data_and_honors_opt_out():
+    data = bytes(np.random.default_rng(2).integers(0, 256, 512, dtype=np.uint8))
+    assert compress_payload(data) == (data, 0)
+    assert compress_payload(b'a' * 1000, compress=False) == (b'a' * 1000, 0)
+
+
+@pytest.mark.parametrize("flag", [FLAG_ZLIB, FLAG_LZMA])
+def test_decompress_rejects_corrupt_and_truncated_streams(flag):
+    with pytest.raises(ValueError):
+        decompress_payload(b'\xff' * 64, flag)
+
+    stored = compressed(b'hello world ' * 200, flag)
+    assert decompress_payload(stored, flag) == b'hello world ' * 200
+    with pytest.raises(ValueError):
+        decompress_payload(stored[:len(stored) // 2], flag)
+
+
+@pytest.mark.parametrize("flag", [FLAG_ZLIB, FLAG_LZMA])
+def test_decompress_rejects_payloads_inflating_beyond_the_limit(monkeypatch, flag):
+    stored = compressed(b'\0' * 4096, flag)
+    monkeypatch.setattr(container, "MAX_INFLATED_SIZE", 1024)
+    with pytest.raises(ValueError, match="size limit"):
+        decompress_payload(stored, flag)
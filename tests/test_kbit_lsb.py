@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from algorithms import kbit_lsb_steganography as kbit
+from algorithms.kbit_lsb_steganography import bits_to_symbols, read_units, symbols_to_bits, write_units
+from utils.memory import set_memory_budget
+from utils.riff import open_wav, read_params
+
+MESSAGE = "k-bit depth message " * 10
+
+
+def read_frames(path):
+    with open_wav(path) as audio:
+        return np.frombuffer(audio.readframes(audio.getnframes()), dtype=np.uint8)
+
+
+def test_symbol_and_unit_packing():
+    bits = np.random.default_rng(1).integers(0, 2, 301).astype(np.uint8)
+    for k in (1, 3, 5, 16):
+        assert np.array_equal(symbols_to_bits(bits_to_symbols(bits, k), k)[:len(bits)], bits)
+
+    raw = np.arange(24, dtype=np.uint8)
+    for width in (1, 2, 3, 4):
+        units = read_units(raw, len(raw) // width, width)
+        copy = np.zeros_like(raw)
+        write_units(copy, units, width)
+        assert np.array_equal(copy, raw)
+
+
+@pytest.mark.parametrize("bits, shift, unit", [(1, 0, "sample"), (2, 0, "sample"), (4, 2, "sample"),
+                                               (3, 0, "byte"), (8, 0, "byte"), (12, 1, "sample")])
+def test_round_trip_changes_only_the_field(make_wav, tmp_path, bits, shift, unit):
+    carrier, output = make_wav(), str(tmp_path / "out.wav")
+    kbit.encode(carrier, output, MESSAGE, bits=bits, shift=shift, unit=unit)
+    assert kbit.decode(output, bits=bits, shift=shift, unit=unit) == MESSAGE
+
+    width = 2 if unit == "sample" else 1
+    original = read_units(read_frames(carrier), len(read_frames(carrier)) // width, width)
+    stego = read_units(read_frames(output), len(original), width)
+    mask = np.uint32(((1 << bits) - 1) << shift)
+    assert np.array_equal(original & ~mask, stego & ~mask)
+
+
+def test_chunked_matches_in_memory(make_wav, tmp_path):
+    carrier, in_memory, chunked = make_wav(), str(tmp_path / "memory.wav"), str(tmp_path / "chunked.wav")
+    kbit.encode(carrier, in_memory, MESSAGE, bits=3)
+    set_memory_budget(1024)
+    try:
+        kbit.encode(carrier, chunked, MESSAGE, bits=3)
+        assert kbit.decode(chunked, bits=3) == MESSAGE
+    finally:
+        set_memory_budget(None)
+    assert np.array_equal(read_frames(in_memory), read_frames(chunked))
+
+
+def test_wrong_depth_does_not_decode(make_wav, tmp_path):
+    output = str(tmp_path / "out.wav")
+    kbit.encode(make_wav(), output, MESSAGE, bits=3)
+    assert kbit.decode(output, bits=2) is None
+
+
+def test_capacity_and_invalid_depths(make_wav, tmp_path):
+    carrier = make_wav(frames=1000)
+    report = kbit.file_capacity_report(carrier, bits=2)
+    assert report["capacity_bits"] == 1000 * 2 * 2 - 32 * 8
+    assert report["capacity_bytes"] == report["capacity_bits"] // 8
+    assert kbit.capacity_report(read_params(carrier), bits=1)["expected_psnr_db"] > report["expected_psnr_db"]
+
+    for bits, shift, unit in [(0, 0, "sample"), (9, 0, "byte"), (2, 15, "sample"), (1, 0, "word")]:
+        with pytest.raises(ValueError):
+            kbit.capacity_report(read_params(carrier), bits, shift, unit)
+
+    # Random letters stay larger than the capacity after compression; nothing is written
+    message = "".join(chr(c) for c in np.random.default_rng(2).integers(33, 127, 2000))
+    output = str(tmp_path / "too_large.wav")
+    kbit.encode(carrier, output, message, bits=1)
+    assert kbit.decode(output, bits=1) is None
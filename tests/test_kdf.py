@@ -0,0 +1,123 @@
+import pytest
+from algorithms.container import FLAG_KDF, HEADER_SIZE, parse_header
+from cli.aes import AES_LSB_ID, frame_encrypted, lsb_decode, lsb_encode
+from utils import kdf
+from utils.kdf import (KDF_BLOCK, KDF_PBKDF2, KDF_SCRYPT, KdfParams, clear_key_cache, key_cache_info, key_source,
+                       master_key, message_key, pack_kdf_block, parse_kdf_block, use_key)
+from utils.riff import open_wav, write_like
+
+MESSAGE = "derived key message"
+# Cheap costs keep the tests fast; the format is the same at the defaults
+FAST_SCRYPT = {"log2_n": 10, "r": 8, "p": 1}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_key_cache()
+    yield
+    clear_key_cache()
+
+
+@pytest.fixture
+def key_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv(kdf.KEY_DIR_ENV, str(tmp_path))
+    (tmp_path / "7.bin").write_bytes(bytes(range(32)))
+    return tmp_path
+
+
+def test_kdf_block_round_trip():
+    source = key_source("secret", kdf="pbkdf2", iterations=1000)
+    block = pack_kdf_block(source.params)
+    assert len(block) == KDF_BLOCK.size
+    assert parse_kdf_block(block + b"ciphertext") == source.params
+    assert source.params.kdf == KDF_PBKDF2 and source.secret == b"secret"
+
+
+@pytest.mark.parametrize("params", [
+    KdfParams(9, 0, 0, 0, 0, bytes(16), 0),                 # Unknown KDF
+    KdfParams(KDF_SCRYPT, 0, 8, 1, 0, bytes(16), 0),        # N = 1
+    KdfParams(KDF_SCRYPT, 40, 255, 255, 0, bytes(16), 0),   # Far over the memory budget
+    KdfParams(KDF_PBKDF2, 0, 0, 0, 0, bytes(16), 0),        # No iterations
+    KdfParams(KDF_PBKDF2, 0, 0, 0, 2 ** 32 - 1, bytes(16), 0),
+])
+def test_untrusted_parameters_are_rejected(params):
+    with pytest.raises(ValueError):
+        parse_kdf_block(pack_kdf_block(params))
+
+
+def test_truncated_block_and_missing_secret():
+    with pytest.raises(ValueError):
+        parse_kdf_block(bytes(KDF_BLOCK.size - 1))
+    with pytest.raises(ValueError):
+        key_source()
+    with pytest.raises(ValueError):
+        master_key(None, key_source("secret", **FAST_SCRYPT).params)
+
+
+def test_master_key_cache():
+    source = key_source("secret", **FAST_SCRYPT)
+    first = master_key(source.secret, source.params)
+    assert master_key(source.secret, source.params) == first
+    assert key_cache_info() == {"hits": 1, "misses": 1, "size": 1}
+
+    assert master_key(b"other", source.params) != first
+    assert master_key(source.secret, key_source("secret", **FAST_SCRYPT).params) != first  # Fresh salt
+    assert key_cache_info()["misses"] == 3
+    assert message_key(first, bytes(16)) != message_key(first, bytes(15) + b"\x01")
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(kdf, "KEY_CACHE_SIZE", 2)
+    sources = [key_source("secret", kdf="pbkdf2", iterations=1) for _ in range(3)]
+    for source in sources:
+        master_key(source.secret, source.params)
+    assert key_cache_info()["size"] == 2
+    master_key(sources[0].secret, sources[0].params)  # The oldest entry was evicted
+    assert key_cache_info()["hits"] == 0
+
+
+@pytest.mark.parametrize("make_source", [
+    lambda: key_source("correct horse", **FAST_SCRYPT),
+    lambda: key_source("correct horse", kdf="pbkdf2", iterations=1000),
+    lambda: key_source(key_id=7),
+])
+def test_encode_decode_under_a_key_source(make_wav, tmp_path, key_dir, make_source):
+    output = str(tmp_path / "out.wav")
+    source = make_source()
+    with use_key(source):
+        lsb_encode(make_wav(), output, MESSAGE)
+        assert lsb_decode(output) == MESSAGE
+
+    # Decoding needs only the passphrase; the KDF block carries salt and costs
+    with use_key(key_source("correct horse")):
+        assert lsb_decode(output) == MESSAGE
+    assert key_cache_info()["hits"] >= 1
+
+
+def test_wrong_passphrase_and_tampering(make_wav, tmp_path):
+    output = str(tmp_path / "out.wav")
+    with use_key(key_source("right", **FAST_SCRYPT)):
+        framed = frame_encrypted(MESSAGE, AES_LSB_ID)
+        lsb_encode(make_wav(), output, MESSAGE)
+    assert parse_header(framed)["flags"] & FLAG_KDF
+    assert len(framed) > HEADER_SIZE + KDF_BLOCK.size
+
+    with use_key(key_source("wrong", **FAST_SCRYPT)):
+        assert lsb_decode(output) != MESSAGE
+    assert lsb_decode(output) != MESSAGE  # No passphrase at all
+
+    # A flipped salt bit derives another key
+    with open_wav(output) as audio:
+        frames = bytearray(audio.readframes(audio.getnframes()))
+    frames[(HEADER_SIZE + 8) * 8] ^= 1
+    write_like(output, output, frames)
+    with use_key(key_source("right", **FAST_SCRYPT)):
+        assert lsb_decode(output) != MESSAGE
+
+
+def test_missing_key_file(make_wav, tmp_path, key_dir):
+    output = str(tmp_path / "out.wav")
+    with use_key(key_source(key_id=7)):
+        lsb_encode(make_wav(), output, MESSAGE)
+    (key_dir / "7.bin").unlink()
+    assert lsb_decode(output) != MESSAGE
@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pytest
+from algorithms import basic_lsb_steganography as basic
+from cli import library
+from cli.aes import lsb_decode, lsb_encode
+
+
+@pytest.fixture
+def corpus(make_wav, tmp_path):
+    """Three carriers of growing size, one in a subdirectory, plus files the index must skip."""
+    os.makedirs(tmp_path / "corpus" / "nested")
+    paths = {
+        "small": make_wav("corpus/small.wav", frames=2000),
+        "medium": make_wav("corpus/nested/medium.wav", frames=8000),
+        "large": make_wav("corpus/large.wav", frames=30000),
+    }
+    (tmp_path / "corpus" / "broken.wav").write_bytes(b"RF64\xff\xff\xff\xffWAVEds64\x1c\x00\x00\x00\x00")
+    (tmp_path / "corpus" / "notes.txt").write_text("not audio")
+    os.symlink(str(tmp_path / "missing.wav"), str(tmp_path / "corpus" / "dangling.wav"))
+    return str(tmp_path / "corpus"), paths, str(tmp_path / "library.sqlite")
+
+
+def random_text(length, seed=0):
+    return "".join(chr(c) for c in np.random.default_rng(seed).integers(33, 127, length))
+
+
+def capacity(db_path, path, algorithm):
+    with library.connect(db_path) as connection:
+        row = connection.execute("SELECT capacity_bytes FROM capacities WHERE path = ? AND algorithm = ?",
+                                 (path, algorithm)).fetchone()
+    connection.close()
+    return row[0]
+
+
+def test_incremental_update(corpus):
+    directory, paths, db_path = corpus
+    assert library.update_index(directory, db_path) == {"indexed": 3, "unchanged": 0, "removed": 0}
+    assert library.update_index(directory, db_path) == {"indexed": 0, "unchanged": 3, "removed": 0}
+
+    os.remove(paths["medium"])
+    with open(paths["small"], 'ab') as f:
+        f.write(b'\x00\x00')  # New size; the data chunk itself is unchanged
+    assert library.update_index(directory, db_path) == {"indexed": 1, "unchanged": 1, "removed": 1}
+
+
+def test_select_smallest_unused_carrier(corpus):
+    directory, paths, db_path = corpus
+    library.update_index(directory, db_path)
+    small = capacity(db_path, paths["small"], "basic_lsb")
+    assert library.select_carrier(small, "basic_lsb", db_path) == paths["small"]
+    assert library.select_carrier(small + 1, "basic_lsb", db_path) == paths["medium"]
+    assert library.select_carrier(10 ** 9, "basic_lsb", db_path) is None
+
+    library.mark_used(paths["small"], db_path=db_path)
+    assert library.select_carrier(1, "basic_lsb", db_path) == paths["medium"]
+    library.mark_used(paths["small"], used=False, db_path=db_path)
+    assert library.select_carrier(1, "basic_lsb", db_path) == paths["small"]
+
+    with pytest.raises(ValueError):
+        library.select_carrier(1, "unknown", db_path)
+
+
+@pytest.mark.parametrize("algorithm, encode, decode", [
+    ("basic_lsb", basic.encode, basic.decode),
+    ("aes_lsb", lsb_encode, lsb_decode),
+])
+def test_indexed_capacity_fits(corpus, tmp_path, algorithm, encode, decode):
+    directory, paths, db_path = corpus
+    library.update_index(directory, db_path)
+    message = random_text(capacity(db_path, paths["small"], algorithm))
+    output = str(tmp_path / "stego.wav")
+    encode(paths["small"], output, message)
+    assert decode(output) == message
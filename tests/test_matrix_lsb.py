@@ -0,0 +1,62 @@
+import shutil
+import pytest
+from algorithms import matrix_lsb_steganography as matrix
+from algorithms.container import frame_payload
+from cli.detect import auto_decode
+from utils.memory import set_memory_budget
+from utils.riff import open_wav, write_like
+
+MESSAGE = "matrix embedding message " * 12
+
+
+@pytest.fixture
+def tiny_budget():
+    """Sends encode and decode down their chunked paths."""
+    set_memory_budget(1024)
+    yield
+    set_memory_budget(None)
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("p", [1, 2, 3, 5])
+def test_round_trip_records_p(make_wav, tmp_path, p):
+    output = str(tmp_path / "out.wav")
+    matrix.encode(make_wav(), output, MESSAGE, p=p)
+    with open_wav(output) as audio:
+        assert matrix.header_p(audio) == p
+    assert matrix.decode(output) == MESSAGE
+    assert auto_decode(output) == ("matrix_lsb", MESSAGE)
+
+
+@pytest.mark.parametrize("p", [2, 4])
+def test_chunked_matches_in_memory(make_wav, tmp_path, tiny_budget, p):
+    carrier = make_wav()
+    chunked, in_memory = str(tmp_path / "chunked.wav"), str(tmp_path / "memory.wav")
+    matrix.encode(carrier, chunked, MESSAGE, p=p)
+    assert matrix.decode(chunked) == MESSAGE
+
+    set_memory_budget(None)
+    matrix.encode(carrier, in_memory, MESSAGE, p=p)
+    assert read_bytes(chunked) == read_bytes(in_memory)
+
+
+def test_header_without_p_uses_the_given_default(make_wav, tmp_path):
+    """Files written before the header recorded p carry 0 there and decode with the p passed in."""
+    carrier, output = make_wav(), str(tmp_path / "out.wav")
+    with open_wav(carrier) as audio:
+        frames = bytearray(audio.readframes(audio.getnframes()))
+    matrix.embed(frames, frame_payload(matrix.ALGORITHM_ID, MESSAGE.encode()), p=4)
+    write_like(carrier, output, frames)
+    assert matrix.decode(output, p=4) == MESSAGE
+    assert matrix.decode(output) != MESSAGE
+
+
+def test_unsupported_p_is_rejected(make_wav, tmp_path):
+    carrier, output = make_wav(), str(tmp_path / "out.wav")
+    shutil.copyfile(carrier, output)
+    matrix.encode(carrier, output, MESSAGE, p=17)
+    assert read_bytes(output) == read_bytes(carrier)
@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import pytest
+from algorithms import incremental_update
+from algorithms import multi_payload_steganography as multi
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture
+def carrier(make_wav, tmp_path):
+    """A multi-payload carrier holding two records."""
+    path = str(tmp_path / "multi.wav")
+    multi.create(make_wav(), path)
+    multi.add_record(path, "first record")
+    multi.add_record(path, b"second record")
+    return path
+
+
+def test_records_round_trip(carrier):
+    assert [entry["id"] for entry in multi.list_records(carrier)] == [1, 2]
+    assert multi.read_record(carrier, 1) == b"first record"
+    assert multi.read_record(carrier) == b"second record"
+
+
+def test_append_torn_in_the_toc_write_is_completed_from_the_journal(carrier, monkeypatch):
+    apply_patch = incremental_update._apply_patch
+
+    def torn_apply(file, data_offset, positions, new_values):
+        half = len(positions) // 2
+        apply_patch(file, data_offset, positions[:half], new_values[:half])
+        raise Crash()
+
+    monkeypatch.setattr(incremental_update, "_apply_patch", torn_apply)
+    with pytest.raises(Crash):
+        multi.add_record(carrier, "third record")
+    monkeypatch.setattr(incremental_update, "_apply_patch", apply_patch)
+
+    # Half of the new table is on disk; the journal replays the rest before anything is read
+    assert multi.read_record(carrier, 1) == b"first record"
+    assert multi.read_record(carrier, 2) == b"second record"
+    assert multi.read_record(carrier, 3) == b"third record"
+    assert not os.path.exists(carrier + incremental_update.JOURNAL_SUFFIX)
+
+
+def test_append_torn_in_the_journal_write_keeps_the_previous_table(carrier, monkeypatch):
+    def torn_journal(file_path, data_offset, positions, new_values):
+        body = incremental_update.JOURNAL_HEADER.pack(incremental_update.JOURNAL_MAGIC, data_offset, len(positions))
+        with open(file_path + incremental_update.JOURNAL_SUFFIX, 'wb') as journal:
+            journal.write((body + positions.astype('<u8').tobytes())[:len(body) + 4 * len(positions)])
+        raise Crash()
+
+    monkeypatch.setattr(incremental_update, "_write_journal", torn_journal)
+    with pytest.raises(Crash):
+        multi.add_record(carrier, "third record")
+    monkeypatch.undo()
+
+    assert [entry["id"] for entry in multi.list_records(carrier)] == [1, 2]
+    assert multi.read_record(carrier, 1) == b"first record"
+    assert multi.read_record(carrier, 2) == b"second record"
+    # The space of the lost record is reused by the next append
+    assert multi.add_record(carrier, "third record") == 3
+    assert multi.read_record(carrier, 3) == b"third record"
+
+
+def test_corrupt_record_is_reported(carrier):
+    entry = multi.list_records(carrier)[0]
+    multi._write_region(carrier, entry["offset"], bytes(np.full(entry["length"], 0x55, dtype=np.uint8)))
+    with pytest.raises(ValueError, match="checksum"):
+        multi.read_record(carrier, 1)
+    assert multi.read_record(carrier, 2) == b"second record"
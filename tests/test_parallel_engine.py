@@ -0,0 +1,57 @@
+import shutil
+import pytest
+from algorithms import basic_lsb_steganography as basic
+from algorithms import kbit_lsb_steganography as kbit
+from algorithms import parallel_engine
+from algorithms.parallel_engine import ENHANCED_FLIP_LAYOUT, LSB_LAYOUT, parallel_embed, parallel_extract
+
+MESSAGE = "parallel engine message " * 40
+
+
+@pytest.fixture
+def small_slices(monkeypatch):
+    """Splits even small carriers across several worker processes."""
+    monkeypatch.setattr(parallel_engine, "MIN_SLICE_UNITS", 1024)
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("layout", [LSB_LAYOUT, ENHANCED_FLIP_LAYOUT])
+def test_embed_extract_round_trip(make_wav, tmp_path, small_slices, layout):
+    payload = bytes(range(256)) * 20
+    output = str(tmp_path / "out.wav")
+    parallel_embed(make_wav(), output, payload, layout, workers=4)
+    assert parallel_extract(output, layout, len(payload), workers=4) == payload
+    assert parallel_extract(output, layout, 256, byte_start=256) == payload[256:512]
+
+
+def test_matches_serial_encoder(make_wav, tmp_path, small_slices):
+    carrier = make_wav()
+    serial, parallel = str(tmp_path / "serial.wav"), str(tmp_path / "parallel.wav")
+    basic.encode(carrier, serial, MESSAGE)
+    basic.encode_parallel(carrier, parallel, MESSAGE, workers=4)
+    assert read_bytes(serial) == read_bytes(parallel)
+    assert basic.decode_parallel(parallel, workers=4) == MESSAGE
+
+    kbit.encode_parallel(carrier, parallel, MESSAGE, bits=3, workers=4)
+    assert kbit.decode(parallel, bits=3) == MESSAGE
+
+
+def test_embed_in_place(make_wav, tmp_path):
+    carrier = make_wav()
+    copy = str(tmp_path / "copy.wav")
+    shutil.copyfile(carrier, copy)
+    payload = b"in place payload"
+    parallel_embed(carrier, carrier, payload, LSB_LAYOUT)
+    parallel_embed(copy, str(tmp_path / "separate.wav"), payload, LSB_LAYOUT)
+    assert read_bytes(carrier) == read_bytes(str(tmp_path / "separate.wav"))
+
+
+def test_payload_too_large(make_wav, tmp_path):
+    with pytest.raises(ValueError):
+        parallel_embed(make_wav(frames=100), str(tmp_path / "out.wav"), b"x" * 100, LSB_LAYOUT)
+    with pytest.raises(ValueError):
+        parallel_extract(make_wav(frames=100), {"unit": "byte", "bits": 3, "shift": 0, "flip": 0}, byte_start=1)
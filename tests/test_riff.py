@@ -0,0 +1,132 @@
+import struct
+import numpy as np
+import pytest
+from utils.riff import (DS64_BODY, RF64_SIZE_PLACEHOLDER, SUBFORMAT_GUID_TAIL, WAVE_FORMAT_EXTENSIBLE,
+                        WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, float_to_frames, frames_to_float, open_wav,
+                        read_params, write_like)
+
+
+def chunk(chunk_id, body, size=None):
+    """Serializes one chunk, padded to a word boundary."""
+    return struct.pack('<4sI', chunk_id, len(body) if size is None else size) + body + b'\x00' * (len(body) & 1)
+
+
+def fmt_body(tag, channels, bits, extensible_tag=None, valid_bits=None):
+    block_align = channels * bits // 8
+    body = struct.pack('<HHIIHH', tag, channels, 44100, 44100 * block_align, block_align, bits)
+    if extensible_tag is not None:
+        subformat = struct.pack('<H', extensible_tag) + SUBFORMAT_GUID_TAIL
+        body += struct.pack('<HHI16s', 22, valid_bits or bits, 0x3, subformat)
+    return body
+
+
+def write_file(path, fmt, data, rf64=False, extra=b''):
+    """Writes a RIFF file, or an RF64 file whose sizes live in a ds64 chunk, with an optional trailing chunk."""
+    if rf64:
+        ds64 = chunk(b'ds64', DS64_BODY.pack(0, len(data), 0))
+        chunks = ds64 + chunk(b'fmt ', fmt) + chunk(b'data', data, RF64_SIZE_PLACEHOLDER) + extra
+        header = struct.pack('<4sI4s', b'RF64', RF64_SIZE_PLACEHOLDER, b'WAVE')
+    else:
+        chunks = chunk(b'fmt ', fmt) + chunk(b'data', data) + extra
+        header = struct.pack('<4sI4s', b'RIFF', 4 + len(chunks), b'WAVE')
+    with open(path, 'wb') as f:
+        f.write(header + chunks)
+    return str(path)
+
+
+def test_pcm16_matches_wave(make_wav):
+    path = make_wav(frames=1000)
+    params = read_params(path)
+    assert (params.nchannels, params.sampwidth, params.nframes, params.sample_format) == (2, 2, 1000, "pcm")
+    assert params.data_offset == 44 and not params.rf64
+
+
+def test_24_bit_samples(tmp_path):
+    ints = np.array([0, 1, -1, (1 << 23) - 1, -(1 << 23), 4660, -4660, 65536], dtype=np.int64)
+    data = b''.join(int(v).to_bytes(3, 'little', signed=True) for v in ints)
+    path = write_file(tmp_path / "a.wav", fmt_body(WAVE_FORMAT_PCM, 2, 24), data)
+    params = read_params(path)
+    assert (params.sampwidth, params.nframes, params.bits_per_sample) == (3, 4, 24)
+    with open_wav(path) as audio:
+        frames = audio.readframes(audio.getnframes())
+    samples = frames_to_float(frames, params)
+    assert samples.shape == (4, 2)
+    assert np.array_equal(np.round(samples.ravel() * (1 << 23)).astype(np.int64), ints)
+    assert float_to_frames(samples, params) == data
+
+
+def test_float32_samples(tmp_path):
+    values = np.array([0.0, 0.5, -0.25, 1.0, -1.0, 0.125], dtype='<f4')
+    path = write_file(tmp_path / "f.wav", fmt_body(WAVE_FORMAT_IEEE_FLOAT, 1, 32), values.tobytes())
+    params = read_params(path)
+    assert (params.sample_format, params.sampwidth, params.nframes) == ("float", 4, 6)
+    with open_wav(path) as audio:
+        samples = frames_to_float(audio.readframes(6), params)
+    assert np.array_equal(samples.ravel(), values.astype(np.float64))
+    assert float_to_frames(samples, params) == values.tobytes()
+
+
+@pytest.mark.parametrize("subformat, bits, sample_format", [
+    (WAVE_FORMAT_PCM, 16, "pcm"), (WAVE_FORMAT_PCM, 24, "pcm"), (WAVE_FORMAT_IEEE_FLOAT, 32, "float"),
+])
+def test_extensible(tmp_path, subformat, bits, sample_format):
+    fmt = fmt_body(WAVE_FORMAT_EXTENSIBLE, 2, bits, extensible_tag=subformat, valid_bits=bits - 4)
+    data = bytes(range(256))[:2 * bits // 8 * 10]
+    params = read_params(write_file(tmp_path / "e.wav", fmt, data))
+    assert params.sample_format == sample_format
+    assert (params.bits_per_sample, params.valid_bits, params.channel_mask) == (bits, bits - 4, 0x3)
+    assert params.nframes == 10
+
+
+def test_extensible_unknown_subformat(tmp_path):
+    fmt = fmt_body(WAVE_FORMAT_EXTENSIBLE, 2, 16, extensible_tag=WAVE_FORMAT_PCM)
+    fmt = fmt[:-14] + b'\xff' * 14
+    with pytest.raises(ValueError):
+        read_params(write_file(tmp_path / "e.wav", fmt, b'\x00' * 40))
+
+
+def test_rf64_sizes_from_ds64(tmp_path):
+    data = bytes(range(200)) * 2
+    path = write_file(tmp_path / "r.wav", fmt_body(WAVE_FORMAT_PCM, 2, 16), data, rf64=True,
+                      extra=chunk(b'LIST', b'INFOtrail'))
+    params = read_params(path)
+    assert params.rf64 and params.data_size == len(data) and params.nframes == len(data) // 4
+    with open_wav(path) as audio:
+        assert audio.readframes(audio.getnframes()) == data
+
+    # Header, ds64 and trailing chunks are carried over unchanged
+    output = str(tmp_path / "out.wav")
+    write_like(path, output, b'\x01' * 8)
+    with open(path, 'rb') as f, open(output, 'rb') as g:
+        original, written = f.read(), g.read()
+    start = params.data_offset
+    assert written[:start] == original[:start] and written[start + 8:] == original[start + 8:]
+    assert written[start:start + 8] == b'\x01' * 8
+
+
+def test_truncated_ds64(tmp_path):
+    fmt = chunk(b'fmt ', fmt_body(WAVE_FORMAT_PCM, 2, 16))
+    path = tmp_path / "t.wav"
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<4sI4s', b'RF64', RF64_SIZE_PLACEHOLDER, b'WAVE') + fmt + b'ds64' +
+                struct.pack('<I', DS64_BODY.size) + b'\x00' * 10)
+    with pytest.raises(ValueError, match="ds64"):
+        read_params(str(path))
+
+
+def test_rf64_data_without_ds64(tmp_path):
+    fmt = chunk(b'fmt ', fmt_body(WAVE_FORMAT_PCM, 2, 16))
+    path = tmp_path / "n.wav"
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<4sI4s', b'RF64', RF64_SIZE_PLACEHOLDER, b'WAVE') + fmt +
+                chunk(b'data', b'\x00' * 16, RF64_SIZE_PLACEHOLDER))
+    with pytest.raises(ValueError):
+        read_params(str(path))
+
+
+@pytest.mark.parametrize("content", [b'', b'RIFF', b'RIFX\x00\x00\x00\x00WAVE', b'RIFF\x04\x00\x00\x00WAVE'])
+def test_malformed_headers(tmp_path, content):
+    path = tmp_path / "m.wav"
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        read_params(str(path))
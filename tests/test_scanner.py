@@ -0,0 +1,85 @@
+import os
+import struct
+import numpy as np
+import pytest
+from algorithms import basic_lsb_steganography as basic
+from algorithms import enhanced_lsb_steganography_with_flip as enhanced
+from algorithms import kbit_lsb_steganography as kbit
+from algorithms import matrix_lsb_steganography as matrix
+from cli.aes import lsb_encode
+from cli.scanner import HEAD_FRAMES, scan_directory, scan_file
+from utils.riff import WavReader, open_wav, write_like
+
+MESSAGE = "scanner triage message"
+
+
+def embed_legacy_lsb(carrier, output, payload):
+    """Writes payload bits into the carrier LSBs the way algorithms/* did before container headers."""
+    with open_wav(carrier) as audio:
+        frames = bytearray(audio.readframes(audio.getnframes()))
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    view = np.frombuffer(frames, dtype=np.uint8)
+    view[:len(bits)] = (view[:len(bits)] & 254) | bits
+    write_like(carrier, output, frames)
+
+
+@pytest.mark.parametrize("encode, algorithm", [
+    (basic.encode, "basic_lsb"),
+    (enhanced.encode, "enhanced_lsb_with_flip"),
+    (lambda i, o, m: kbit.encode(i, o, m, bits=3), "kbit_lsb"),
+    (lambda i, o, m: matrix.encode(i, o, m, p=4), "matrix_lsb"),
+    (lsb_encode, "aes_lsb"),
+])
+def test_container_header_names_the_algorithm(make_wav, tmp_path, encode, algorithm):
+    output = str(tmp_path / "out.wav")
+    encode(make_wav(), output, MESSAGE)
+    result = scan_file(output)
+    assert result["error"] is None and result["algorithm"] == algorithm
+    assert result["candidates"]["container"]["payload_bits"] > 0
+
+
+def test_clean_carrier(make_wav):
+    result = scan_file(make_wav())
+    assert result == {"path": result["path"], "algorithm": None, "candidates": {}, "error": None}
+
+
+def test_legacy_length_header(make_wav, tmp_path):
+    output = str(tmp_path / "legacy.wav")
+    text = MESSAGE.encode()
+    embed_legacy_lsb(make_wav(), output, struct.pack('>I', len(text) * 8) + text)
+    result = scan_file(output)
+    assert result["algorithm"] == "basic_lsb" and result["candidates"]["basic_lsb"]["complete"]
+
+
+def test_corrupt_header_is_not_reported(make_wav, tmp_path):
+    output = str(tmp_path / "out.wav")
+    basic.encode(make_wav(), output, MESSAGE)
+    with open_wav(output) as audio:
+        frames = bytearray(audio.readframes(audio.getnframes()))
+    frames[100] ^= 1  # One bit of the header's length field; the CRC no longer matches
+    write_like(output, output, frames)
+    assert "container" not in scan_file(output)["candidates"]
+
+
+def test_directory_scan(make_wav, tmp_path):
+    os.makedirs(tmp_path / "nested")
+    basic.encode(make_wav("clean.wav"), str(tmp_path / "nested" / "stego.wav"), MESSAGE)
+    (tmp_path / "broken.wav").write_bytes(b"not a wav")
+    (tmp_path / "notes.txt").write_text("ignored")
+    results = {os.path.basename(result["path"]): result for result in scan_directory(str(tmp_path), max_workers=2)}
+    assert set(results) == {"clean.wav", "stego.wav", "broken.wav"}
+    assert results["broken.wav"]["error"]
+    assert results["clean.wav"]["algorithm"] is None and results["stego.wav"]["algorithm"] == "basic_lsb"
+
+
+def test_reads_only_the_head(make_wav, monkeypatch):
+    reads = []
+    original = WavReader.readframes
+
+    def readframes(self, nframes):
+        reads.append(nframes)
+        return original(self, nframes)
+
+    monkeypatch.setattr(WavReader, "readframes", readframes)
+    scan_file(make_wav(frames=50000))
+    assert reads == [HEAD_FRAMES]
@@ -0,0 +1,18 @@
+from cli.steganalysis import analyze_directory, analyze_file
+
+
+def test_empty_carrier(make_wav):
+    result = analyze_file(make_wav("empty.wav", frames=0))
+    assert result["error"] is None and not result["suspicious"]
+    assert result["frames"] == 0 and result["rate"] is None
+    assert result["chi_square"]["embedded_fraction"] == [0.0] * result["lanes"]
+
+
+def test_directory_continues_past_empty_and_broken_files(make_wav, tmp_path):
+    make_wav("empty.wav", frames=0)
+    make_wav("full.wav", frames=5000)
+    (tmp_path / "broken.wav").write_bytes(b"RIFF\x00\x00")
+    results = {result["path"].rsplit("/", 1)[-1]: result for result in analyze_directory(str(tmp_path))}
+    assert set(results) == {"empty.wav", "full.wav", "broken.wav"}
+    assert results["broken.wav"]["error"]
+    assert results["empty.wav"]["error"] is None and results["full.wav"]["frames"] == 5000
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import secrets
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from utils.logging_util import setup_logger
+from utils.memory import fits_in_memory
+
+logger = setup_logger(__name__)
+
+# Keys derived per job from a passphrase (scrypt or PBKDF2) or from a raw key file named by a key id.
+# The slow derivation yields a master key once per job salt; every message then gets its own AES key
+# from HKDF over the master key and the message IV, which costs microseconds. The KDF block embedded
+# after the container header records the KDF, its cost parameters, the job salt and the key id, so a
+# file decodes with nothing but the passphrase (or the key directory). Master keys are kept in a small
+# in-process cache, so a batch under one passphrase pays for the KDF once, not once per file.
+KDF_KEY_FILE = 0
+KDF_SCRYPT = 1
+KDF_PBKDF2 = 2
+KDF_IDS = {"keyfile": KDF_KEY_FILE, "scrypt": KDF_SCRYPT, "pbkdf2": KDF_PBKDF2}
+
+KDF_BLOCK = struct.Struct('>BBBBI16sI')  # KDF id, scrypt log2 N, r, p, PBKDF2 iterations, salt, key id
+SALT_SIZE = 16
+KEY_SIZE = 32
+DEFAULT_SCRYPT_LOG2_N = 15
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+DEFAULT_PBKDF2_ITERATIONS = 600000
+MAX_PBKDF2_ITERATIONS = 50000000  # Parameters read from a file are untrusted; scrypt is bounded by the memory budget
+HKDF_INFO = b"stego aes-cbc message key"
+KEY_CACHE_SIZE = 64
+
+PASSPHRASE_ENV = "STEGO_PASSPHRASE"
+KEY_ID_ENV = "STEGO_KEY_ID"
+KDF_ENV = "STEGO_KDF"
+KEY_DIR_ENV = "STEGO_KEY_DIR"
+DEFAULT_KEY_DIR = "keys"
+
+KdfParams = namedtuple('KdfParams', ['kdf', 'log2_n', 'r', 'p', 'iterations', 'salt', 'key_id'])
+# params: the KdfParams every message of the job is encrypted under; secret: passphrase bytes, or None for key files
+KeySource = namedtuple('KeySource', ['params', 'secret'])
+
+
+# ========================== KDF BLOCK ============================
+def pack_kdf_block(params):
+    """Serializes KdfParams into the KDF_BLOCK.size bytes embedded ahead of the ciphertext."""
+    return KDF_BLOCK.pack(*params)
+
+
+def parse_kdf_block(data):
+    """
+    Unpacks and sanity checks the KDF block at the start of data.
+
+    :param data: Payload bytes following the container header
+    :return: KdfParams
+    """
+    if len(data) < KDF_BLOCK.size:
+        raise ValueError("KDF block is truncated.")
+    params = KdfParams(*KDF_BLOCK.unpack_from(bytes(data[:KDF_BLOCK.size])))
+    if params.kdf not in KDF_IDS.values():
+        raise ValueError(f"Unknown KDF id {params.kdf}.")
+    if params.kdf == KDF_SCRYPT:
+        if not 1 <= params.log2_n <= 40 or params.r == 0 or params.p == 0:
+            raise ValueError("Invalid scrypt parameters.")
+        if not fits_in_memory(128 * params.r * params.p * (1 << params.log2_n)):
+            raise ValueError("scrypt parameters exceed the memory budget.")
+    if params.kdf == KDF_PBKDF2 and not 1 <= params.iterations <= MAX_PBKDF2_ITERATIONS:
+        raise ValueError("Invalid PBKDF2 iteration count.")
+    return params
+
+
+# ========================== DERIVATION ============================
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def load_key_file(key_id):
+    """Reads the raw key stored as <key id>.bin in the key directory."""
+    path = os.path.join(os.environ.get(KEY_DIR_ENV, DEFAULT_KEY_DIR), f"{key_id}.bin")
+    with open(path, "rb") as f:
+        key = f.read()
+    if len(key) < 16:
+        raise ValueError(f"Key file {path} holds fewer than 16 bytes.")
+    return key
+
+
+def _derive(secret, params):
+    """Runs the KDF named by params; the slow step the cache exists for."""
+    if params.kdf == KDF_SCRYPT:
+        return Scrypt(salt=params.salt, length=KEY_SIZE, n=1 << params.log2_n, r=params.r, p=params.p).derive(secret)
+    if params.kdf == KDF_PBKDF2:
+        return PBKDF2HMAC(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=params.salt,
+                          iterations=params.iterations).derive(secret)
+    # Raw key files are already uniformly random; HKDF-extract with the salt spreads them to KEY_SIZE
+    return HKDF(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=params.salt, info=b"").derive(secret)
+
+
+def master_key(secret, params):
+    """
+    Returns the master key of a job, deriving it only when it is not cached.
+
+    :param secret: Passphrase bytes, or None to load the key file of params.key_id
+    :param params: KdfParams of the payload
+    :return: KEY_SIZE bytes
+    """
+    if params.kdf == KDF_KEY_FILE:
+        secret = load_key_file(params.key_id)
+    elif secret is None:
+        raise ValueError("The payload is protected by a passphrase, but none was given.")
+
+    # The cache is keyed by a digest, so passphrases are not kept around in it
+    cache_key = (params, hashlib.sha256(secret).digest())
+    with _cache_lock:
+        if cache_key in _cache:
+            _cache.move_to_end(cache_key)
+            _cache_stats["hits"] += 1
+            return _cache[cache_key]
+        _cache_stats["misses"] += 1
+
+    key = _derive(secret, params)
+    with _cache_lock:
+        _cache[cache_key] = key
+        while len(_cache) > KEY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return key
+
+
+def message_key(master, nonce):
+    """Derives the AES key of one message from the job master key and the message IV."""
+    return HKDF(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=None, info=HKDF_INFO + bytes(nonce)).derive(master)
+
+
+def key_cache_info():
+    """Returns the hit and miss counts and the current size of the derived-key cache."""
+    with _cache_lock:
+        return dict(_cache_stats, size=len(_cache))
+
+
+def clear_key_cache():
+    """Drops every cached master key."""
+    with _cache_lock:
+        _cache.clear()
+        _cache_stats.update(hits=0, misses=0)
+
+
+# ========================== KEY SOURCES ============================
+def key_source(passphrase=None, key_id=None, kdf="scrypt", log2_n=DEFAULT_SCRYPT_LOG2_N, r=DEFAULT_SCRYPT_R,
+               p=DEFAULT_SCRYPT_P, iterations=DEFAULT_PBKDF2_ITERATIONS):
+    """
+    Describes the key of a job, with a fresh salt shared by every message of the job.
+
+    :param passphrase: Passphrase (str or bytes) to derive the key from
+    :param key_id: Numeric id of a raw key file in the key directory, used when no passphrase is given
+    :param kdf: "scrypt" or "pbkdf2" for passphrases
+    :param log2_n: scrypt CPU/memory cost as a power of two
+    :param r: scrypt block size
+    :param p: scrypt parallelism
+    :param iterations: PBKDF2-HMAC-SHA256 iteration count
+    :return: KeySource
+    """
+    salt = secrets.token_bytes(SALT_SIZE)
+    if passphrase is None:
+        if key_id is None:
+            raise ValueError("A passphrase or a key id is required.")
+        return KeySource(KdfParams(KDF_KEY_FILE, 0, 0, 0, 0, salt, key_id), None)
+
+    if kdf not in ("scrypt", "pbkdf2"):
+        raise ValueError(f"Unknown KDF {kdf}.")
+    secret = passphrase.encode() if isinstance(passphrase, str) else bytes(passphrase)
+    if kdf == "scrypt":
+        params = KdfParams(KDF_SCRYPT, log2_n, r, p, 0, salt, key_id or 0)
+    else:
+        params = KdfParams(KDF_PBKDF2, 0, 0, 0, iterations, salt, key_id or 0)
+    parse_kdf_block(pack_kdf_block(params))  # Rejects costs a decoder would refuse
+    return KeySource(params, secret)
+
+
+def _source_from_environment():
+    if os.environ.get(PASSPHRASE_ENV):
+        return key_source(os.environ[PASSPHRASE_ENV], kdf=os.environ.get(KDF_ENV, "scrypt"))
+    if os.environ.get(KEY_ID_ENV):
+        return key_source(key_id=int(os.environ[KEY_ID_ENV]))
+    return None
+
+
+_default_source = _source_from_environment()
+_current_source = ContextVar('key_source', default=None)
+
+
+def set_default_key(source):
+    """Sets the process-wide KeySource (seen by every thread); None falls back to the legacy raw key."""
+    global _default_source
+    _default_source = source
+
+
+@contextmanager
+def use_key(source):
+    """Encrypts and decrypts with source inside the block, on this thread."""
+    token = _current_source.set(source)
+    try:
+        yield source
+    finally:
+        _current_source.reset(token)
+
+
+def current_key_source():
+    """Returns the KeySource in effect, or None when payloads use the legacy raw key."""
+    return _current_source.get() or _default_source
@@ -0,0 +1,93 @@
+import os
+import tracemalloc
+from contextlib import contextmanager
+from utils.logging_util import setup_logger
+
+logger = setup_logger(__name__)
+
+# Memory budget every encode, decode and metric path checks its estimated footprint against before
+# loading a carrier whole. Paths that would exceed it switch to processing the carrier in chunks.
+# The budget and the tracemalloc report can be set from the environment or at runtime.
+MEMORY_BUDGET_ENV = "STEGO_MEMORY_BUDGET"
+MEMORY_REPORT_ENV = "STEGO_MEMORY_REPORT"
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+MIN_CHUNK_BYTES = 64 * 1024
+# Rough peak the numpy paths hold per carrier byte they process: frame bytes, bit arrays, widened
+# integer and float temporaries. Float conversions are the widest, so it is set for them.
+WORK_BYTES_PER_CARRIER_BYTE = 16
+SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(text):
+    """Parses a byte count such as "268435456", "256M" or "2G"."""
+    text = str(text).strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+_budget = parse_size(os.environ[MEMORY_BUDGET_ENV]) if os.environ.get(MEMORY_BUDGET_ENV) else DEFAULT_MEMORY_BUDGET
+_report = os.environ.get(MEMORY_REPORT_ENV, "").lower() in ("1", "true", "yes")
+
+
+def get_memory_budget():
+    """Returns the current memory budget in bytes."""
+    return _budget
+
+
+def set_memory_budget(budget):
+    """Sets the memory budget, in bytes or as a size string; None restores the default."""
+    global _budget
+    _budget = DEFAULT_MEMORY_BUDGET if budget is None else parse_size(budget)
+    logger.info(f"Memory budget set to {_budget / (1 << 20):.1f} MiB")
+
+
+def fits_in_memory(estimated_bytes):
+    """Returns True if an operation estimated to need estimated_bytes may run in memory."""
+    return estimated_bytes <= _budget
+
+
+def chunk_size(bytes_per_unit=WORK_BYTES_PER_CARRIER_BYTE, align=1):
+    """
+    Returns how many units (carrier bytes by default) one chunk may span under the budget.
+
+    :param bytes_per_unit: Peak bytes the chunked path holds per unit (buffers and temporaries)
+    :param align: The chunk is rounded down to a multiple of this, and is never smaller than it
+    """
+    size = max(int(_budget // bytes_per_unit), int(MIN_CHUNK_BYTES // bytes_per_unit), 1)
+    return max(size // align, 1) * align
+
+
+def chunk_spans(stop, size, start=0):
+    """Splits [start, stop) into consecutive (start, stop) spans of at most size units."""
+    return [(offset, min(offset + size, stop)) for offset in range(start, stop, size)]
+
+
+def enable_memory_report(enabled=True):
+    """Turns the tracemalloc peak report of memory_report() on or off."""
+    global _report
+    _report = enabled
+
+
+@contextmanager
+def memory_report(label):
+    """
+    Logs the peak traced allocation of the enclosed block against the budget, when the report is enabled.
+
+    tracemalloc slows allocation-heavy code noticeably, so it only runs on request.
+    """
+    if not _report:
+        yield
+        return
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        if started:
+            tracemalloc.stop()
+        logger.info(f"{label}: peak {peak / (1 << 20):.2f} MiB of {_budget / (1 << 20):.1f} MiB budget")
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Progress of the running encode, decode or metric job. Engines call report_progress() as they go;
+# whoever started the job installs a callback with progress_callback(). Without one, reporting is a
+# single context variable lookup. Callbacks run at most once per min_interval, except on a stage
+# change or when a stage completes, so a tight loop can report as often as it likes.
+DEFAULT_MIN_INTERVAL = 0.1  # Seconds between callbacks within one stage
+LOOP_REPORT_STEP = 1 << 16  # Iterations between reports from per-byte Python loops
+
+# stage: what is running ("read", "embed", "extract", "write", ...)
+# done / total: bytes of the stage processed so far and in all (total may be 0 when unknown)
+# bits: payload bits embedded or extracted so far in the job
+# elapsed: seconds since the callback was installed
+ProgressEvent = namedtuple('ProgressEvent', ['stage', 'done', 'total', 'bits', 'elapsed'])
+
+_reporter = ContextVar('progress_reporter', default=None)
+
+
+class ProgressReporter:
+    """Rate-limits progress updates of one job into a callback taking a ProgressEvent."""
+
+    def __init__(self, callback, min_interval=DEFAULT_MIN_INTERVAL):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.started = time.monotonic()
+        self.stage = None
+        self.bits = 0
+        self._last = 0.0
+
+    def update(self, stage, done, total, bits=None):
+        if bits is not None:
+            self.bits = bits
+        now = time.monotonic()
+        if stage == self.stage and (not total or done < total) and now - self._last < self.min_interval:
+            return
+        self.stage, self._last = stage, now
+        self.callback(ProgressEvent(stage, done, total, self.bits, now - self.started))
+
+
+def report_progress(stage, done, total, bits=None):
+    """
+    Reports progress of the current job, if anyone is listening.
+
+    :param stage: Name of the running stage
+    :param done: Bytes of the stage processed so far
+    :param total: Bytes the stage processes in all
+    :param bits: Payload bits embedded or extracted so far, when known
+    """
+    reporter = _reporter.get()
+    if reporter is not None:
+        reporter.update(stage, done, total, bits)
+
+
+@contextmanager
+def progress_callback(callback, min_interval=DEFAULT_MIN_INTERVAL):
+    """
+    Sends the progress of jobs run inside the block (on this thread) to callback.
+
+    Worker threads do not inherit the callback; install one per job, e.g. from
+    ProgressAggregator.callback_for, inside the worker.
+    """
+    token = _reporter.set(ProgressReporter(callback, min_interval))
+    try:
+        yield
+    finally:
+        _reporter.reset(token)
+
+
+class ProgressAggregator:
+    """Combines the progress of many concurrent jobs, e.g. one per file of a batch."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.started = time.monotonic()
+
+    def callback_for(self, key):
+        """Returns a progress callback recording events under key."""
+        def callback(event):
+            with self._lock:
+                self._jobs[key] = event
+        return callback
+
+    def snapshot(self):
+        """
+        Returns the combined progress of every job seen so far.
+
+        :return: Dictionary with jobs, bytes done and total of each job's current stage, bits and bytes/s
+        """
+        with self._lock:
+            events = list(self._jobs.values())
+        done = sum(event.done for event in events)
+        elapsed = time.monotonic() - self.started
+        return {
+            "jobs": len(events),
+            "done": done,
+            "total": sum(event.total for event in events),
+            "bits": sum(event.bits for event in events),
+            "rate": done / elapsed if elapsed > 0 else 0.0,
+        }
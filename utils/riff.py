@@ -0,0 +1,319 @@
+import os
+import struct
+import numpy as np
+from collections import namedtuple
+from utils.progress import report_progress
+
+# RIFF/RF64 WAVE parsing without the stdlib wave module, which rejects WAVE_FORMAT_EXTENSIBLE and float
+# files and cannot address data beyond 4 GB. Only chunk headers are read; samples stay on disk until asked for.
+RIFF_HEADER = struct.Struct('<4sI4s')
+CHUNK_HEADER = struct.Struct('<4sI')
+DS64_BODY = struct.Struct('<QQQ')  # RIFF size, data size, sample count
+FMT_BODY = struct.Struct('<HHIIHH')  # format tag, channels, sample rate, byte rate, block align, bits per sample
+FMT_EXTENSION = struct.Struct('<HHI16s')  # extension size, valid bits, channel mask, subformat GUID
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+SAMPLE_FORMATS = {WAVE_FORMAT_PCM: "pcm", WAVE_FORMAT_IEEE_FLOAT: "float"}
+
+# KSDATAFORMAT_SUBTYPE_* GUIDs share this tail after the 16-bit format tag
+SUBFORMAT_GUID_TAIL = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+RF64_SIZE_PLACEHOLDER = 0xFFFFFFFF
+# Reads and copies larger than this go in pieces of this size, reporting progress after each
+IO_PIECE_BYTES = 16 * 1024 * 1024
+
+# The first six fields match wave params, so code written against wave.getparams() keeps working
+WavParams = namedtuple('WavParams', [
+    'nchannels', 'sampwidth', 'framerate', 'nframes', 'comptype', 'compname',
+    'sample_format', 'bits_per_sample', 'valid_bits', 'channel_mask', 'data_offset', 'data_size', 'rf64',
+])
+
+
+def _parse_fmt(body):
+    """Unpacks a fmt chunk body into (sample format, channels, rate, block align, bits, valid bits, channel mask)."""
+    if len(body) < FMT_BODY.size:
+        raise ValueError("fmt chunk is truncated.")
+    tag, channels, framerate, _, block_align, bits = FMT_BODY.unpack_from(body)
+    valid_bits, channel_mask = bits, 0
+
+    if tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(body) < FMT_BODY.size + FMT_EXTENSION.size:
+            raise ValueError("WAVE_FORMAT_EXTENSIBLE fmt chunk is truncated.")
+        _, valid_bits, channel_mask, subformat = FMT_EXTENSION.unpack_from(body, FMT_BODY.size)
+        if subformat[2:] != SUBFORMAT_GUID_TAIL:
+            raise ValueError("Unsupported WAVE_FORMAT_EXTENSIBLE subformat.")
+        tag = struct.unpack('<H', subformat[:2])[0]
+
+    if tag not in SAMPLE_FORMATS:
+        raise ValueError(f"Unsupported WAV format tag 0x{tag:04x}.")
+    if channels == 0 or block_align == 0 or block_align % channels:
+        raise ValueError("Invalid channel count or block alignment.")
+    return SAMPLE_FORMATS[tag], channels, framerate, block_align, bits, valid_bits or bits, channel_mask
+
+
+def parse_wav(file):
+    """
+    Walks the chunks of an open RIFF, RF64 or BW64 WAVE file and describes its sample data.
+
+    :param file: Binary file object positioned anywhere
+    :return: WavParams with the format and the exact data chunk byte offset and length
+    """
+    file.seek(0, os.SEEK_END)
+    file_size = file.tell()
+    file.seek(0)
+
+    header = file.read(RIFF_HEADER.size)
+    if len(header) < RIFF_HEADER.size:
+        raise ValueError("File is too short to be a WAV file.")
+    riff_id, _, wave_id = RIFF_HEADER.unpack(header)
+    if riff_id not in (b'RIFF', b'RF64', b'BW64') or wave_id != b'WAVE':
+        raise ValueError("Not a RIFF/WAVE file.")
+    rf64 = riff_id != b'RIFF'
+
+    ds64_data_size = None
+    fmt = None
+    data = None
+    while fmt is None or data is None:
+        chunk = file.read(CHUNK_HEADER.size)
+        if len(chunk) < CHUNK_HEADER.size:
+            raise ValueError("No fmt chunk found." if fmt is None else "No data chunk found.")
+        chunk_id, chunk_size = CHUNK_HEADER.unpack(chunk)
+        chunk_start = file.tell()
+
+        if chunk_id == b'ds64':
+            body = file.read(DS64_BODY.size)
+            if len(body) < DS64_BODY.size:
+                raise ValueError("ds64 chunk is truncated.")
+            ds64_data_size = DS64_BODY.unpack(body)[1]
+        elif chunk_id == b'fmt ':
+            fmt = _parse_fmt(file.read(chunk_size))
+        elif chunk_id == b'data':
+            if rf64 and chunk_size == RF64_SIZE_PLACEHOLDER:
+                if ds64_data_size is None:
+                    raise ValueError("RF64 data chunk without a ds64 chunk.")
+                chunk_size = ds64_data_size
+            # Truncated files are read up to their end, as the wave module does
+            data = (chunk_start, min(chunk_size, file_size - chunk_start))
+
+        file.seek(chunk_start + chunk_size + (chunk_size & 1))  # Chunks are word aligned
+
+    sample_format, channels, framerate, block_align, bits, valid_bits, channel_mask = fmt
+    data_offset, data_size = data
+    return WavParams(
+        nchannels=channels,
+        sampwidth=block_align // channels,
+        framerate=framerate,
+        nframes=data_size // block_align,
+        comptype='NONE',
+        compname='not compressed' if sample_format == "pcm" else 'IEEE float',
+        sample_format=sample_format,
+        bits_per_sample=bits,
+        valid_bits=valid_bits,
+        channel_mask=channel_mask,
+        data_offset=data_offset,
+        data_size=data_size,
+        rf64=rf64,
+    )
+
+
+def read_params(path):
+    """Returns the WavParams of a file, reading only its chunk headers."""
+    with open(path, 'rb') as file:
+        return parse_wav(file)
+
+
+class WavReader:
+    """Reads frames straight from the data chunk; implements the subset of wave.Wave_read the codebase uses."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._params = parse_wav(self._file)
+        except Exception:
+            self._file.close()
+            raise
+        self._frame_size = self._params.sampwidth * self._params.nchannels
+        self._position = 0
+
+    def getparams(self):
+        return self._params
+
+    def getnchannels(self):
+        return self._params.nchannels
+
+    def getsampwidth(self):
+        return self._params.sampwidth
+
+    def getframerate(self):
+        return self._params.framerate
+
+    def getnframes(self):
+        return self._params.nframes
+
+    def tell(self):
+        return self._position
+
+    def setpos(self, position):
+        if not 0 <= position <= self._params.nframes:
+            raise ValueError("Position not in range.")
+        self._position = position
+
+    def rewind(self):
+        self._position = 0
+
+    def readframes(self, nframes):
+        count = max(min(nframes, self._params.nframes - self._position), 0)
+        self._file.seek(self._params.data_offset + self._position * self._frame_size)
+        size = count * self._frame_size
+        if size <= IO_PIECE_BYTES:
+            data = self._file.read(size)
+        else:
+            # Large reads fill one buffer piece by piece; it is returned as is to avoid a second copy
+            data = bytearray(size)
+            view, filled = memoryview(data), 0
+            while filled < size:
+                read = self._file.readinto(view[filled:filled + IO_PIECE_BYTES])
+                if not read:
+                    break
+                filled += read
+                report_progress("read", self._position * self._frame_size + filled, self._params.data_size)
+            view.release()
+            del data[filled:]
+        self._position += len(data) // self._frame_size
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_wav(path):
+    """Opens a WAV file for reading frames; a drop-in for wave.open(path, 'rb')."""
+    return WavReader(path)
+
+
+def frames_to_float(frame_bytes, params):
+    """
+    Converts frame bytes to float samples at full scale 1.0, shaped (frames, channels).
+
+    Handles unsigned 8-bit, signed 16/24/32-bit and any other integer width, and IEEE float data.
+    """
+    width = params.sampwidth
+    raw = np.frombuffer(frame_bytes, dtype=np.uint8)
+    raw = raw[:len(raw) // (width * params.nchannels) * width * params.nchannels]
+
+    if params.sample_format == "float":
+        samples = raw.view(f'<f{width}').astype(np.float64)
+    elif width == 1:
+        samples = (raw.astype(np.float64) - 128) / 128  # 8-bit WAV is unsigned
+    else:
+        # Each sample goes into the top bytes of an int64, which sign-extends it for free
+        widened = np.zeros((len(raw) // width, 8), dtype=np.uint8)
+        widened[:, 8 - width:] = raw.reshape(-1, width)
+        samples = widened.view('<i8').ravel() / float(1 << 63)
+    return samples.reshape(-1, params.nchannels)
+
+
+def float_to_frames(samples, params):
+    """Converts full-scale float samples back to frame bytes, rounding and clipping integer formats."""
+    width = params.sampwidth
+    if params.sample_format == "float":
+        return np.ascontiguousarray(samples, dtype=f'<f{width}').tobytes()
+
+    peak = 1 << (8 * width - 1)
+    ints = np.clip(np.round(np.ravel(samples) * peak), -peak, peak - 1).astype('<i8')
+    if width == 1:
+        return (ints + 128).astype(np.uint8).tobytes()
+    return ints.view(np.uint8).reshape(-1, 8)[:, :width].tobytes()
+
+
+def _copy_rest(source, target, done, total):
+    """Copies source from its position to its end into target, reporting bytes of the file written."""
+    while True:
+        piece = source.read(IO_PIECE_BYTES)
+        if not piece:
+            break
+        target.write(piece)
+        done += len(piece)
+        report_progress("write", done, total)
+
+
+def write_like(template_path, output_path, frame_bytes):
+    """
+    Writes frame bytes over the start of a template's data chunk into a new file.
+
+    Every header and trailing chunk of the template is kept byte for byte, so EXTENSIBLE, float and RF64
+    files come out in the format they went in.
+
+    :param template_path: WAV file the frames were read from
+    :param output_path: File to write; may be the template itself to update it in place
+    :param frame_bytes: Frames replacing the leading bytes of the data chunk
+    """
+    if os.path.exists(output_path) and os.path.samefile(template_path, output_path):
+        with open(output_path, 'r+b') as file:
+            params = parse_wav(file)
+            if len(frame_bytes) > params.data_size:
+                raise ValueError("Frames are larger than the data chunk.")
+            file.seek(params.data_offset)
+            file.write(frame_bytes)
+        report_progress("write", len(frame_bytes), len(frame_bytes))
+        return
+
+    with open(template_path, 'rb') as source, open(output_path, 'wb') as target:
+        params = parse_wav(source)
+        if len(frame_bytes) > params.data_size:
+            raise ValueError("Frames are larger than the data chunk.")
+        source.seek(0)
+        target.write(source.read(params.data_offset))
+        target.write(frame_bytes)
+        written, total = params.data_offset + len(frame_bytes), os.fstat(source.fileno()).st_size
+        report_progress("write", written, total)
+        source.seek(written)
+        _copy_rest(source, target, written, total)
+
+
+def stream_like(template_path, output_path, spans, transform, bits_per_byte=0):
+    """
+    Writes a template with leading data bytes passed through transform one span at a time.
+
+    The chunked counterpart of write_like: only one span of sample data is held in memory, and the
+    bytes past the last span are copied unchanged.
+
+    :param template_path: WAV file to read the frames from
+    :param output_path: File to write; may be the template itself to update it in place
+    :param spans: Consecutive (start, stop) data-chunk byte ranges starting at 0
+    :param transform: Function (uint8 array of a span, span start) -> new bytes of the same length
+    :param bits_per_byte: Payload bits the spans carry per byte, for progress reports
+    """
+    in_place = os.path.exists(output_path) and os.path.samefile(template_path, output_path)
+    with open(template_path, 'r+b' if in_place else 'rb') as source:
+        params = parse_wav(source)
+        end = spans[-1][1] if spans else 0
+        if end > params.data_size:
+            raise ValueError("Frames are larger than the data chunk.")
+
+        target = source if in_place else open(output_path, 'wb')
+        try:
+            if not in_place:
+                source.seek(0)
+                target.write(source.read(params.data_offset))
+
+            for start, stop in spans:
+                source.seek(params.data_offset + start)
+                chunk = np.frombuffer(source.read(stop - start), dtype=np.uint8)
+                target.seek(params.data_offset + start)
+                target.write(np.ascontiguousarray(transform(chunk, start), dtype=np.uint8).tobytes())
+                report_progress("embed", stop, end, bits=int(stop * bits_per_byte))
+
+            if not in_place:
+                source.seek(params.data_offset + end)
+                _copy_rest(source, target, params.data_offset + end, os.fstat(source.fileno()).st_size)
+        finally:
+            if not in_place:
+                target.close()